@@ -0,0 +1,128 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.back.frame_pool import FramePool
+from src.back.kbm_tracking import KeyboardTracker
+from src.back.layout_cache import LayoutCache
+from src.back.synthetic_scenes import SceneGenerator
+
+
+########################################################################################################################
+#   AllocationCheck Class - Bytes allocated per frame by the tracking hot loop (tracemalloc)
+########################################################################################################################
+
+class AllocationCheck:
+    def __init__(self, warmup=30, top=10):
+        """
+        NumPy reports its buffers to tracemalloc (OpenCV outputs are NumPy arrays), so frame sized
+        allocations show up here while native allocations inside OpenCV / MediaPipe do not.
+
+        Parameters:
+        - warmup: Frames run before measuring, pools and caches fill up during these.
+        - top: Source lines listed for the memory retained over the measured frames.
+        """
+        self.warmup = warmup
+        self.top = top
+
+    def run(self, step, frames):
+        """
+        Calls step(index, frame) for every frame and returns the per frame allocation stats:
+        - allocated: high water mark above the memory in use when the frame started (temporaries included)
+        - retained: memory still in use after the frame (growth, e.g. RSS creep)
+        """
+        frames = list(frames)
+        tracemalloc.start()
+        try:
+            for index, frame in enumerate(frames[:self.warmup]):
+                step(index, frame)
+
+            allocated, retained = [], []
+            start_snapshot = tracemalloc.take_snapshot()
+            start = time.perf_counter()
+            for index, frame in enumerate(frames[self.warmup:], self.warmup):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                step(index, frame)
+                current, peak = tracemalloc.get_traced_memory()
+                allocated.append(peak - before)
+                retained.append(current - before)
+            seconds = time.perf_counter() - start
+            growth = tracemalloc.take_snapshot().compare_to(start_snapshot, "lineno")
+        finally:
+            tracemalloc.stop()
+
+        allocated = np.asarray(allocated or [0])
+        return {
+            "frames": len(frames) - self.warmup,
+            "fps": (len(frames) - self.warmup) / seconds if seconds > 0 else None,
+            "allocated_mean_bytes": float(allocated.mean()),
+            "allocated_max_bytes": int(allocated.max()),
+            "retained_total_bytes": int(np.sum(retained)),
+            "top_growth": [(str(stat.traceback), stat.size_diff) for stat in growth if stat.size_diff > 0][:self.top],
+        }
+
+
+def format_report(stats, frame_bytes):
+    lines = [f"{stats['frames']} frames at {stats['fps'] or 0:.1f} fps",
+             f"allocated per frame: mean {stats['allocated_mean_bytes'] / 1024:.1f} KiB, "
+             f"max {stats['allocated_max_bytes'] / 1024:.1f} KiB "
+             f"({stats['allocated_mean_bytes'] / frame_bytes:.2f} frames)",
+             f"retained over the run: {stats['retained_total_bytes'] / 1024:.1f} KiB"]
+    for site, size in stats["top_growth"]:
+        lines.append(f"  +{size / 1024:.1f} KiB {site}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report the bytes allocated per frame by the tracking hot loop")
+    parser.add_argument("--frames", type=int, default=300, help="Measured frames")
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--scale", type=float, default=0.3, help="Warped preview scale")
+    parser.add_argument("--hands", action="store_true", help="Also run the (in process) hand tracker")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # Frames are rendered up front, a slowly drifting mat keeps the pose tracker busy
+    generator = SceneGenerator(frame_size=tuple(args.frame_size), seed=args.seed, occlusion_probability=0.0,
+                               blur_range=(0.0, 0.0))
+    corners, gain, offset = generator.generate_pose()
+    count = args.warmup + args.frames
+    drift = np.float32([[1.0, 0.5]]) * np.float32(np.sin(np.linspace(0, 4 * np.pi, count)) * 4.0)[:, None, None]
+    scenes = [generator.generate((corners + drift[index], gain, offset)).image for index in range(count)]
+
+    kbm_tracker = KeyboardTracker(LayoutCache().get_layout())
+    kbm_tracker.apply_projection(np.float32(corners), kbm_tracker.build_warp_engine(np.float32(corners)))
+    hand_tracker = None
+    if args.hands:
+        from src.back.hand_tracking import HandTracker
+        hand_tracker = HandTracker()
+        hand_tracker.roi_enabled = True
+
+    # Stands in for the capture thread decoding into pooled buffers
+    capture_pool = FramePool()
+
+    def step(index, scene):
+        frame = capture_pool.acquire(scene.shape)
+        np.copyto(frame, scene)
+        kbm_tracker.track_pose(frame)
+        if hand_tracker is not None:
+            hand_tracker.track(frame, index / 30.0, kbm_tracker.kbm_corners)
+        kbm_tracker.get_wapped_frame(frame, args.scale)
+
+    stats = AllocationCheck(args.warmup).run(step, scenes)
+    stats["capture_pool"] = {"allocations": capture_pool.allocations, "reuses": capture_pool.reuses}
+    stats["tracker_pool"] = {"allocations": kbm_tracker.frame_pool.allocations,
+                             "reuses": kbm_tracker.frame_pool.reuses}
+    print(format_report(stats, scenes[0].nbytes))
+    print(f"capture pool {stats['capture_pool']}, tracker pool {stats['tracker_pool']}")
+    if hand_tracker is not None:
+        hand_tracker.close()
+    return stats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import csv
+import json
+import multiprocessing as mproc
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2 as cv
+import numpy as np
+
+from src.back.session_recorder import INDEX_FILE, VIDEO_FILE, SessionReplay
+
+VIDEO_EXTENSIONS = (".avi", ".mp4", ".mkv", ".mov", ".webm")
+
+# One Engine per worker process, built by init_worker
+worker_engine = None
+
+
+def find_inputs(input_dir):
+    """
+    Returns the recordings under input_dir: SessionRecorder directories (replayed with their own timestamps
+    and calibrations) and plain video files.
+    """
+    inputs = []
+    for root, dirs, files in os.walk(input_dir):
+        if INDEX_FILE in files and VIDEO_FILE in files:
+            inputs.append(root)
+            dirs[:] = []  # Nothing to find inside a session
+            continue
+        for name in sorted(files):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                inputs.append(os.path.join(root, name))
+        dirs.sort()
+    return inputs
+
+
+def read_video(path):
+    # Plain video: (seq, timestamp, frame) with timestamps from the container (frame rate as a fallback)
+    capture = cv.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Could not open '{path}'")
+    fps = capture.get(cv.CAP_PROP_FPS) or 30.0
+    seq = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                return
+            timestamp = capture.get(cv.CAP_PROP_POS_MSEC) / 1000.0
+            yield seq, timestamp if timestamp > 0 or seq == 0 else seq / fps, frame
+            seq += 1
+    finally:
+        capture.release()
+
+
+def init_worker(model_complexity, decimation, opencv_threads, crop_to_mat=False):
+    # Workers already run in parallel, OpenCV's own thread pool would only oversubscribe the cores
+    global worker_engine
+    from src.back.engine import Engine
+
+    cv.setNumThreads(opencv_threads)
+    worker_engine = Engine(model_complexity=model_complexity, decimation=decimation, crop_to_mat=crop_to_mat)
+
+
+def get_log_name(path, input_dir):
+    # Unique per input even when recordings in different folders share a file name
+    return os.path.relpath(os.path.normpath(path), input_dir).replace(os.sep, "__")
+
+
+def process_file(path, output_dir, name):
+    """
+    Runs one recording through the worker's engine, writes <name>.keys.csv and returns its stats.
+    """
+    engine = worker_engine
+    engine.reset()
+    log_path = os.path.join(output_dir, f"{name}.keys.csv")
+    stats = {"input": path, "log": log_path, "frames": 0, "key_downs": 0, "calibrated_frames": 0, "error": None}
+
+    replay = None
+    if os.path.isdir(path):
+        replay = SessionReplay(path)
+        frames = ((captured.seq, captured.timestamp, captured.image) for captured in replay.frames())
+    else:
+        frames = read_video(path)
+
+    start = time.perf_counter()
+    calibration = None
+    try:
+        with open(log_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["timestamp", "seq", "key", "event_type"])
+            for seq, timestamp, frame in frames:
+                if replay is not None:
+                    # Use the calibration that was active when the frame was recorded
+                    corners = replay.get_calibration_at(timestamp)
+                    if corners is not None and (calibration is None or not np.array_equal(corners, calibration)):
+                        engine.set_corners(corners)
+                        calibration = corners
+
+                result = engine.process(frame, timestamp, seq)
+                stats["frames"] += 1
+                if result.corners is not None:
+                    stats["calibrated_frames"] += 1
+                for event in result.key_events:
+                    writer.writerow([f"{event.timestamp:.6f}", seq, event.name, event.event_type])
+                    if event.event_type == "down":
+                        stats["key_downs"] += 1
+    except Exception as e:
+        stats["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if replay is not None:
+            replay.stop_webcam()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["fps"] = stats["frames"] / stats["seconds"] if stats["seconds"] > 0 else None
+    stats["calibration_failures"] = engine.calibration_failures
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-score a directory of recorded sessions / videos")
+    parser.add_argument("input_dir", help="Directory searched (recursively) for recordings")
+    parser.add_argument("--out", default="batch_out", help="Where the key event logs and summary.json go")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (one engine each)")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--no-decimation", action="store_true", help="Run the hand model on every frame")
+    parser.add_argument("--crop-to-mat", action="store_true", help="Run the hand model on the mat area only")
+    parser.add_argument("--opencv-threads", type=int, default=1, help="OpenCV threads per worker")
+    args = parser.parse_args(argv)
+
+    inputs = find_inputs(args.input_dir)
+    if not inputs:
+        print(f"[batch_process] Error: No recordings found in '{args.input_dir}'")
+        return None
+    os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    results = []
+    workers = max(1, min(args.workers, len(inputs)))
+    with ProcessPoolExecutor(workers, mp_context=mproc.get_context("spawn"), initializer=init_worker,
+                             initargs=(args.model_complexity, not args.no_decimation, args.opencv_threads,
+                                       args.crop_to_mat)) as pool:
+        futures = {pool.submit(process_file, path, args.out, get_log_name(path, args.input_dir)): path
+                   for path in inputs}
+        for future in as_completed(futures):
+            try:
+                stats = future.result()
+            except Exception as e:
+                stats = {"input": futures[future], "frames": 0, "error": f"{type(e).__name__}: {e}"}
+            results.append(stats)
+            status = stats["error"] or f"{stats['frames']} frames, {stats['key_downs']} presses, " \
+                                       f"{stats['fps'] or 0:.1f} fps"
+            print(f"[{len(results)}/{len(inputs)}] {stats['input']}: {status}")
+
+    wall_seconds = time.perf_counter() - start
+    total_frames = sum(stats["frames"] for stats in results)
+    summary = {
+        "workers": workers,
+        "files": len(results),
+        "failed_files": sum(1 for stats in results if stats["error"]),
+        "frames": total_frames,
+        "wall_seconds": wall_seconds,
+        "fps": total_frames / wall_seconds if wall_seconds > 0 else None,
+        "results": sorted(results, key=lambda stats: stats["input"]),
+    }
+    with open(os.path.join(args.out, "summary.json"), "w") as file:
+        json.dump(summary, file, indent=2)
+    print(f"{total_frames} frames from {len(results)} files in {wall_seconds:.1f} s "
+          f"({summary['fps'] or 0:.1f} fps over {workers} workers)")
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import cv2 as cv
+import numpy as np
+
+from src.back.kbm_tracking import KeyboardTracker
+from src.back.key_regions import TEMPLATE_PATH, KEYMAP_PATH
+from src.back.layout_cache import LayoutCache
+from src.back.synthetic_scenes import SceneGenerator
+
+
+########################################################################################################################
+#   CalibrationBenchmark Class - Accuracy / throughput of mat detection on synthetic scenes
+########################################################################################################################
+
+class CalibrationBenchmark:
+    def __init__(self, kbm_tracker, generator, burst_size=5, quiet=True):
+        """
+        Parameters:
+        - kbm_tracker: KeyboardTracker under test (detection_mode, fusion and calibration settings are used as
+          they are).
+        - generator: SceneGenerator producing the scenes and their ground truth corners.
+        - burst_size: Frames offered per recalibrate_projection call (it stops early once converged).
+        - quiet: Swallow the tracker's per-failure prints.
+        """
+        self.kbm_tracker = kbm_tracker
+        self.generator = generator
+        self.burst_size = burst_size
+        self.quiet = quiet
+
+    def call(self, func, *args):
+        # Returns (result, seconds, failure) where failure is None, the tracker's reason or "exception"
+        self.kbm_tracker.last_failure = None
+        output = io.StringIO() if self.quiet else None
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext():
+                result = func(*args)
+        except Exception as e:
+            return None, time.perf_counter() - start, f"exception: {type(e).__name__}"
+        elapsed = time.perf_counter() - start
+        failure = None if result is not None else (self.kbm_tracker.last_failure or "no_corners")
+        return result, elapsed, failure
+
+    def run_single(self, count, prior_jitter=None):
+        """
+        Single frame corner estimates (StreamingCalibrator.estimate_corners, what redetection uses).
+
+        Parameters:
+        - count: Scenes to generate.
+        - prior_jitter: Gives the tracker the scene's corners moved by up to this ratio of the mat size as its
+          current pose (redetection after the mat moved a little, the fast mode searches around it). None
+          leaves the tracker without a pose.
+        """
+        calibrator = self.kbm_tracker.create_calibrator()
+        rng = np.random.default_rng(0)  # Own generator so the scenes are the same with and without a prior
+        times, errors, failures = [], [], {}
+        for _ in range(count):
+            scene = self.generator.generate()
+            self.kbm_tracker.kbm_corners = [None] * 4
+            if prior_jitter is not None:
+                extent = scene.corners.max(axis=0) - scene.corners.min(axis=0)
+                self.kbm_tracker.kbm_corners = scene.corners + rng.uniform(-prior_jitter, prior_jitter, (4, 2)) * extent
+
+            corners, elapsed, failure = self.call(calibrator.estimate_corners, scene.image)
+            times.append(elapsed)
+            if corners is None:
+                failure = calibrator.last_failure or failure
+                failures[failure] = failures.get(failure, 0) + 1
+                continue
+            errors.append(self.corner_error(corners, scene.corners))
+
+        return {
+            "scenes": count,
+            "estimate_corners": self.throughput(times),
+            "corner_error_px": self.error_stats(errors),
+            "failure_rate": sum(failures.values()) / count if count else 0.0,
+            "failures": failures,
+        }
+
+    def run_bursts(self, count):
+        """
+        recalibrate_projection over bursts of frames sharing one pose.
+        """
+        times, errors, failures, frames_used = [], [], {}, []
+        for _ in range(count):
+            burst = self.generator.generate_burst(self.burst_size)
+            # Start from no corners so a failed burst is never scored against the previous result
+            self.kbm_tracker.kbm_corners = [None] * 4
+
+            _, elapsed, failure = self.call(self.recalibrate, [scene.image for scene in burst])
+            times.append(elapsed)
+            frames_used.append(self.kbm_tracker.last_calibration_frames)
+            if failure is not None:
+                failures[failure] = failures.get(failure, 0) + 1
+                continue
+            errors.append(self.corner_error(self.kbm_tracker.kbm_corners, burst[0].corners))
+
+        return {
+            "bursts": count,
+            "burst_size": self.burst_size,
+            "recalibrate_projection": self.throughput(times, float(np.mean(frames_used)) if frames_used else 1),
+            "frames_used": float(np.mean(frames_used)) if frames_used else None,
+            "corner_error_px": self.error_stats(errors),
+            "failure_rate": sum(failures.values()) / count if count else 0.0,
+            "failures": failures,
+        }
+
+    def recalibrate(self, frames):
+        self.kbm_tracker.recalibrate_projection(frames)
+        corners = self.kbm_tracker.kbm_corners
+        return None if corners is None or None in corners else corners
+
+    @staticmethod
+    def corner_error(corners, truth):
+        # Worst corner of the four, in pixels
+        return float(np.linalg.norm(np.float32(corners).reshape(4, 2) - truth, axis=1).max())
+
+    @staticmethod
+    def throughput(times, frames_per_call=1):
+        if not times:
+            return {"calls": 0, "fps": None, "mean_ms": None}
+        total = float(np.sum(times))
+        return {"calls": len(times), "fps": len(times) * frames_per_call / total if total > 0 else None,
+                "mean_ms": total / len(times) * 1000.0}
+
+    @staticmethod
+    def error_stats(errors):
+        if not errors:
+            return {"count": 0, "mean": None, "median": None, "p95": None, "max": None}
+        errors = np.asarray(errors)
+        return {"count": len(errors), "mean": float(errors.mean()), "median": float(np.median(errors)),
+                "p95": float(np.percentile(errors, 95)), "max": float(errors.max())}
+
+
+########################################################################################################################
+#   BaselineDetector Class - Frozen copy of the original single-shot mask detector, the benchmark's reference
+########################################################################################################################
+
+class BaselineDetector:
+    def __init__(self):
+        """
+        The mat detection as it was before the streaming calibrator (get_kbm_mask, the max-combined masks of a
+        burst and get_corners on them), kept unchanged so every mode is measured against the same reference.
+        Stands in for a KeyboardTracker in the CalibrationBenchmark (create_calibrator returns itself), its
+        prints are replaced by last_failure.
+        """
+        self.kbm_corners = [None] * 4
+        self.last_failure = None
+        self.last_calibration_frames = 0
+
+    def create_calibrator(self):
+        return self
+
+    def estimate_corners(self, frame):
+        return self.get_corners(self.get_combined_mask_frame([frame]))
+
+    def recalibrate_projection(self, frames):
+        if frames is None:
+            return
+
+        self.last_calibration_frames = len(frames)
+        combo_masked_frame = self.get_combined_mask_frame(frames)
+
+        old_corners = self.kbm_corners
+        self.kbm_corners = self.get_corners(combo_masked_frame)
+
+        if self.kbm_corners is None:
+            self.kbm_corners = old_corners
+
+    def get_kbm_mask(self, frame):
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+        blur = cv.GaussianBlur(gray, (5, 5), 0)
+        _, thresh = cv.threshold(blur, 150, 255, cv.THRESH_BINARY)
+
+        contours, _ = cv.findContours(thresh, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return
+
+        big = max(contours, key=cv.contourArea)
+        hull = cv.convexHull(big)
+
+        blank = np.zeros_like(frame)
+        cv.drawContours(blank, [hull], -1, (255, 255, 255), -2)
+        blank = cv.dilate(blank, np.ones((5, 5), np.uint8), iterations=2)
+        return blank
+
+    def get_combined_mask_frame(self, frames):
+        if frames is None:
+            return
+
+        combo_frame = np.zeros_like(frames[0], dtype=np.uint8)
+        for frame in frames:
+            mask = self.get_kbm_mask(frame)
+            if mask is None or None in mask:
+                continue
+            combo_frame = np.maximum(combo_frame, mask)
+
+        gray_blank = cv.cvtColor(combo_frame, cv.COLOR_BGR2GRAY)
+        blur = cv.GaussianBlur(gray_blank, (5, 5), 0)
+        return blur
+
+    def get_corners(self, combo_mask):
+        contours, _ = cv.findContours(combo_mask, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
+        if len(contours) == 0:
+            self.last_failure = "no_contours"
+            return None
+
+        big = max(contours, key=cv.contourArea)
+        approx = cv.approxPolyDP(big, 0.02 * cv.arcLength(big, True), True)
+
+        if len(approx) != 5:
+            self.last_failure = "not_5_corners"
+            return None
+
+        points = self.reorder(approx, combo_mask)
+
+        # Calculate the missing corner
+        new_point = self.line_intersection(points[2], points[0], points[3], points[4])
+        points = np.append(points, [new_point], axis=0)
+        points = np.delete(points, [2, 3], axis=0)
+
+        # Reorder to [top_left, top_right, bottom_right, bottom_left]
+        points = np.array([points[3], points[0], points[1], points[2]])
+        return points
+
+    @staticmethod
+    def line_intersection(p1, p2, p3, p4):
+        # Intersection of the lines p1-p2 and p3-p4 in slope/intercept form
+        m1 = (p2[1] - p1[1]) / (p2[0] - p1[0]) if p2[0] != p1[0] else np.inf
+        b1 = p1[1] - m1 * p1[0] if m1 != np.inf else p1[0]
+
+        m2 = (p4[1] - p3[1]) / (p4[0] - p3[0]) if p4[0] != p3[0] else np.inf
+        b2 = p3[1] - m2 * p3[0] if m2 != np.inf else p3[0]
+
+        if m1 == m2:
+            return None
+
+        if m1 != np.inf and m2 != np.inf:
+            x = (b2 - b1) / (m1 - m2)
+            y = m1 * x + b1
+            return (x, y)
+        elif m1 == np.inf:
+            x = b1
+            y = m2 * x + b2
+            return (x, y)
+        elif m2 == np.inf:
+            x = b2
+            y = m1 * x + b1
+            return (x, y)
+
+    @staticmethod
+    def reorder(points, screen):
+        # Sorted by the distance to the image's top-right corner
+        points = points.reshape((5, 2))
+        height, width = screen.shape
+        top_right = np.array([width - 1, 0])
+        distances = [np.linalg.norm(point - top_right) for point in points]
+        sorted_points = [point.tolist() for _, point in sorted(zip(distances, points))]
+        return np.array(sorted_points, dtype=np.int32)
+
+
+def format_report(mode, single, bursts):
+    lines = [f"== detection_mode={mode} =="]
+    if single is not None:
+        error = single["corner_error_px"]
+        lines.append(f"single frame: {single['scenes']} scenes, "
+                     f"estimate_corners {single['estimate_corners']['fps'] or 0:.1f} fps")
+        lines.append(f"  failure rate {single['failure_rate']:.1%} {single['failures']}")
+        if error["count"]:
+            lines.append(f"  corner error px: mean {error['mean']:.2f} median {error['median']:.2f} "
+                         f"p95 {error['p95']:.2f} max {error['max']:.2f}")
+    if bursts is not None:
+        error = bursts["corner_error_px"]
+        lines.append(f"recalibrate_projection: {bursts['bursts']} bursts of {bursts['burst_size']} "
+                     f"({bursts['frames_used'] or 0:.1f} frames used), "
+                     f"{bursts['recalibrate_projection']['fps'] or 0:.1f} frames/s, "
+                     f"{bursts['recalibrate_projection']['mean_ms'] or 0:.1f} ms per burst")
+        lines.append(f"  failure rate {bursts['failure_rate']:.1%} {bursts['failures']}")
+        if error["count"]:
+            lines.append(f"  corner error px: mean {error['mean']:.2f} median {error['median']:.2f} "
+                         f"p95 {error['p95']:.2f} max {error['max']:.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark mat detection on synthetic scenes")
+    parser.add_argument("--scenes", type=int, default=2000, help="Single frame scenes per mode")
+    parser.add_argument("--bursts", type=int, default=200, help="recalibrate_projection bursts per mode")
+    parser.add_argument("--burst-size", type=int, default=5, help="Frames per burst")
+    parser.add_argument("--modes", nargs="+", choices=["baseline", "full", "fast"],
+                        default=["baseline", "full", "fast"], help="baseline is the frozen original detector")
+    parser.add_argument("--prior-jitter", type=float, default=None,
+                        help="Single frame: give the tracker a pose this close (ratio of the mat size) to the mat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--occlusion", type=float, default=0.5, help="Chance of an occluding blob per frame")
+    parser.add_argument("--frame-size", type=int, nargs=2, default=[640, 480], metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--fusion", choices=("max", "median", "vote"), default=None,
+                        help="Fuse the burst's mat masks (KeyboardTracker.fusion_method)")
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--keymap", default=KEYMAP_PATH)
+    parser.add_argument("--json", default=None, help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    layout = LayoutCache().get_layout(args.template, args.keymap)
+    results = {}
+    for mode in args.modes:
+        if mode == "baseline":
+            tracker = BaselineDetector()
+        else:
+            tracker = KeyboardTracker(layout)
+            tracker.detection_mode = mode
+            tracker.fusion_method = args.fusion
+        # Same seed per mode so every mode sees the same scenes
+        generator = SceneGenerator(args.template, frame_size=tuple(args.frame_size), seed=args.seed,
+                                   occlusion_probability=args.occlusion)
+        benchmark = CalibrationBenchmark(tracker, generator, args.burst_size)
+        single = benchmark.run_single(args.scenes, args.prior_jitter) if args.scenes > 0 else None
+        bursts = benchmark.run_bursts(args.bursts) if args.bursts > 0 else None
+        results[mode] = {"single": single, "bursts": bursts}
+        print(format_report(mode, single, bursts))
+
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
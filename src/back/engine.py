@@ -0,0 +1,130 @@
+import numpy as np
+
+from src.back.hand_tracking import HandTracker
+from src.back.kbm_tracking import KeyboardTracker
+from src.back.keyPressProcessing import KeyPressProcessing
+from src.back.key_event_bus import KeyEvent
+from src.back.layout_cache import LayoutCache
+
+
+class EngineResult:
+    """
+    Everything the engine found on one frame.
+    """
+    __slots__ = ("seq", "timestamp", "landmarks", "corners", "homography", "template_points", "keys", "key_events")
+
+    def __init__(self, seq, timestamp):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.landmarks = None  # (num_hands, 21, 3) normalized landmarks
+        self.corners = None  # (4,2) mat corners in the frame, None while not calibrated
+        self.homography = None  # Frame -> template homography
+        self.template_points = None  # (N,2) fingertips in template space
+        self.keys = None  # Key under each fingertip
+        self.key_events = []  # KeyEvents ("down"/"up") completed on this frame
+
+
+########################################################################################################################
+#   Engine Class - Mat tracking, hand tracking and press detection without any GUI
+########################################################################################################################
+
+class Engine:
+    def __init__(self, layout=None, hand_tracker=None, model_complexity=1, decimation=True, track_pose=True,
+                 auto_calibrate=True, calibration_frames=10, crop_to_mat=False):
+        """
+        Parameters:
+        - layout: CompiledLayout, loaded from the LayoutCache when not given.
+        - hand_tracker: HandTracker to use, an in process one is built when not given.
+        - model_complexity: MediaPipe model for the built HandTracker.
+        - decimation: Let the HandTracker skip inference on frames the predictor can fill in.
+        - track_pose: Follow the mat with optical flow between calibrations.
+        - auto_calibrate: Stream the frames into a calibrator until the corners converge (usually two frames,
+          an attempt fails after calibration_frames frames and the next one starts) unless corners were
+          given with set_corners.
+        - crop_to_mat: Once calibrated only run the hand model on the area around the mat.
+        """
+        self.layout = LayoutCache().get_layout() if layout is None else layout
+        self.kbm_tracker = KeyboardTracker(self.layout)
+        self.hand_tracker = HandTracker(model_complexity) if hand_tracker is None else hand_tracker
+        self.hand_tracker.decimation_enabled = decimation
+        self.hand_tracker.roi_enabled = crop_to_mat
+        self.key_press_processing = KeyPressProcessing(self.kbm_tracker, self.hand_tracker, self.layout.layout_index)
+        self.track_pose = track_pose
+        self.auto_calibrate = auto_calibrate
+        self.calibration_frames = calibration_frames
+        self.calibrator = None  # Automatic calibration in progress
+        self.calibration_failures = 0
+
+    def reset(self):
+        """
+        Forgets the calibration and all tracking state, e.g. before the next recording.
+        """
+        self.kbm_tracker.kbm_corners = [None] * 4
+        self.kbm_tracker.pose_tracker.reset()
+        self.hand_tracker.predictor.reset()
+        self.hand_tracker.frames_since_inference = 0
+        self.hand_tracker.inference_interval = 1
+        self.key_press_processing.pressDetector.reset()
+        self.calibrator = None
+        self.calibration_failures = 0
+
+    def is_calibrated(self):
+        corners = self.kbm_tracker.kbm_corners
+        return corners is not None and None not in corners
+
+    def set_corners(self, corners):
+        # Known calibration (e.g. recorded with the session), skips the automatic calibration
+        corners = np.float32(corners)
+        self.kbm_tracker.apply_projection(corners, self.kbm_tracker.build_warp_engine(corners))
+
+    def calibrate(self, frames):
+        """
+        Calibrates from a burst of frames, returns True on success.
+        """
+        corners = self.kbm_tracker.calibrate(frames)
+        if corners is None:
+            self.calibration_failures += 1
+            return False
+        self.set_corners(corners)
+        return True
+
+    def process(self, frame, timestamp, seq=None):
+        """
+        Runs one frame through pose tracking, hand tracking and press detection.
+
+        Parameters:
+        - frame: BGR frame.
+        - timestamp: Capture time in seconds (monotonic, only differences matter).
+        - seq: Optional frame number carried into the result.
+        """
+        result = EngineResult(seq, timestamp)
+
+        if not self.is_calibrated():
+            if self.auto_calibrate:
+                if self.calibrator is None:
+                    self.calibrator = self.kbm_tracker.create_calibrator()
+                    self.calibrator.max_frames = self.calibration_frames
+                if self.calibrator.add_frame(frame):
+                    if self.calibrator.converged:
+                        self.set_corners(self.calibrator.corners)
+                    else:
+                        self.calibration_failures += 1
+                    self.calibrator = None
+        elif self.track_pose:
+            self.kbm_tracker.track_pose(frame)
+
+        result.landmarks = self.hand_tracker.track(frame, timestamp, self.kbm_tracker.kbm_corners)
+        if not self.is_calibrated():
+            return result
+
+        result.corners = np.float32(self.kbm_tracker.kbm_corners)
+        result.homography = self.kbm_tracker.transformation_matrix
+        result.template_points = self.key_press_processing.update_hand_landmarks(result.landmarks, frame.shape)
+        result.keys = self.key_press_processing.get_finger_button_interaction()
+        presses = self.key_press_processing.detect_key_presses(timestamp, result.keys)
+        result.key_events = [KeyEvent(press.timestamp, self.key_press_processing.get_key_name(press.key),
+                                      press.event_type, "detector") for press in presses]
+        return result
+
+    def close(self):
+        self.hand_tracker.close()
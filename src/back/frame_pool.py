@@ -0,0 +1,83 @@
+import sys
+import threading
+
+import numpy as np
+
+
+def measure_free_refcount():
+    # sys.getrefcount of a pooled buffer nobody else holds, taken with the same access pattern as acquire (the
+    # pool's list, the loop variable and the call argument) since the count differs between Python versions
+    buffers = [np.empty(1, dtype=np.uint8)]
+    for buffer in buffers:
+        return sys.getrefcount(buffer)
+
+
+FREE_REFCOUNT = measure_free_refcount()
+
+
+########################################################################################################################
+#   FramePool Class - Recycles full size frame buffers instead of allocating one per frame
+########################################################################################################################
+
+class FramePool:
+    def __init__(self, max_buffers=8):
+        """
+        A buffer goes back to the pool by itself once the last reference outside the pool is gone (views
+        keep their base alive too), so consumers that hold on to frames (pipeline packets, calibration
+        bursts, the recorder) never need to release anything and can never see a buffer being overwritten.
+
+        Parameters:
+        - max_buffers: Buffers kept per shape, when all of them are in use new ones are allocated (and
+          counted in allocations) but not kept.
+        """
+        self.max_buffers = max_buffers
+        self.buffers = {}  # (shape, dtype) -> list of buffers
+        self.lock = threading.Lock()
+        self.allocations = 0
+        self.reuses = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """
+        Returns a buffer of the given shape that nothing outside the pool references (contents undefined).
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            buffers = self.buffers.get(key)
+            if buffers is None:
+                buffers = self.buffers[key] = []
+            for buffer in buffers:
+                if sys.getrefcount(buffer) <= FREE_REFCOUNT:
+                    self.reuses += 1
+                    return buffer
+
+            buffer = np.empty(shape, dtype)
+            self.allocations += 1
+            if len(buffers) < self.max_buffers:
+                buffers.append(buffer)
+            return buffer
+
+    def clear(self):
+        # Forget every buffer (e.g. after a resolution change), buffers still in use stay valid
+        with self.lock:
+            self.buffers = {}
+
+
+########################################################################################################################
+#   ScratchBuffer Class - Grow-only backing store for per-call outputs of varying size
+########################################################################################################################
+
+class ScratchBuffer:
+    def __init__(self):
+        """
+        For outputs whose size changes from call to call (e.g. resized crops). get() returns a C-contiguous
+        view of one backing array that only grows, so it is only valid until the next get() call and only
+        one thread may use it.
+        """
+        self.backing = np.empty(0, dtype=np.uint8)
+
+    def get(self, shape, dtype=np.uint8):
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        if size > self.backing.nbytes:
+            self.backing = np.empty(size, dtype=np.uint8)
+        return self.backing[:size].view(dtype).reshape(shape)
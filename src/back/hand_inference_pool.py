@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from collections import deque
+
+from src.back.latency_metrics import LatencyMetrics
+
+# Per session latency: capture -> picked up by a worker ("queue") -> landmarks ready ("inference")
+POOL_STAGES = ["capture", "queue", "inference"]
+
+
+class InferenceRequest:
+    __slots__ = ("frame", "seq", "timestamp", "model_complexity", "inference_width")
+
+    def __init__(self, frame, seq, timestamp, model_complexity, inference_width):
+        self.frame = frame
+        self.seq = seq
+        self.timestamp = timestamp
+        self.model_complexity = model_complexity
+        self.inference_width = inference_width
+
+
+########################################################################################################################
+#   PoolClient Class - One session's handle on the shared pool (same interface as ProcessHandInference)
+########################################################################################################################
+
+class PoolClient:
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        self.pending = None  # Newest request not picked up yet, a newer one replaces it
+        self.in_flight = False  # At most one frame per session is being inferred
+        self.results = deque()  # Filled by the workers, emptied by poll
+        self.submitted = 0
+        self.processed = 0
+        self.dropped_frames = 0
+        self.metrics = LatencyMetrics(POOL_STAGES)
+
+    def submit(self, frame, seq, timestamp, model_complexity, inference_width=None, reset_tracking=False):
+        """
+        Queues the frame, replacing a frame of this session that is still waiting (never blocks). The pool
+        detects every frame from scratch anyway, reset_tracking is only there for the common interface.
+        """
+        return self.pool.submit(self, InferenceRequest(frame, seq, timestamp, model_complexity, inference_width))
+
+    def poll(self):
+        """
+        Returns every finished result as a list of (seq, timestamp, landmarks), oldest first.
+        """
+        finished = []
+        while self.results:
+            finished.append(self.results.popleft())
+        return finished
+
+    def close(self):
+        self.pool.remove_client(self)
+
+
+########################################################################################################################
+#   HandInferencePool Class - Fixed number of hand inference workers shared by every session
+########################################################################################################################
+
+class HandInferencePool:
+    def __init__(self, workers=None, backend="process", model_complexity=1, max_num_hands=2,
+                 frame_shape=(480, 640, 3)):
+        """
+        Sessions get a PoolClient (create_client) and hand it to a HandTracker as its remote. Workers take the
+        next waiting session round robin, each session has at most one frame waiting and one in flight, so a
+        busy session can not starve the others and a slow pool drops stale frames instead of queueing them.
+        A worker's next frame can be from any session, so its MediaPipe graph runs in static image mode: in
+        video mode the hands of one session's frame would be the tracking prior for another session's frame.
+
+        Parameters:
+        - workers: Number of workers, defaults to one per core (minus one for the sessions).
+        - backend: "process" gives every worker its own MediaPipe process (scales with cores),
+          "inprocess" runs MediaPipe on the worker threads.
+        - frame_shape: Largest frame the process workers hold, bigger frames are downscaled to fit.
+        """
+        self.worker_count = workers if workers is not None else max(1, (os.cpu_count() or 2) - 1)
+        self.backend = backend
+        self.model_complexity = model_complexity
+        self.max_num_hands = max_num_hands
+        self.frame_shape = frame_shape
+        self.clients = []
+        self.next_client = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.threads = []
+        self.busy_seconds = 0.0
+        self.inference_timeout = 5.0  # Seconds a process worker may take for one frame
+        self.late_result_timeout = 5.0  # Further seconds a timed out frame gets before its worker is replaced
+        self.timeouts = 0
+
+    def create_client(self, name):
+        with self.condition:
+            client = PoolClient(self, name)
+            self.clients.append(client)
+            return client
+
+    def remove_client(self, client):
+        with self.condition:
+            if client in self.clients:
+                self.clients.remove(client)
+
+    def start(self):
+        self.running = True
+        for index in range(self.worker_count):
+            thread = threading.Thread(target=self.run_worker, name=f"hand-pool-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5.0)
+        self.threads = []
+
+    def submit(self, client, request):
+        with self.condition:
+            if client.pending is not None:
+                client.dropped_frames += 1
+            client.pending = request
+            client.submitted += 1
+            client.metrics.begin_frame(request.seq, request.timestamp)
+            self.condition.notify()
+            return True
+
+    def next_request(self):
+        # Round robin over the sessions that have a frame waiting and none in flight (holds the condition)
+        count = len(self.clients)
+        for offset in range(count):
+            index = (self.next_client + offset) % count
+            client = self.clients[index]
+            if client.pending is not None and not client.in_flight:
+                request, client.pending = client.pending, None
+                client.in_flight = True
+                self.next_client = index + 1
+                return client, request
+        return None, None
+
+    def create_backend(self):
+        if self.backend == "process":
+            from src.back.hand_inference_worker import ProcessHandInference
+            return ProcessHandInference(self.frame_shape, slot_count=1, model_complexity=self.model_complexity,
+                                        max_num_hands=self.max_num_hands, static_image_mode=True)
+
+        from src.back.hand_tracking import HandTracker
+        return HandTracker(self.model_complexity, self.max_num_hands, static_image_mode=True)
+
+    def infer(self, backend, request):
+        if self.backend == "process":
+            if not backend.submit(request.frame, request.seq, request.timestamp, request.model_complexity,
+                                  request.inference_width):
+                return None
+            result = backend.wait_result(timeout=self.inference_timeout)
+            if result is None:
+                raise TimeoutError(f"no landmarks within {self.inference_timeout} s")
+            return result[2]
+
+        backend.set_model(model_complexity=request.model_complexity)
+        backend.inference_width = request.inference_width
+        return backend.get_landmark_array(backend.get_hand_landmarks(request.frame))
+
+    def recover_backend(self, backend):
+        """
+        After a timed out inference the process worker still holds its only slot. The late result is drained
+        (and thrown away) so the slot is free again, a worker that does not answer at all is replaced.
+        """
+        if backend.wait_result(timeout=self.late_result_timeout) is not None or backend.free_slots:
+            return backend
+
+        print("[HandInferencePool] Error: Hand worker does not answer, starting a new one")
+        backend.close()
+        return self.create_backend()
+
+    def run_worker(self):
+        backend = self.create_backend()
+        try:
+            while True:
+                with self.condition:
+                    client, request = self.next_request()
+                    while client is None and self.running:
+                        self.condition.wait(0.1)
+                        client, request = self.next_request()
+                    if client is None:
+                        return
+
+                start = time.monotonic()
+                client.metrics.mark(request.seq, "queue", start)
+                try:
+                    landmarks = self.infer(backend, request)
+                except TimeoutError as e:
+                    print(f"[HandInferencePool] Error: Inference timed out for '{client.name}': {e}")
+                    landmarks = None
+                    with self.condition:
+                        self.timeouts += 1
+                    backend = self.recover_backend(backend)
+                except Exception as e:
+                    print(f"[HandInferencePool] Error: Inference failed for '{client.name}': {e}")
+                    landmarks = None
+                done = time.monotonic()
+
+                with self.condition:
+                    self.busy_seconds += done - start
+                    client.in_flight = False
+                    if landmarks is not None:
+                        client.metrics.mark(request.seq, "inference", done)
+                        client.metrics.end_frame(request.seq, done)
+                        client.results.append((request.seq, request.timestamp, landmarks))
+                        client.processed += 1
+                    self.condition.notify()
+        finally:
+            backend.close()
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                "workers": self.worker_count,
+                "backend": self.backend,
+                "busy_seconds": self.busy_seconds,
+                "timeouts": self.timeouts,
+                "sessions": {client.name: {"submitted": client.submitted, "processed": client.processed,
+                                           "dropped": client.dropped_frames} for client in self.clients},
+            }
@@ -0,0 +1,221 @@
+import multiprocessing as mproc
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2 as cv
+import numpy as np
+
+
+########################################################################################################################
+#   SharedFrameRing Class - Preallocated frame slots in shared memory
+########################################################################################################################
+
+class SharedFrameRing:
+    def __init__(self, slot_count, slot_shape, name=None):
+        """
+        Parameters:
+        - slot_count: Number of frame slots.
+        - slot_shape: Largest frame (height, width, channels) a slot can hold.
+        - name: Attach to an existing ring (worker side) instead of creating one.
+        """
+        self.slot_count = slot_count
+        self.slot_shape = tuple(slot_shape)
+        self.slot_bytes = int(np.prod(self.slot_shape))
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=slot_count * self.slot_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.buffer = np.ndarray((slot_count, self.slot_bytes), dtype=np.uint8, buffer=self.shm.buf)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def get_view(self, slot, shape):
+        # Frame shaped view into a slot, no copy
+        return self.buffer[slot, :int(np.prod(shape))].reshape(shape)
+
+    def fit_shape(self, shape):
+        # Largest shape with the frame's aspect ratio and channels that fits a slot
+        if int(np.prod(shape)) <= self.slot_bytes:
+            return tuple(shape)
+        scale = np.sqrt(self.slot_bytes / float(np.prod(shape)))
+        height, width = max(1, int(shape[0] * scale)), max(1, int(shape[1] * scale))
+        return (height, width) + tuple(shape[2:])
+
+    def write(self, slot, frame):
+        """
+        Copies the frame into the slot, frames bigger than a slot are downscaled on the way in (landmarks
+        are normalized, so they do not change). Returns the shape that was written.
+        """
+        shape = self.fit_shape(frame.shape)
+        view = self.get_view(slot, shape)
+        if shape == frame.shape:
+            np.copyto(view, frame)
+        else:
+            cv.resize(frame, (shape[1], shape[0]), dst=view, interpolation=cv.INTER_AREA)
+        return shape
+
+    def close(self):
+        self.buffer = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def run_hand_worker(ring_name, slot_count, slot_shape, requests, results, model_complexity, max_num_hands,
+                    static_image_mode=False):
+    """
+    Worker process entry point. Runs a HandTracker on frames read straight out of the shared ring and
+    sends back (slot, seq, timestamp, landmarks) with landmarks as a (num_hands, 21, 3) float32 array.
+    """
+    # Imported here so the parent never has to load MediaPipe for this module
+    from src.back.hand_tracking import HandTracker
+
+    ring = SharedFrameRing(slot_count, slot_shape, ring_name)
+    hand_tracker = HandTracker(model_complexity, max_num_hands, static_image_mode=static_image_mode)
+    try:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+
+            slot, seq, timestamp, shape, complexity, inference_width, reset_tracking = request
+            hand_tracker.set_model(model_complexity=complexity)
+            hand_tracker.inference_width = inference_width
+            if reset_tracking:
+                hand_tracker.reset_tracking()
+
+            frame = ring.get_view(slot, shape)
+            landmarks = hand_tracker.get_landmark_array(hand_tracker.get_hand_landmarks(frame))
+            results.put((slot, seq, timestamp, landmarks))
+    finally:
+        ring.close()
+
+
+########################################################################################################################
+#   ProcessHandInference Class - Parent side of the worker process
+########################################################################################################################
+
+class ProcessHandInference:
+    def __init__(self, slot_shape=(1080, 1920, 3), slot_count=3, model_complexity=1, max_num_hands=2,
+                 static_image_mode=False):
+        """
+        Parameters:
+        - slot_shape: Largest frame the ring holds, bigger frames are downscaled to fit.
+        - slot_count: Frames that can be in flight at once, new frames are dropped when all slots are busy.
+        - static_image_mode: The worker's MediaPipe graph detects every frame on its own (see HandTracker).
+        """
+        self.ring = SharedFrameRing(slot_count, slot_shape)
+        self.slot_count = slot_count
+        self.model_complexity = model_complexity
+        self.max_num_hands = max_num_hands
+        self.static_image_mode = static_image_mode
+        self.free_slots = list(range(slot_count))
+        self.dropped_frames = 0
+        self.restarts = 0
+        self.worker_failed = False  # Set once max_restarts ran out
+        self.max_restarts = 3  # Worker crashes that are restarted, after that every frame is dropped
+        self.liveness_interval = 0.5  # Seconds wait_result blocks before checking the worker is still alive
+
+        self.context = mproc.get_context("spawn")
+        self.requests = None
+        self.results = None
+        self.process = None
+        self.start_worker()
+
+    def start_worker(self):
+        # Fresh queues too, a worker that died mid put can leave a queue unusable
+        self.requests = self.context.Queue()
+        self.results = self.context.Queue()
+        self.process = self.context.Process(target=run_hand_worker, daemon=True,
+                                            args=(self.ring.name, self.slot_count, self.ring.slot_shape,
+                                                  self.requests, self.results, self.model_complexity,
+                                                  self.max_num_hands, self.static_image_mode))
+        self.process.start()
+        self.free_slots = list(range(self.slot_count))
+
+    def check_worker(self):
+        """
+        Returns True while the worker process is alive. A dead worker is reported and restarted (up to
+        max_restarts times), the frames it held are lost and their slots are free again.
+        """
+        if self.process.is_alive():
+            return True
+        if self.restarts >= self.max_restarts:
+            if not self.worker_failed:
+                self.worker_failed = True
+                print(f"[ProcessHandInference] Error: Hand worker exited with code {self.process.exitcode}, "
+                      f"giving up after {self.restarts} restarts")
+            return False
+
+        self.restarts += 1
+        print(f"[ProcessHandInference] Error: Hand worker exited with code {self.process.exitcode}, "
+              f"restarting ({self.restarts}/{self.max_restarts})")
+        for stale in (self.requests, self.results):
+            stale.cancel_join_thread()
+            stale.close()
+        self.start_worker()
+        return True
+
+    def submit(self, frame, seq, timestamp, model_complexity, inference_width=None, reset_tracking=False):
+        """
+        Copies the frame into a free slot and queues it for inference. Returns False if it was dropped.
+        reset_tracking makes the worker detect the hands from scratch (the frame does not continue the last one).
+        """
+        if not self.check_worker() or not self.free_slots:
+            self.dropped_frames += 1
+            return False
+
+        slot = self.free_slots.pop()
+        shape = self.ring.write(slot, frame)
+        self.requests.put((slot, seq, timestamp, shape, model_complexity, inference_width, reset_tracking))
+        return True
+
+    def poll(self):
+        """
+        Returns every finished result as a list of (seq, timestamp, landmarks), oldest first.
+        """
+        finished = []
+        while True:
+            try:
+                slot, seq, timestamp, landmarks = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.free_slots.append(slot)
+            finished.append((seq, timestamp, landmarks))
+        if not finished:
+            self.check_worker()
+        return finished
+
+    def wait_result(self, timeout=None):
+        """
+        Blocks until the next result arrives, returns (seq, timestamp, landmarks) or None on timeout or
+        when the worker died.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.liveness_interval
+            if deadline is not None:
+                wait = min(wait, max(0.0, deadline - time.monotonic()))
+            try:
+                slot, seq, timestamp, landmarks = self.results.get(timeout=wait)
+                break
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self.check_worker()
+                    return None
+                if deadline is not None and time.monotonic() >= deadline:
+                    return None
+        self.free_slots.append(slot)
+        return seq, timestamp, landmarks
+
+    def close(self):
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.ring.close()
@@ -1,34 +1,414 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2 as cv
-import mediapipe as mp
+import numpy as np
+
+from src.back.frame_pool import ScratchBuffer
+from src.back.landmark_predictor import LandmarkPredictor, NUM_LANDMARKS
+
+# Define the fingertip landmark indices
+FINGERTIP_INDICES = [4, 8, 12, 16, 20]
 
 class HandTracker:
 
-    def __init__(self):
-        self.mpHands = mp.solutions.hands
-        self.hands = self.mpHands.Hands()
-        self.mpDraw = mp.solutions.drawing_utils
+    def __init__(self, model_complexity=1, max_num_hands=2, backend="inprocess", frame_shape=(480, 640, 3),
+                 remote=None, static_image_mode=False):
+        """
+        Parameters:
+        - backend: "inprocess" runs MediaPipe here, "process" runs it in a worker process that reads
+          frames from a shared memory ring (frame_shape is the largest frame it holds, bigger ones are downscaled).
+        - remote: Use this inference client instead (anything with submit/poll/close like ProcessHandInference,
+          e.g. a HandInferencePool client), backend is ignored.
+        - static_image_mode: Every frame is detected on its own instead of tracking the hands from the previous
+          frame (frames that do not follow each other, e.g. a graph shared by several sessions).
+        """
+        self.model_complexity = model_complexity
+        self.max_num_hands = max_num_hands
+        self.static_image_mode = static_image_mode
+        self.mpHands = None
+        self.mpDraw = None
+        self.model_executor = None  # Builds replacement MediaPipe graphs off the calling thread (see set_model)
+        self.pending_hands = None  # Future of the graph being built, swapped in by swap_model
+        self.model_lock = threading.Lock()
+        self.remote = None
+        self.remote_seq = 0
+        if remote is not None:
+            self.hands = None
+            self.remote = remote
+        elif backend == "process":
+            from src.back.hand_inference_worker import ProcessHandInference
+            self.hands = None
+            self.remote = ProcessHandInference(frame_shape, model_complexity=model_complexity,
+                                               max_num_hands=max_num_hands, static_image_mode=static_image_mode)
+        elif backend == "inprocess":
+            # MediaPipe is the slowest import of the app, it is only loaded once a tracker actually needs it
+            # (never in the GUI process with the worker process backend)
+            import mediapipe as mp
+            self.mpHands = mp.solutions.hands
+            self.mpDraw = mp.solutions.drawing_utils
+            self.hands = self.mpHands.Hands(static_image_mode=static_image_mode, model_complexity=model_complexity,
+                                            max_num_hands=max_num_hands)
+        else:
+            raise ValueError(f"Unknown hand inference backend '{backend}'")
+        self.inference_width = None  # Downscale frames to this width before inference (None = full size)
+        self.color_convert_done = None  # time.monotonic() when the last BGR -> RGB conversion finished
+        self.resize_buffer = ScratchBuffer()
+        self.rgb_buffer = ScratchBuffer()
 
-    def get_hand_landmarks(self,input_img):
-        if input_img is None:
+        # Keyboard ROI: only the mat (plus margins and wherever the hands were last) goes to the model
+        self.roi_enabled = False
+        self.roi_margin = 0.15  # Mat box grown by this fraction of its size on every side
+        self.roi_hand_margin = 0.05  # Last hand boxes grown by this fraction of the frame on every side
+        self.roi_max_fraction = 0.85  # Bigger ROIs (share of the frame area) just use the whole frame
+        self.roi_input_size = 384  # Longer side the crop is downscaled to before inference
+        self.roi_grid = 16  # ROI edges snap outward to this pixel grid so the box does not jitter with the hands
+        self.roi_keep_ratio = 0.6  # A new box inside the last ROI keeps it while covering this share of its area
+        self.last_roi = None  # (x0, y0, x1, y1) pixels used for the last inference, None = full frame
+        self.input_roi = None  # ROI of the last frame the graph saw, a different one resets the tracking
+        self.blank_input = None  # Tiny black frame that makes a video mode graph drop its tracked hands
+        self.remote_rois = {}  # seq -> (roi, frame_shape) for frames at the worker
+
+        # Inference decimation, between inferences landmarks come from the predictor
+        self.predictor = LandmarkPredictor()
+        self.decimation_enabled = False
+        self.min_interval = 1  # Fastest hands: infer every frame
+        self.max_interval = 4  # Still hands: infer every max_interval frames
+        self.idle_interval = 2  # No hands in view: infer this often so new hands are picked up quickly
+        self.speed_reference = 0.5  # Hand speed (normalized units/s) at which min_interval is used
+        self.max_predicted_error = 0.01  # Infer right away once the predictor missed by more than this
+        self.inference_interval = 1
+        self.frames_since_inference = 0
+        self.last_inferred = False  # Whether the last track() call ran the model
+
+    def get_hand_landmarks(self,input_img, roi=None):
+        """
+        Runs the model on the frame, or only on the (x0, y0, x1, y1) roi of it. Landmarks of an roi
+        inference are normalized to the roi, map_roi_landmarks brings them back to the frame.
+        """
+        if input_img is None or self.hands is None:
             return None
+        self.swap_model()
+        if roi != self.input_roi:
+            self.reset_tracking()
+            self.input_roi = roi
+
+        # Landmarks are normalized so a smaller input needs no remapping
+        size = None
+        scale = self.get_input_scale(input_img.shape, roi)
+        if roi is not None:
+            # A view, the crop is never copied before the resize / color conversion
+            x0, y0, x1, y1 = roi
+            input_img = input_img[y0:y1, x0:x1]
+        if scale < 1.0:
+            size = (max(1, round(input_img.shape[1] * scale)), max(1, round(input_img.shape[0] * scale)))
+
+        # Resize and color conversion write into reused buffers, nothing frame sized is allocated here
+        if size is not None:
+            input_img = cv.resize(input_img, size, dst=self.resize_buffer.get((size[1], size[0], 3)),
+                                  interpolation=cv.INTER_AREA)
 
         # bgr -> rgb
-        img_rgb = cv.cvtColor(input_img, cv.COLOR_BGR2RGB)
+        img_rgb = cv.cvtColor(input_img, cv.COLOR_BGR2RGB, dst=self.rgb_buffer.get(input_img.shape))
+        self.color_convert_done = time.monotonic()
 
         # Find Landmarks
         results = self.hands.process(img_rgb)
 
         return results
 
+    def get_input_scale(self, frame_shape, roi=None):
+        """
+        Returns the factor the frame (or its roi crop) is resized by before inference. The governor's
+        inference_width scales the whole frame, a crop gets the same pixel density cut and its longer side
+        is additionally limited to roi_input_size.
+        """
+        scale = 1.0
+        if self.inference_width is not None and frame_shape[1] > self.inference_width:
+            scale = self.inference_width / frame_shape[1]
+        if roi is not None:
+            x0, y0, x1, y1 = roi
+            scale = min(scale, self.roi_input_size / max(x1 - x0, y1 - y0))
+        return scale
+
+    def reset_tracking(self):
+        """
+        Makes the next frame be detected from scratch, as in static image mode. In video mode MediaPipe looks
+        for the hands where they were in the previous input, after the input jumped (a different ROI) that is
+        the wrong place. A blank frame makes the graph drop them.
+        """
+        if self.hands is None or self.static_image_mode:
+            return
+        if self.blank_input is None:
+            self.blank_input = np.zeros((64, 64, 3), dtype=np.uint8)
+        self.hands.process(self.blank_input)
+
+    def warm_up(self, frame_shape=(480, 640, 3), timeout=10.0):
+        """
+        Runs the model once on a blank frame so the graph initialization is not paid on the first real frame.
+        Returns False if the worker process did not answer within the timeout.
+        """
+        blank = np.zeros(frame_shape, dtype=np.uint8)
+        if self.remote is None:
+            self.get_hand_landmarks(blank)
+            return True
+
+        # seq 0 is never used by track_remote, the result is thrown away
+        if not self.remote.submit(blank, 0, time.monotonic(), self.model_complexity, self.inference_width):
+            return False
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.remote.poll():
+                return True
+            time.sleep(0.005)
+        return False
+
+    def set_model(self, model_complexity=None, max_num_hands=None):
+        # Rebuilds the MediaPipe graph only when a setting actually changes. Building (and warming up) a graph
+        # takes far longer than a frame, so it happens on model_executor while the current graph keeps running,
+        # the next inference after it is ready swaps it in
+        model_complexity = self.model_complexity if model_complexity is None else model_complexity
+        max_num_hands = self.max_num_hands if max_num_hands is None else max_num_hands
+        if model_complexity == self.model_complexity and max_num_hands == self.max_num_hands:
+            return
+
+        self.model_complexity = model_complexity
+        self.max_num_hands = max_num_hands
+        if self.hands is None:
+            # Worker process picks the new settings up with the next frame
+            self.predictor.reset()
+            return
+
+        with self.model_lock:
+            if self.model_executor is None:
+                self.model_executor = ThreadPoolExecutor(1, thread_name_prefix="hand-model")
+            previous = self.pending_hands
+            self.pending_hands = self.model_executor.submit(self.build_model, model_complexity, max_num_hands)
+        if previous is not None and not previous.cancel():
+            # Already being built, it is closed as soon as it is done
+            previous.add_done_callback(self.close_model_future)
+
+    def build_model(self, model_complexity, max_num_hands):
+        hands = self.mpHands.Hands(static_image_mode=self.static_image_mode, model_complexity=model_complexity,
+                                   max_num_hands=max_num_hands)
+        hands.process(np.zeros((240, 320, 3), dtype=np.uint8))  # Graph initialization, see warm_up
+        return hands
+
+    def swap_model(self):
+        # Called by the inference thread, puts a finished replacement graph in place of the current one
+        with self.model_lock:
+            pending = self.pending_hands
+            if pending is None or not pending.done():
+                return
+            self.pending_hands = None
+
+        try:
+            hands = pending.result()
+        except Exception as e:
+            print(f"[HandTracker] Error: Could not build the hand model, keeping the current one: {e}")
+            return
+        old, self.hands = self.hands, hands
+        self.predictor.reset()
+        self.model_executor.submit(old.close)
+
+    @staticmethod
+    def close_model_future(future):
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def get_landmark_array(self, results):
+        """
+        Converts MediaPipe results into a (num_hands, 21, 3) float32 array of normalized landmarks.
+        """
+        if results is None or results.multi_hand_landmarks is None:
+            return np.empty((0, NUM_LANDMARKS, 3), dtype=np.float32)
+
+        return np.array([[(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark]
+                         for hand_landmarks in results.multi_hand_landmarks], dtype=np.float32)
+
+    def get_roi(self, frame_shape, mat_corners):
+        """
+        Returns the (x0, y0, x1, y1) pixel box the model should look at: the mat's bounding box grown by
+        roi_margin, joined with the last hand boxes grown by roi_hand_margin, snapped to roi_grid and kept
+        (last_roi) while the new box fits inside it. None means the full frame (ROI disabled, no calibration
+        or the box would cover most of the frame anyway).
+        """
+        if not self.roi_enabled or mat_corners is None or any(corner is None for corner in mat_corners):
+            return None
+
+        height, width = frame_shape[:2]
+        corners = np.float32(mat_corners).reshape(-1, 2)
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        margin = (high - low) * self.roi_margin
+        low, high = low - margin, high + margin
+
+        if self.predictor.num_hands > 0:
+            # Hands reaching in from outside the mat must stay in view
+            frame_size = np.float32([width, height])
+            hands = self.predictor.position[:self.predictor.num_hands, :, :2].reshape(-1, 2) * frame_size
+            hand_margin = frame_size * self.roi_hand_margin
+            low = np.minimum(low, hands.min(axis=0) - hand_margin)
+            high = np.maximum(high, hands.max(axis=0) + hand_margin)
+
+        x0, y0 = max(int(low[0]), 0), max(int(low[1]), 0)
+        x1, y1 = min(int(np.ceil(high[0])), width), min(int(np.ceil(high[1])), height)
+        if x1 - x0 < 2 or y1 - y0 < 2:
+            return None
+
+        # Every new box resets the tracking (see reset_tracking), so the last one is kept while the new one
+        # still fits in it and is not much smaller, otherwise the new one is snapped outward to the grid
+        last = self.last_roi
+        if last is not None and last[0] <= x0 and last[1] <= y0 and x1 <= last[2] and y1 <= last[3] \
+                and (x1 - x0) * (y1 - y0) >= self.roi_keep_ratio * (last[2] - last[0]) * (last[3] - last[1]):
+            return last
+        grid = self.roi_grid
+        x0, y0 = x0 // grid * grid, y0 // grid * grid
+        x1, y1 = min(-(-x1 // grid) * grid, width), min(-(-y1 // grid) * grid, height)
+        if (x1 - x0) * (y1 - y0) > self.roi_max_fraction * width * height:
+            return None
+        return x0, y0, x1, y1
+
+    def map_roi_landmarks(self, landmarks, roi, frame_shape):
+        """
+        Maps a (num_hands, 21, 3) landmark array normalized to the roi back to the full frame (in place).
+        """
+        if roi is None or len(landmarks) == 0:
+            return landmarks
+
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = roi
+        roi_width = (x1 - x0) / width
+        landmarks[..., 0] = landmarks[..., 0] * roi_width + x0 / width
+        landmarks[..., 1] = landmarks[..., 1] * ((y1 - y0) / height) + y0 / height
+        landmarks[..., 2] *= roi_width  # MediaPipe depth is on the scale of the input width
+        return landmarks
+
+    def track(self, input_img, timestamp, mat_corners=None):
+        """
+        Returns a (num_hands, 21, 3) array of normalized landmarks for the frame. With decimation enabled
+        the model only runs every inference_interval frames (or when the prediction error grows too
+        large), the frames in between are filled in by the predictor.
+
+        Parameters:
+        - mat_corners: Calibrated mat corners in frame pixels, with roi_enabled the model then only sees
+          the area around the mat (see get_roi).
+        """
+        if self.remote is not None:
+            return self.track_remote(input_img, timestamp, mat_corners)
+
+        self.frames_since_inference += 1
+        self.last_inferred = False
+        if self.decimation_enabled and self.frames_since_inference < self.inference_interval \
+                and self.predictor.residual <= self.max_predicted_error:
+            return self.predictor.predict(timestamp)
+
+        roi = self.get_roi(input_img.shape, mat_corners)
+        self.last_roi = roi
+        landmarks = self.get_landmark_array(self.get_hand_landmarks(input_img, roi))
+        landmarks = self.map_roi_landmarks(landmarks, roi, input_img.shape)
+        landmarks = self.predictor.update(landmarks, timestamp)
+        self.frames_since_inference = 0
+        self.last_inferred = True
+        self.update_inference_interval()
+        return landmarks
+
+    def track_remote(self, input_img, timestamp, mat_corners=None):
+        # Frames go to the worker process, finished results are folded into the predictor
+        # and the landmarks for this frame are predicted from them
+        self.frames_since_inference += 1
+        self.last_inferred = False
+        if not self.decimation_enabled or self.frames_since_inference >= self.inference_interval \
+                or self.predictor.residual > self.max_predicted_error:
+            self.remote_seq += 1
+            # Only the crop crosses to the worker, it is remapped when the result comes back
+            roi = self.get_roi(input_img.shape, mat_corners)
+            self.last_roi = roi
+            frame, inference_width = input_img, self.inference_width
+            if roi is not None:
+                frame = input_img[roi[1]:roi[3], roi[0]:roi[2]]
+                # Scaled as get_hand_landmarks would, expressed as the width limit the worker understands
+                inference_width = max(1, round(frame.shape[1] * self.get_input_scale(input_img.shape, roi)))
+            reset_tracking = roi != self.input_roi
+            if self.remote.submit(frame, self.remote_seq, timestamp, self.model_complexity, inference_width,
+                                  reset_tracking=reset_tracking):
+                self.input_roi = roi
+                self.frames_since_inference = 0
+                self.remote_rois[self.remote_seq] = (roi, input_img.shape)
+                if len(self.remote_rois) > 64:
+                    # Results of dropped frames never come back
+                    for old_seq in sorted(self.remote_rois)[:-32]:
+                        del self.remote_rois[old_seq]
+
+        for seq, result_timestamp, landmarks in self.remote.poll():
+            if seq == 0:
+                continue  # Late warm-up result
+            roi, frame_shape = self.remote_rois.pop(seq, (None, None))
+            if roi is not None:
+                landmarks = self.map_roi_landmarks(landmarks, roi, frame_shape)
+            self.predictor.update(landmarks, result_timestamp)
+            self.last_inferred = True
+        if self.last_inferred:
+            self.update_inference_interval()
+
+        return self.predictor.predict(timestamp)
+
+    def close(self):
+        if self.remote is not None:
+            self.remote.close()
+            self.remote = None
+        with self.model_lock:
+            pending, self.pending_hands = self.pending_hands, None
+        if pending is not None and not pending.cancel():
+            pending.add_done_callback(self.close_model_future)
+        if self.model_executor is not None:
+            self.model_executor.shutdown(wait=False)
+        if self.hands is not None:
+            self.hands.close()
+
+    def update_inference_interval(self):
+        # Faster hands -> infer more often
+        if self.predictor.num_hands == 0:
+            self.inference_interval = self.idle_interval
+            return
+
+        speed = self.predictor.get_speed()
+        interval = self.max_interval if speed <= 0 else int(self.speed_reference / speed)
+        self.inference_interval = min(max(interval, self.min_interval), self.max_interval)
+
+    def get_landmark_points(self, results, frame_shape, indices=None):
+        """
+        Converts the normalized MediaPipe landmarks of every detected hand into an (N,2) float32 array
+        of frame pixel coordinates (at most 2 hands * 21 landmarks = 42 points).
+
+        Parameters:
+        - results: Output of get_hand_landmarks, or a landmark array from get_landmark_array/track.
+        - frame_shape: Shape of the frame the landmarks were found on.
+        - indices: Optional landmark indices to keep per hand (e.g. FINGERTIP_INDICES).
+        """
+        height, width = frame_shape[:2]
+        if isinstance(results, np.ndarray):
+            hands = results if indices is None else results[:, indices]
+            return (hands[..., :2] * np.float32([width, height])).reshape(-1, 2).astype(np.float32)
+
+        if results is None or results.multi_hand_landmarks is None:
+            return np.empty((0, 2), dtype=np.float32)
+
+        points = []
+        for hand_landmarks in results.multi_hand_landmarks:
+            landmarks = hand_landmarks.landmark
+            hand_indices = range(len(landmarks)) if indices is None else indices
+            for index in hand_indices:
+                points.append((landmarks[index].x * width, landmarks[index].y * height))
+
+        return np.array(points, dtype=np.float32).reshape(-1, 2)
+
     def draw_landmarks(self, img, results):
         if results.multi_hand_landmarks is None:
             return img
 
-        # Define the fingertip landmark indices
-        fingertip_indices = [4, 8, 12, 16, 20]
-
         for hand_landmarks in results.multi_hand_landmarks:
-            for index in fingertip_indices:
+            for index in FINGERTIP_INDICES:
                 # Get the x,y coordinates of the landmark
                 x = int(hand_landmarks.landmark[index].x * img.shape[1])
                 y = int(hand_landmarks.landmark[index].y * img.shape[0])
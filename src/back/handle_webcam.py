@@ -2,31 +2,255 @@
 # set the video feed from the front end
 # draw the hands
 # draw the keyboard layout
+import threading
+import time
+from collections import deque
+
 import cv2 as cv
 
+from src.back.frame_pool import FramePool
+
+
+class CapturedFrame:
+    """
+    A single frame from the camera along with when (monotonic seconds) and in what order it was captured.
+    """
+    __slots__ = ("image", "timestamp", "seq")
+
+    def __init__(self, image, timestamp, seq):
+        self.image = image
+        self.timestamp = timestamp
+        self.seq = seq
+
+
+class FrameMailbox:
+    """
+    Bounded mailbox between the reader thread and the consumers. When full the oldest frame is
+    thrown away so the newest frame always wins.
+    """
+
+    def __init__(self, capacity=1):
+        self.frames = deque(maxlen=capacity)
+        self.condition = threading.Condition()
+        self.dropped_frames = 0
+
+    def put(self, frame):
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.dropped_frames += 1
+            self.frames.append(frame)
+            self.condition.notify_all()
+
+    def get_latest(self, timeout=None):
+        """
+        Returns the newest frame and empties the mailbox. Returns None if nothing arrives within timeout
+        (timeout=None means don't wait at all).
+        """
+        with self.condition:
+            if not self.frames and timeout is not None:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None
+            frame = self.frames.pop()
+            self.dropped_frames += len(self.frames)
+            self.frames.clear()
+            return frame
+
+    def clear(self):
+        with self.condition:
+            self.frames.clear()
+
+
+class CaptureThread(threading.Thread):
+    """
+    Dedicated reader thread. Blocks on cap.read() so the UI thread never has to.
+    """
+
+    def __init__(self, cap, mailbox, frame_pool=None, first_seq=0, recorder=None):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.mailbox = mailbox
+        self.frame_pool = frame_pool  # Frames are read into recycled buffers when given
+        self.recorder = recorder  # Gets every captured frame (record_frame), e.g. a SessionRecorder
+        self.frame_shape = None
+        self.running = True
+        self.seq = first_seq  # Continues where the previous thread stopped so seq stays monotonic
+        self.read_failures = 0
+
+    def run(self):
+        while self.running:
+            # The first frame tells the size, after that OpenCV decodes straight into a pooled buffer
+            buffer = None
+            if self.frame_pool is not None and self.frame_shape is not None:
+                buffer = self.frame_pool.acquire(self.frame_shape)
+            captured = self.read_frame(buffer)
+            if captured is None:
+                self.read_failures += 1
+                time.sleep(0.005)
+                continue
+
+            self.frame_shape = captured.image.shape
+            self.mailbox.put(captured)
+            if self.recorder is not None:
+                # Here rather than on the consumer, so frames the mailbox drops are recorded too
+                self.recorder.record_frame(captured.image, captured.timestamp, captured.seq)
+
+    def read_frame(self, buffer=None):
+        """
+        Reads the next frame (into buffer when given). Returns a CapturedFrame, None when the read failed.
+        """
+        ret, frame = self.cap.read(buffer)
+        timestamp = time.monotonic()
+        if not ret:
+            return None
+
+        captured = CapturedFrame(frame, timestamp, self.seq)
+        self.seq += 1
+        return captured
+
+    def stop(self):
+        self.running = False
+        if self.is_alive():
+            self.join(timeout=1.0)
+
+
+class FileVideoCapture:
+    """
+    cv.VideoCapture on a video file that reads like a live camera: read() blocks until the frame is due
+    at the file's frame rate and the file starts over at the end when loop is set.
+    """
+
+    def __init__(self, path, loop=True, fps=None):
+        self.capture = cv.VideoCapture(path)
+        self.loop = loop
+        self.fps = fps or self.capture.get(cv.CAP_PROP_FPS) or 30.0
+        self.next_time = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def get(self, prop):
+        if prop == cv.CAP_PROP_FPS:
+            return self.fps
+        return self.capture.get(prop)
+
+    def set(self, prop, value):
+        if prop == cv.CAP_PROP_FPS:
+            self.fps = value
+            return True
+        return False  # A file has the size it has
+
+    def read(self, image=None):
+        now = time.monotonic()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        # Fell behind -> resync instead of bursting frames out
+        self.next_time = max(self.next_time, now - 1.0 / self.fps) + 1.0 / self.fps
+
+        ret, frame = self.capture.read(image)
+        if not ret and self.loop:
+            self.capture.set(cv.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read(image)
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
 
 class WebCamHandler:
-    def __init__(self):
+    def __init__(self, mailbox_size=1, device=0):
+        self.device = device
         self.capture = None
+        self.capture_thread = None
+        self.mailbox = FrameMailbox(mailbox_size)
+        self.frame_pool = FramePool(max_buffers=16)  # Enough for the mailbox, the pipeline and a calibration burst
+        self.last_seq = -1
+        self.next_seq = 0  # seq of the first frame the next capture thread reads
+        self.recorder = None  # Gets every captured frame on the capture thread (e.g. a SessionRecorder)
 
-    def start_webcam(self):
-        self.capture = cv.VideoCapture(0, cv.CAP_DSHOW)
+    def start_webcam(self, width=None, height=None, fps=None):
+        self.capture = cv.VideoCapture(self.device, cv.CAP_DSHOW)
         if not self.capture.isOpened():
             print("[WebCamHandler] Error: Could not open webcam.")
             return
 
+        if width is not None:
+            self.capture.set(cv.CAP_PROP_FRAME_WIDTH, width)
+        if height is not None:
+            self.capture.set(cv.CAP_PROP_FRAME_HEIGHT, height)
+        if fps is not None:
+            self.capture.set(cv.CAP_PROP_FPS, fps)
+
+        self.start_capture_thread()
+
+    def start_capture_thread(self):
+        # A restarted source must not have its frames rejected as older than the last one pulled
+        self.mailbox.clear()
+        self.frame_pool.clear()
+        self.last_seq = -1
+        self.capture_thread = self.create_capture_thread()
+        self.capture_thread.start()
+
+    def create_capture_thread(self):
+        return CaptureThread(self.capture, self.mailbox, self.frame_pool, self.next_seq, self.recorder)
+
     def stop_webcam(self):
-        self.capture.release()
+        if self.capture_thread is not None:
+            self.capture_thread.stop()
+            self.next_seq = self.capture_thread.seq
+            self.capture_thread = None
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
 
-    def get_webcam_frame(self):
-        if self.capture is None:
-            # print("[WebcamHandler] Error: Webcam not started.")
+    def get_frame(self, timeout=None):
+        """
+        Pulls the newest captured frame. Returns None if there is no frame newer than the last one pulled.
+        """
+        if self.capture_thread is None:
             return None
 
-        ret, frame = self.capture.read()
-        if not ret:
-            print("[WebcamHandler] Error: Could not read frame.")
+        frame = self.mailbox.get_latest(timeout)
+        if frame is None or frame.seq <= self.last_seq:
             return None
 
+        self.last_seq = frame.seq
         return frame
 
+    def get_webcam_frame(self):
+        frame = self.get_frame()
+        if frame is None:
+            return None
+
+        return frame.image
+
+    def get_dropped_frames(self):
+        return self.mailbox.dropped_frames
+
+    def get_read_failures(self):
+        if self.capture_thread is None:
+            return 0
+        return self.capture_thread.read_failures
+
+
+class FileCaptureSource(WebCamHandler):
+    """
+    Plays a video file through the same capture thread and mailbox as a camera, e.g. to stand in for
+    extra cameras when running several sessions.
+    """
+
+    def __init__(self, path, loop=True, mailbox_size=1):
+        super().__init__(mailbox_size)
+        self.path = path
+        self.loop = loop
+
+    def start_webcam(self, width=None, height=None, fps=None):
+        self.capture = FileVideoCapture(self.path, self.loop, fps)
+        if not self.capture.isOpened():
+            print(f"[FileCaptureSource] Error: Could not open '{self.path}'.")
+            self.capture = None
+            return
+
+        self.start_capture_thread()
@@ -1,210 +1,279 @@
-from tempfile import template
+import threading
+import time
 
 import cv2 as cv
 import numpy as np
-from numpy import dtype
 
+from src.back.frame_pool import FramePool
+from src.back.key_regions import TEMPLATE_PATH
+from src.back.pose_tracker import PoseTracker
+from src.back.streaming_calibrator import StreamingCalibrator
+from src.back.warp_engine import WarpEngine
 
 
 class KeyboardTracker:
-    def __init__(self):
+    def __init__(self, layout=None):
         self.kbm_corners = [None] * 4
-        button_regions, kbm_template = self.init_kbm_template()
+        if layout is not None:
+            # Template analysis was already done (CompiledLayout, usually loaded from the LayoutCache)
+            button_regions, kbm_template = layout.contours, layout.cropped_template
+        else:
+            button_regions, kbm_template = self.init_kbm_template()
         self.button_regions = button_regions
         self.og_kbm_template = kbm_template
         self.transformation_matrix = None
+        height, width = kbm_template.shape[:2]
+        self.warp_engine = WarpEngine((width, height))
+        # kbm_corners / warp_engine are swapped together under this lock (pose thread, recalibration on the
+        # UI thread), readers on other threads take a consistent pair with get_projection
+        self.projection_lock = threading.RLock()
+        # Called with (time.monotonic(), corners) after every applied projection, manual recalibrations as well
+        # as pose tracking and redetection updates (e.g. SessionRecorder.record_calibration)
+        self.on_projection_change = None
+        self.pose_tracker = PoseTracker()
+        # Hysteresis on the tracked corner motion (px) against the applied pose: a still mat only rebuilds the
+        # homography once the optical flow jitter adds up to min_pose_motion, a moving one is followed until it
+        # moves less than settle_pose_motion per update
+        self.min_pose_motion = 2.5
+        self.settle_pose_motion = 1.0
+        self.pose_moving = False
+        self.redetect_interval = 15  # Frames between full detection attempts while tracking is lost
+        self.frames_since_redetect = 0
+        # A redetected pose is only applied once the estimates of consecutive frames agree (StreamingCalibrator
+        # convergence), the attempts after a first estimate run every frame
+        self.redetect_max_frames = 3
+        self.redetect_calibrator = None
+        self.redetect_lock = threading.Lock()  # redetect_corners runs on the pose thread or a worker
+        self.refine_window = 5  # Half size of the cornerSubPix search window (see refine_corners)
+        self.last_failure = None  # Why the last calibrate call failed ("no_contours", "not_converged", ...)
+        self.frame_pool = FramePool(max_buffers=4)  # Grayscale frames for pose tracking and preview outputs
+        # Corner movement (ratio of the mat diagonal) the estimate may still show for a calibration to finish
+        self.calibration_tolerance = 0.003
+        self.calibration_max_frames = 10  # Frames a calibration may take before it fails
+        self.last_calibration_frames = 0  # Frames the last calibrate() call actually used
+        self.fusion_method = None  # How calibration frames' masks are combined: None, "max", "median" or "vote"
+        self.fusion_votes = None  # k for "vote", None means a majority
+        self.fusion_capacity = 8  # Masks kept in memory during a calibration burst
+        self.detection_mode = "full"  # "full" (full resolution) or "fast" (pyramid level + ROI + sub-pixel refine)
+        self.detection_width = 640  # Fast mode: detect on the first pyramid level narrower than twice this
+        self.roi_pad_ratio = 0.2  # Fast mode: padding around the current pose (ratio of the mat size)
         pass
 
+    def set_camera_calibration(self, camera_matrix, dist_coeffs):
+        # Optional lens calibration folded into the warp lookup table, the engine is replaced (never changed
+        # in place) so frames already holding the old one keep a consistent projection
+        with self.projection_lock:
+            engine = WarpEngine(self.warp_engine.template_size)
+            engine.set_camera_calibration(camera_matrix, dist_coeffs)
+            engine.set_corners(self.warp_engine.corners)
+            self.warp_engine = engine
+            self.transformation_matrix = engine.transformation_matrix
+
     def recalibrate_projection(self,frames):
+        # Returns True when the projection was replaced, on failure the previous corners stay and
+        # last_failure says why
         if frames is None:
-            return
-
-        combo_masked_frame = self.get_combined_mask_frame(frames)
-
-        old_corners = self.kbm_corners
-        self.kbm_corners = self.get_corners(combo_masked_frame)
-
-        if self.kbm_corners is None:
-            self.kbm_corners = old_corners
+            return False
+
+        corners = self.calibrate(frames)
+        if corners is None:
+            print(f"[KeyboardTracker] Error: Calibration failed ({self.last_failure}), keeping the previous corners")
+            return False
+
+        self.apply_projection(corners, self.build_warp_engine(corners))
+        return True
+
+    def create_calibrator(self, max_frames=None):
+        max_frames = max_frames or self.calibration_max_frames
+        return StreamingCalibrator(self, self.calibration_tolerance, max_frames=max_frames,
+                                   fusion_method=self.fusion_method, fusion_votes=self.fusion_votes,
+                                   fusion_capacity=self.fusion_capacity, detection_mode=self.detection_mode,
+                                   detection_width=self.detection_width, roi_pad_ratio=self.roi_pad_ratio)
+
+    def calibrate(self, frames):
+        # Streams frames (any iterable, read lazily) into a StreamingCalibrator and stops as soon as the
+        # corners converged, returns the corners or None. Only reads the tracker state (worker thread safe)
+        calibrator = self.create_calibrator()
+        for frame in frames:
+            if calibrator.add_frame(frame):
+                break
+        self.last_calibration_frames = calibrator.frames_used
+        if not calibrator.converged:
+            self.last_failure = calibrator.last_failure or ("no_frames" if calibrator.frames_used == 0
+                                                            else "not_converged")
+            return None
+        return calibrator.corners
+
+    def build_warp_engine(self, corners):
+        # Builds a fresh warp engine for the new corners (off the UI thread) so it can be swapped in whole
+        engine = WarpEngine(self.warp_engine.template_size)
+        engine.set_camera_calibration(self.warp_engine.camera_matrix, self.warp_engine.dist_coeffs)
+        engine.set_corners(corners)
+        return engine
+
+    def apply_projection(self, corners, warp_engine, reset_tracking=True):
+        # Swap in the new corners and homography together
+        with self.projection_lock:
+            self.warp_engine = warp_engine
+            self.transformation_matrix = warp_engine.transformation_matrix
+            self.kbm_corners = corners
+            if reset_tracking:
+                # The next track_pose call picks up features from the new pose
+                self.pose_tracker.reset()
+            self.redetect_calibrator = None
+        if self.on_projection_change is not None:
+            self.on_projection_change(time.monotonic(), corners)
+
+    def get_projection(self):
+        # (corners, warp_engine) of the same calibration. A warp engine is never changed once applied, so the
+        # pair stays valid on any thread after another calibration was swapped in
+        with self.projection_lock:
+            return self.kbm_corners, self.warp_engine
+
+    def track_pose(self, frame, redetect=None):
+        # Follows the mat between recalibrations, falls back to a full single frame detection only
+        # when the optical flow track is lost. redetect(frame) (e.g. RecalibrationWorker.redetect) runs that
+        # detection somewhere else, without it the detection runs here
+        if frame is None:
+            return False
+
+        # Held so a recalibration applied from another thread can not land between the update and its apply
+        with self.projection_lock:
+            if self.kbm_corners is None or None in self.kbm_corners:
+                return False
+
+            # The pose tracker keeps the previous gray frame, the pool hands out the other buffer
+            gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY, dst=self.frame_pool.acquire(frame.shape[:2]))
+            if self.pose_tracker.corners is None:
+                self.pose_tracker.reset(gray, self.kbm_corners)
+                return self.pose_tracker.is_tracking()
+
+            if self.pose_tracker.is_tracking():
+                corners = self.pose_tracker.update(gray)
+                if corners is not None:
+                    motion = np.abs(corners - np.float32(self.kbm_corners)).max()
+                    threshold = self.settle_pose_motion if self.pose_moving else self.min_pose_motion
+                    self.pose_moving = motion >= threshold
+                    if self.pose_moving:
+                        self.apply_projection(corners, self.build_warp_engine(corners), reset_tracking=False)
+                    return True
+
+            # Tracking lost, retry the full detection every few frames
+            self.pose_moving = False
+            self.frames_since_redetect += 1
+            if self.frames_since_redetect < self.redetect_interval and not self.is_redetect_pending():
+                return False
+            self.frames_since_redetect = 0
+
+        if redetect is not None:
+            # The result comes back through apply_projection, which restarts the pose tracker
+            redetect(frame)
+            return False
+
+        corners = self.redetect_corners(frame)
+        if corners is None:
+            return False
+        with self.projection_lock:
+            self.apply_projection(corners, self.build_warp_engine(corners), reset_tracking=False)
+            self.pose_tracker.reset(gray, corners)
+            return self.pose_tracker.is_tracking()
+
+    def redetect_corners(self, frame):
+        # Detection used when pose tracking is lost (worker thread safe): the frame goes into the redetection
+        # calibrator and the corners are returned once they agree with the previous frames' estimate. Until then
+        # returns None and last_failure is "unconfirmed" (or why the frame gave no estimate)
+        with self.redetect_lock:
+            calibrator = self.redetect_calibrator
+            if calibrator is None:
+                calibrator = self.create_calibrator(self.redetect_max_frames)
+                self.redetect_calibrator = calibrator
+            calibrator.add_frame(frame)
+            if calibrator.converged:
+                self.redetect_calibrator = None
+                return calibrator.corners
+
+            self.last_failure = calibrator.last_failure or "unconfirmed"
+            if calibrator.done:
+                self.redetect_calibrator = None
+            return None
 
+    def is_redetect_pending(self):
+        # True while a redetected pose waits for the next frame to confirm it
+        calibrator = self.redetect_calibrator
+        return calibrator is not None and len(calibrator.estimates) > 0
 
-    def get_wapped_frame(self,frame):
+    def get_wapped_frame(self,frame, scale=1.0, dst=None, warp_engine=None):
+        # dst: optional (H,W,3) output of warp_engine.get_output_size(scale), e.g. a display buffer,
+        # otherwise a pooled buffer that is recycled once the caller lets go of the result.
+        # warp_engine: the calibration the frame was tracked with (see get_projection), defaults to the current one
         if frame is None:
             return
-        if self.kbm_corners is None:
+        if warp_engine is None:
+            warp_engine = self.get_projection()[1]
+        if warp_engine.corners is None:
             return
 
-        warped_frame = self.warp_frame(frame, self.kbm_corners)
-        return warped_frame
-
-    def get_kbm_mask(self,frame):
-
-        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-
-        # Apply GaussianBlur
-        blur = cv.GaussianBlur(gray, (5, 5), 0)
-
-        # Apply thresholding
-        _, thresh = cv.threshold(blur, 150, 255, cv.THRESH_BINARY)
+        if dst is None:
+            width, height = warp_engine.get_output_size(scale)
+            dst = self.frame_pool.acquire((height, width, frame.shape[2]) if frame.ndim == 3 else (height, width))
 
-        processed_frame = thresh
-
-        # Find contours on the processed frame
-        contours, _ = cv.findContours(processed_frame, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
-
-        # If no contours are found, return early
-        if not contours:
-            return
-
-        # Find the largest contour by area
-        big = max(contours, key=cv.contourArea)
-
-        # Find the convex hull of the largest contour
-        hull = cv.convexHull(big)
-
-        # Draw the convex hull on the frame
-        blank = np.zeros_like(frame)
-        cv.drawContours(blank, [hull], -1, (255, 255, 255), -2)  # Fill the contour with white
-        blank = cv.dilate(blank, np.ones((5, 5), np.uint8), iterations=2)
-
-        return blank
-
-    def get_combined_mask_frame(self, frames):
-        # Takes in an array of raw capture from webcam
-        # Masks the kbm then or's them all together thus (Averaging them)
-
-        if frames is None:
-            return
+        warped_frame = self.warp_frame(frame, scale, dst, warp_engine)
+        return warped_frame
 
-        combo_frame = np.zeros_like(frames[0], dtype=np.uint8)
-        for frame in frames:
-            mask = self.get_kbm_mask(frame)
-            if mask is None or None in mask:
+    def project_points(self, points, warp_engine=None):
+        # Frame pixel points -> template space, uses the cached homography (rotation included)
+        if warp_engine is None:
+            warp_engine = self.get_projection()[1]
+        return warp_engine.project_points(points)
+
+    def refine_corners(self, frame, corners):
+        # Sub-pixel refinement of the corners at full resolution, only a patch around each corner is
+        # thresholded. A corner that wanders out of its search window (e.g. the computed missing corner) keeps
+        # its coarse position
+        coarse = np.float32(corners).reshape(-1, 2)
+        refined = coarse.copy()
+        height, width = frame.shape[:2]
+        # Search window, the largest accepted move and the two 5x5 blurs' borders
+        pad = 2 * self.refine_window + 6
+        criteria = (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 30, 0.01)
+        for index, (x, y) in enumerate(coarse):
+            # cornerSubPix rejects corners outside the image (a computed corner can land off screen)
+            if not (0 <= x < width and 0 <= y < height):
                 continue
-            combo_frame = np.maximum(combo_frame,mask)
-
-        # Convert to grayscale and apply Gaussian blur
-        gray_blank = cv.cvtColor(combo_frame, cv.COLOR_BGR2GRAY)
-        blur = cv.GaussianBlur(gray_blank, (5, 5), 0)
-
-        return blur
-
-    def get_corners(self, combo_mask):
-
-        # Get Contours from combined frames
-        contours, _ = cv.findContours(combo_mask, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
-        if len(contours) == 0:
-            print("[get_corners] Failed did not find any contours")
-            return None
-
-        big = max(contours, key=cv.contourArea)
-        approx = cv.approxPolyDP(big, 0.02 * cv.arcLength(big, True), True)
-
-        if len(approx) != 5:
-            print("[get_corners] Failed not 5 corners in aprox")
-            return None
-
-        # Sort points
-        points = self.reorder(approx, combo_mask)
-
-        ################################################################################
-
-        # Calculate Missing corner
-        new_point = self.line_intersection(points[2], points[0], points[3], points[4])
-
-        # Add the new point to the list of points
-        points = np.append(points, [new_point], axis=0)
-        points = np.delete(points, [2,3], axis=0)
-
-        # Reorder to [top_left, top_right, bottom_right, bottom_left]
-        points = np.array([points[3], points[0], points[1], points[2]])
-
-        return points
-
-    def line_intersection(self,p1, p2, p3, p4):
-        """
-        Find the intersection of two lines formed by points p1-p2 and p3-p4.
-        Each point is a tuple (x, y).
-        """
-        # Line 1 (p1, p2): y = m1 * x + b1
-        # Line 2 (p3, p4): y = m2 * x + b2
-
-        # Calculate the slope (m) and intercept (b) of the lines
-        m1 = (p2[1] - p1[1]) / (p2[0] - p1[0]) if p2[0] != p1[0] else np.inf  # m1 for line a
-        b1 = p1[1] - m1 * p1[0] if m1 != np.inf else p1[0]  # b1 for line a (special case for vertical line)
-
-        m2 = (p4[1] - p3[1]) / (p4[0] - p3[0]) if p4[0] != p3[0] else np.inf  # m2 for line b
-        b2 = p3[1] - m2 * p3[0] if m2 != np.inf else p3[0]  # b2 for line b (special case for vertical line)
-
-        # Find intersection
-        if m1 == m2:  # Parallel lines don't intersect
-            return None
-
-        if m1 != np.inf and m2 != np.inf:  # Both lines are not vertical
-            x = (b2 - b1) / (m1 - m2)
-            y = m1 * x + b1
-            return (x, y)
-        elif m1 == np.inf:  # Line 1 is vertical
-            x = b1
-            y = m2 * x + b2
-            return (x, y)
-        elif m2 == np.inf:  # Line 2 is vertical
-            x = b2
-            y = m1 * x + b1
-            return (x, y)
-
-    def reorder(self, myPoints, screen):
-        # Reshape points to (5, 2) as intended
-        myPoints = myPoints.reshape((5, 2))
-
-        # Create a new array for sorted points
-        myPointsNew = np.zeros((5, 2), dtype=np.int32)
-
-        # Get the image dimensions
-        height, width = screen.shape
-
-        # Define the top-right corner coordinates
-        top_right = np.array([width - 1, 0])
-
-        # Calculate distances from each point to the top-right corner
-        distances = [np.linalg.norm(point - top_right) for point in myPoints]
-
-        # Sort points by distance to the top-right corner
-        # Convert points to lists so they are not ambiguous in sorting
-        sorted_points = [point.tolist() for _, point in sorted(zip(distances, myPoints))]
-
-        # Assign sorted points to myPointsNew
-        myPointsNew = np.array(sorted_points, dtype=np.int32)
-
-        return myPointsNew
-
-    def warp_frame (self, frame, points):
-        if points is None:
-            return None, None
+            x0, y0 = max(int(x) - pad, 0), max(int(y) - pad, 0)
+            patch = frame[y0:int(y) + pad + 1, x0:int(x) + pad + 1]
+            gray = cv.cvtColor(patch, cv.COLOR_BGR2GRAY) if patch.ndim == 3 else patch
+            _, thresh = cv.threshold(cv.GaussianBlur(gray, (5, 5), 0), 150, 255, cv.THRESH_BINARY)
+            thresh = cv.GaussianBlur(thresh, (5, 5), 0)
 
-        height, width = self.og_kbm_template.shape[:2]
+            point = np.float32([[[x - x0, y - y0]]])
+            cv.cornerSubPix(thresh, point, (self.refine_window, self.refine_window), (-1, -1), criteria)
+            refined[index] = point[0, 0] + [x0, y0]
 
-        # Ensure points are in float32 format for the transformation function
-        pts1 = np.float32(points)
-        pts2 = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+        moved = np.linalg.norm(refined - coarse, axis=1) > self.refine_window
+        refined[moved] = coarse[moved]
+        return refined
 
-        # Compute the perspective transformation matrix and warp the frame
-        matrix = cv.getPerspectiveTransform(pts1, pts2)
-        self.transformation_matrix = matrix
-        warped_image = cv.warpPerspective(frame, matrix, (width, height))
-        warped_image = cv.rotate(warped_image, cv.ROTATE_180)
+    def warp_frame (self, frame, scale=1.0, dst=None, warp_engine=None):
+        # Homography + 180 rotation + display scale are one precomputed remap. The engine already holds its
+        # corners (build_warp_engine), it is only read here so a snapshot taken on another thread stays valid
+        if warp_engine is None:
+            warp_engine = self.get_projection()[1]
 
-        result = warped_image
+        result = warp_engine.warp(frame, scale, dst)
 
         return result
 
-    def draw_button_regions(self,frame):
-        result = cv.drawContours(frame, self.button_regions, -1, (0, 0, 255), 2)
+    def draw_button_regions(self,frame, scale=1.0):
+        regions = self.button_regions
+        if scale != 1.0:
+            regions = [np.round(region * scale).astype(np.int32) for region in regions]
+        result = cv.drawContours(frame, regions, -1, (0, 0, 255), 2)
         return result
 
     def init_kbm_template(self):
         # Load and prepare the template in grayscale
-        og_template = cv.imread('../../Resources/kbm_template.jpg')
+        og_template = cv.imread(TEMPLATE_PATH)
 
         # Ensure the image was loaded
         if og_template is None:
@@ -1,9 +1,94 @@
 # combine app both kbm and hand tracking in keyPressProcessing.py
+import cv2 as cv
+import numpy as np
+
+from src.back.hand_tracking import FINGERTIP_INDICES
+from src.back.press_detector import PressDetector
+
 
 class KeyPressProcessing:
-     def __init__(self):
-         self.curHandLandmarks = None
+     def __init__(self, kbm_tracker=None, hand_tracker=None, layout_index=None):
+         self.kbmTracker = kbm_tracker
+         self.handTracker = hand_tracker
+         self.layoutIndex = layout_index  # KeyLayoutIndex, used for O(1) key lookups when available
+         self.curHandLandmarks = None  # (N,2) landmark points in frame pixels
+         self.curTemplatePoints = None  # (N,2) the same points in template space
+         self.curFingertipDepths = None  # (N,) MediaPipe z of the fingertips
          self.keyboardTransdoeMatrix = None
          self.processedButtonRegions = None
+         # Both hit-test paths return key ids starting at 1, 0 means "no key"
+         self.pressDetector = PressDetector(no_key=0)
+
+     def update_hand_landmarks(self, results, frame_shape, warp_engine=None):
+         """
+         Stores the fingertips of the latest MediaPipe results and projects them into template space.
+         Only the landmark points are transformed, no frame is warped.
+
+         Parameters:
+         - warp_engine: Calibration the frame was tracked with (KeyboardTracker.get_projection), defaults to
+           the tracker's current one.
+         """
+         if warp_engine is None:
+             warp_engine = self.kbmTracker.get_projection()[1]
+         if not isinstance(results, np.ndarray):
+             results = self.handTracker.get_landmark_array(results)
+         self.curFingertipDepths = results[:, FINGERTIP_INDICES, 2].ravel()
+         self.curHandLandmarks = self.handTracker.get_landmark_points(results, frame_shape, FINGERTIP_INDICES)
+         self.keyboardTransdoeMatrix = warp_engine.projection_matrix
+         self.curTemplatePoints = self.kbmTracker.project_points(self.curHandLandmarks, warp_engine)
+         return self.curTemplatePoints
+
+     def get_finger_button_interaction(self):
+         """
+         Returns the key id under each fingertip, 0 when not over a key. With a layout index this is a single
+         vectorized gather, otherwise button region i (KeyboardTracker.button_regions) is key id i + 1.
+         """
+         if self.curTemplatePoints is None:
+             return np.empty(0, dtype=np.int32)
+
+         if self.layoutIndex is not None:
+             return self.layoutIndex.query(self.curTemplatePoints)
+
+         interactions = np.zeros(len(self.curTemplatePoints), dtype=np.int32)
+         for finger, (x, y) in enumerate(self.curTemplatePoints):
+             for i, region in enumerate(self.kbmTracker.button_regions):
+                 if cv.pointPolygonTest(region, (float(x), float(y)), False) >= 0:
+                     interactions[finger] = i + 1
+                     break
+         return interactions
+
+     def detect_key_presses(self, timestamp, keys=None):
+         """
+         Feeds the latest fingertips into the press detector and returns the PressEvents ("down"/"up") they
+         completed, timestamps are interpolated between frames.
+
+         Parameters:
+         - timestamp: Capture time of the frame passed to update_hand_landmarks.
+         - keys: Result of get_finger_button_interaction for this frame (looked up when not given).
+         """
+         if self.curTemplatePoints is None:
+             return []
+         if keys is None:
+             keys = self.get_finger_button_interaction()
+         return self.pressDetector.update(timestamp, self.curTemplatePoints, self.curFingertipDepths, keys)
+
+     def get_key_name(self, key):
+         """
+         Name of a detected key, e.g. "a" or "space" (first button mapped to the key in keyMappings.csv).
+         """
+         if self.layoutIndex is None:
+             return f"region {key}"
+         buttons = self.layoutIndex.get_buttons(key)
+         if not buttons:
+             return self.layoutIndex.get_region_name(key)
+         return buttons[0].split(", ")[0]
+
+     def draw_fingertips(self, img, scale=1.0, points=None):
+         # Draw the projected fingertips straight onto an (already warped) template image
+         points = self.curTemplatePoints if points is None else points
+         if points is None:
+             return img
 
-     # def get_finger_button_interaction(self):
+         for x, y in points * scale:
+             cv.circle(img, (int(x), int(y)), 2, (0, 255, 0), cv.FILLED)
+         return img
@@ -0,0 +1,126 @@
+import time
+
+
+class KeyEvent:
+    """
+    One key event on the bus.
+    """
+    __slots__ = ("timestamp", "name", "event_type", "source")
+
+    def __init__(self, timestamp, name, event_type, source):
+        self.timestamp = timestamp  # time.monotonic() clock
+        self.name = name  # Key name, same naming as the keyboard library ("a", "space", "backspace", ...)
+        self.event_type = event_type  # "down" or "up"
+        self.source = source  # Producer name, e.g. "detector" or "keyboard"
+
+    def __repr__(self):
+        return f"KeyEvent({self.source}: {self.name} {self.event_type} @ {self.timestamp:.4f})"
+
+
+########################################################################################################################
+#   KeyEventRing Class - Single-producer / single-consumer ring buffer without locks
+########################################################################################################################
+
+class KeyEventRing:
+    def __init__(self, source, capacity=1024):
+        """
+        Only one thread may publish and only the bus drains. The producer writes the slot before it moves
+        write_index and the consumer reads the slots before it moves read_index, each index has a single writer
+        (the GIL keeps the plain attribute stores in order), so neither side ever takes a lock or waits.
+
+        Parameters:
+        - source: Name stamped on every event of this producer.
+        - capacity: Slots, rounded up to a power of two. When full new events are dropped (and counted),
+          the producer never blocks.
+        """
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.source = source
+        self.slots = [None] * size
+        self.mask = size - 1
+        self.write_index = 0
+        self.read_index = 0
+        self.dropped = 0
+
+    def publish(self, name, event_type="down", timestamp=None):
+        """
+        Producer side, returns False if the ring was full and the event was dropped.
+        """
+        write_index = self.write_index
+        if write_index - self.read_index > self.mask:
+            self.dropped += 1
+            return False
+
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        self.slots[write_index & self.mask] = KeyEvent(timestamp, name, event_type, self.source)
+        self.write_index = write_index + 1
+        return True
+
+    def drain(self, out, max_events=None):
+        # Consumer side, appends the pending events to out
+        read_index = self.read_index
+        count = self.write_index - read_index
+        if max_events is not None:
+            count = min(count, max_events)
+
+        for index in range(read_index, read_index + count):
+            slot = index & self.mask
+            out.append(self.slots[slot])
+            self.slots[slot] = None
+        self.read_index = read_index + count
+        return count
+
+
+########################################################################################################################
+#   KeyEventBus Class - Gathers key events from producer threads into batches for the consumers
+########################################################################################################################
+
+class KeyEventBus:
+    def __init__(self, capacity=1024):
+        """
+        Every producer thread gets its own ring (create_producer), the consumer thread (normally the UI) drains
+        all rings at once with drain or dispatch.
+        """
+        self.capacity = capacity
+        self.rings = []
+        self.subscribers = []
+
+    def create_producer(self, source):
+        """
+        Returns the KeyEventRing a single producer thread publishes into.
+        Create all producers before the consumer starts draining.
+        """
+        ring = KeyEventRing(source, self.capacity)
+        self.rings = self.rings + [ring]
+        return ring
+
+    def subscribe(self, callback):
+        # callback(batch) is called from the consumer thread with every non-empty batch
+        self.subscribers.append(callback)
+
+    def drain(self, max_events=None):
+        """
+        Returns the pending events of all producers in time order (at most max_events per producer).
+        """
+        batch = []
+        sources = 0
+        for ring in self.rings:
+            if ring.drain(batch, max_events):
+                sources += 1
+        if sources > 1:
+            batch.sort(key=lambda event: event.timestamp)
+        return batch
+
+    def dispatch(self, max_events=None):
+        """
+        Drains once and hands the batch to every subscriber, returns the batch.
+        """
+        batch = self.drain(max_events)
+        if batch:
+            for callback in self.subscribers:
+                callback(batch)
+        return batch
+
+    def get_dropped(self):
+        return sum(ring.dropped for ring in self.rings)
@@ -1,18 +1,34 @@
+import os
+
 import numpy as np
 import cv2 as cv
 import csv
 
+# Resources are found relative to this file, not the working directory
+RESOURCES_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Resources"))
+TEMPLATE_PATH = os.path.join(RESOURCES_DIR, "kbmTemplate.jpg")
+KEYMAP_PATH = os.path.join(RESOURCES_DIR, "keyMappings.csv")
+
+# Pixels cropped off the template image (top, bottom, left, right)
+TEMPLATE_CROP_BOUNDS = (0, 39, 39, 16)
+
+# Template pixels brighter than this are key interiors (or background), darker ones are outlines
+KEY_INTERIOR_THRESHOLD = 200
 
 ########################################################################################################################
 #   KeyRegions Class - Handles key mapping and region sorting
 ########################################################################################################################
 
 class KeyRegions:
-    def __init__(self, keymap_path="../../Resources/keyMappings.csv"):
+    def __init__(self, keymap_path=KEYMAP_PATH, template_path=TEMPLATE_PATH):
         """
         Initializes KeyRegions object with keymap path.
         """
-        self.template_processor = TemplateProcessor()
+        self.template_processor = TemplateProcessor(template_path)
+        if self.template_processor.cropped_template is None:
+            # Everything below needs the template, fail here instead of deep inside OpenCV
+            raise FileNotFoundError(f"The template image '{template_path}' could not be loaded")
+        self.regions = None  # Raw contours found on the template
         self.keymap = self.load_keymap(keymap_path)  # Load the keymap from CSV
         self.sorted_button_regions = self.get_key_regions()  # Get the sorted key regions
 
@@ -27,6 +43,7 @@ class KeyRegions:
         Retrieves and sorts the key regions.
         """
         regions = self.find_regions()
+        self.regions = regions
         sorted_regions = self.sort_regions(regions)
         return sorted_regions
 
@@ -94,7 +111,8 @@ class KeyRegions:
         """
         Displays the regions on the template image with different colored rectangles and labels.
         """
-        blank = np.zeros((self.cropped_template.shape[0], self.cropped_template.shape[1], 3), dtype=np.uint8)
+        cropped_template = self.template_processor.cropped_template
+        blank = np.zeros((cropped_template.shape[0], cropped_template.shape[1], 3), dtype=np.uint8)
         colors = [(0, 0, 255), (0, 255, 0), (255, 0, 0), (255, 255, 0), (255, 0, 255)]
         template = blank.copy()
 
@@ -114,7 +132,7 @@ class KeyRegions:
         Finds the regions on the template image by applying thresholding, blur, and erosion,
         followed by contour detection.
         """
-        gray = cv.cvtColor(self.cropped_template, cv.COLOR_BGR2GRAY)
+        gray = cv.cvtColor(self.template_processor.cropped_template, cv.COLOR_BGR2GRAY)
         inverted_image = 255 - gray  # Invert to make objects white
         _, threshold = cv.threshold(inverted_image, 20, 255, cv.THRESH_BINARY)
 
@@ -131,13 +149,193 @@ class KeyRegions:
 
         return contours
 
+    def find_keys(self):
+        """
+        Finds the filled key interiors (the white areas enclosed by the key outlines) and names them after
+        the keymap. Template rows are matched to keymap rows from the bottom up (the function row above the
+        number row has no keymap entries) and keys from left to right, keys past the end of a keymap row
+        (navigation column, arrows) are left out.
+
+        Returns:
+        - (region_names, contours): "row:col" names and the matching key contours, in keymap order.
+        """
+        if not self.keymap:
+            raise ValueError("No keymap loaded, the template keys can not be named")
+
+        template = self.template_processor.cropped_template
+        gray = cv.cvtColor(template, cv.COLOR_BGR2GRAY)
+        height = gray.shape[0]
+        _, interiors = cv.threshold(gray, KEY_INTERIOR_THRESHOLD, 255, cv.THRESH_BINARY)
+        count, labels, stats, _ = cv.connectedComponentsWithStats(interiors, connectivity=4)
+
+        # Keys are compact blobs, the background around them and the strips between double outlines are not
+        keys = []
+        for label in range(1, count):
+            x, y, w, h, area = stats[label]
+            if height * 0.05 <= h <= height * 0.3 and area >= 0.6 * w * h:
+                keys.append((x, y, w, h, label))
+        if not keys:
+            raise ValueError("No keys found on the template")
+
+        # Rows by vertical centre, keys a little lower (e.g. the arrow keys) still belong to their row
+        key_height = float(np.median([key[3] for key in keys]))
+        rows = []
+        for key in sorted(keys, key=lambda k: k[1] + k[3] / 2):
+            center_y = key[1] + key[3] / 2
+            if rows and center_y - rows[-1][0] < key_height / 2:
+                rows[-1][1].append(key)
+            else:
+                rows.append((center_y, [key]))
+
+        row_lengths = {}
+        for region in set(self.keymap.values()):
+            row, col = (int(part) for part in region.split(":"))
+            row_lengths[row] = max(row_lengths.get(row, 0), col + 1)
+        keymap_rows = max(row_lengths) + 1
+        if keymap_rows > len(rows):
+            raise ValueError(f"The keymap has {keymap_rows} rows but the template only {len(rows)}")
+
+        region_names = []
+        contours = []
+        first_row = len(rows) - keymap_rows
+        for i in range(keymap_rows):
+            row = sorted(rows[first_row + i][1], key=lambda k: k[0])
+            if len(row) < row_lengths.get(i, 0):
+                raise ValueError(f"Keymap row {i} has {row_lengths[i]} keys but the template row only {len(row)}")
+            for j, (x, y, w, h, label) in enumerate(row[:row_lengths.get(i, 0)]):
+                mask = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+                outline, _ = cv.findContours(mask, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE, offset=(int(x), int(y)))
+                region_names.append(f"{i}:{j}")
+                contours.append(max(outline, key=cv.contourArea))
+
+        expected = len(set(self.keymap.values()))
+        if len(region_names) != expected:
+            raise ValueError(f"Found {len(region_names)} keys on the template but the keymap has {expected}")
+        return region_names, contours
+
+########################################################################################################################
+#   KeyLayoutIndex Class - Compiled key-label raster for O(1) fingertip -> key lookups
+########################################################################################################################
+
+class KeyLayoutIndex:
+    def __init__(self, label_image, nearest_label_image, nearest_distance_image, region_names, centroids, keymap):
+        """
+        Compiled layout. Key ids start at 1, 0 means "no key".
+
+        Parameters:
+        - label_image: uint16 image (template sized), each pixel stores the id of the key covering it.
+        - nearest_label_image: uint16 image with the id of the nearest key (used for the outlines between keys).
+        - nearest_distance_image: float32 image with the distance to that key in template pixels.
+        - region_names: List of "row:col" names indexed by key id (index 0 is unused).
+        - centroids: (K+1,2) array of key centroids indexed by key id.
+        - keymap: The button -> "row:col" mapping from keyMappings.csv.
+        """
+        self.label_image = label_image
+        self.nearest_label_image = nearest_label_image
+        self.nearest_distance_image = nearest_distance_image
+        self.region_names = region_names
+        self.centroids = centroids
+        self.keymap = keymap if keymap is not None else {}
+        self.max_gap_distance = 6.0  # Points this close to a key count as on it (the outlines are ~8 px wide)
+
+        # "row:col" -> buttons (the reverse of the keymap)
+        self.region_buttons = {}
+        for button, region in self.keymap.items():
+            self.region_buttons.setdefault(region, []).append(button)
+
+    @classmethod
+    def from_key_regions(cls, key_regions):
+        """
+        Builds the index from KeyRegions.find_keys and the loaded keymap.
+        """
+        region_names, contours = key_regions.find_keys()
+        return cls.compile(region_names, contours, key_regions.template_processor.cropped_template.shape,
+                           key_regions.keymap)
+
+    @classmethod
+    def compile(cls, region_names, contours, template_shape, keymap):
+        """
+        Rasterizes the key contours (see KeyRegions.find_keys), key id i is region_names[i - 1].
+        """
+        height, width = template_shape[:2]
+        region_names = [None] + list(region_names)
+
+        label_image = np.zeros((height, width), dtype=np.uint16)
+        centroids = np.full((len(region_names), 2), -1.0, dtype=np.float32)
+        for key_id, contour in enumerate(contours, 1):
+            cv.fillPoly(label_image, [np.asarray(contour, dtype=np.int32)], int(key_id))
+            x, y, w, h = cv.boundingRect(contour)
+            centroids[key_id] = (x + w / 2, y + h / 2)
+
+        # Nearest key (and the distance to it) for points on the outlines between keys
+        keys = label_image > 0
+        if keys.any():
+            distance, labels = cv.distanceTransformWithLabels(np.where(keys, 0, 255).astype(np.uint8), cv.DIST_L2,
+                                                              cv.DIST_MASK_PRECISE, labelType=cv.DIST_LABEL_PIXEL)
+            label_to_key = np.zeros(labels.max() + 1, dtype=np.uint16)
+            label_to_key[labels[keys]] = label_image[keys]
+            nearest_label_image = label_to_key[labels]
+        else:
+            distance = np.full((height, width), np.inf, dtype=np.float32)
+            nearest_label_image = np.zeros((height, width), dtype=np.uint16)
+
+        return cls(label_image, nearest_label_image, distance.astype(np.float32), region_names, centroids, keymap)
+
+    def query(self, points, max_gap_distance=None):
+        """
+        Resolves every point at once with a single gather into the label raster.
+
+        Parameters:
+        - points: (N,2) array of template-space points (all fingertips of both hands).
+        - max_gap_distance: Points off a key are given the nearest key if it is at most this far away (template
+          pixels). None uses self.max_gap_distance, 0 disables the fallback.
+
+        Returns:
+        - (N,) int array of key ids, 0 when no key was found.
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        height, width = self.label_image.shape
+        ids = np.zeros(len(points), dtype=np.int32)
+
+        xs = np.rint(points[:, 0]).astype(np.intp)
+        ys = np.rint(points[:, 1]).astype(np.intp)
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        xs, ys = xs[inside], ys[inside]
+
+        hit = self.label_image[ys, xs].astype(np.int32)
+        if max_gap_distance is None:
+            max_gap_distance = self.max_gap_distance
+        if max_gap_distance > 0:
+            gap = hit == 0
+            fallback = self.nearest_label_image[ys, xs].astype(np.int32)
+            fallback[self.nearest_distance_image[ys, xs] > max_gap_distance] = 0
+            hit[gap] = fallback[gap]
+
+        ids[inside] = hit
+        return ids
+
+    def get_region_name(self, key_id):
+        """
+        Returns the "row:col" name for a key id (None for 0).
+        """
+        if key_id <= 0 or key_id >= len(self.region_names):
+            return None
+        return self.region_names[key_id]
+
+    def get_buttons(self, key_id):
+        """
+        Returns the keyboard buttons mapped to a key id in keyMappings.csv.
+        """
+        return self.region_buttons.get(self.get_region_name(key_id), [])
+
+
 ########################################################################################################################
 #   TemplateProcessor Class - Handles template loading and cropping
 ########################################################################################################################
 
 class TemplateProcessor:
 
-    def __init__(self, template_path="../../Resources/kbm_template.jpg"):
+    def __init__(self, template_path=TEMPLATE_PATH):
         """
         Initializes TemplateProcessor with the provided template image path.
         """
@@ -153,11 +351,7 @@ class TemplateProcessor:
             print("Error: Image not found or unable to load.")
             return None
 
-        # Replace the variables with the given values
-        top_bound = 0
-        bottom_bound = 39
-        left_bound = 39
-        right_bound = 16
+        top_bound, bottom_bound, left_bound, right_bound = TEMPLATE_CROP_BOUNDS
 
         # Crop the image using the bounds
         crop = self.original_template[top_bound:self.original_template.shape[0] - bottom_bound,
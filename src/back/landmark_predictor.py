@@ -0,0 +1,93 @@
+import numpy as np
+
+MAX_HANDS = 2
+NUM_LANDMARKS = 21
+
+
+########################################################################################################################
+#   LandmarkPredictor Class - Constant velocity (alpha-beta) predictor over all hand landmarks
+########################################################################################################################
+
+class LandmarkPredictor:
+    def __init__(self, alpha=0.85, beta=0.3):
+        """
+        State is kept in NumPy arrays of shape (MAX_HANDS, NUM_LANDMARKS, 3) in normalized MediaPipe units.
+
+        Parameters:
+        - alpha: Position gain, how much a new measurement is trusted over the prediction.
+        - beta: Velocity gain.
+        """
+        self.alpha = alpha
+        self.beta = beta
+        self.position = np.zeros((MAX_HANDS, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.velocity = np.zeros((MAX_HANDS, NUM_LANDMARKS, 3), dtype=np.float32)
+        self.num_hands = 0
+        self.timestamp = None
+        self.residual = 0.0  # Mean prediction error (normalized units) seen at the last measurement
+
+    def reset(self):
+        self.velocity.fill(0)
+        self.num_hands = 0
+        self.timestamp = None
+        self.residual = 0.0
+
+    def predict(self, timestamp):
+        """
+        Returns the (num_hands, NUM_LANDMARKS, 3) landmarks extrapolated to the given time.
+        """
+        if self.timestamp is None:
+            return self.position[:0].copy()
+
+        dt = timestamp - self.timestamp
+        return self.position[:self.num_hands] + self.velocity[:self.num_hands] * dt
+
+    def update(self, landmarks, timestamp):
+        """
+        Folds a new measurement (num_hands, NUM_LANDMARKS, 3) into the state.
+        Returns the measurement with its hands in the same order as the state.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float32)[:MAX_HANDS]
+        count = len(landmarks)
+
+        # Hands appearing / disappearing restart the filter, nothing to predict from
+        if self.timestamp is None or count != self.num_hands or count == 0:
+            self.position[:count] = landmarks
+            self.velocity.fill(0)
+            self.num_hands = count
+            self.timestamp = timestamp
+            self.residual = 0.0
+            return landmarks
+
+        landmarks = self.match_hands(landmarks)
+        dt = timestamp - self.timestamp
+        if dt <= 0:
+            self.position[:count] = landmarks
+            return landmarks
+
+        predicted = self.position[:count] + self.velocity[:count] * dt
+        error = landmarks - predicted
+        self.residual = float(np.abs(error[..., :2]).mean())
+
+        self.position[:count] = predicted + self.alpha * error
+        self.velocity[:count] += (self.beta / dt) * error
+        self.timestamp = timestamp
+        return landmarks
+
+    def match_hands(self, landmarks):
+        # MediaPipe does not keep the hand order stable, match hands by wrist position
+        if len(landmarks) != 2:
+            return landmarks
+
+        wrists = landmarks[:, 0, :2]
+        prev = self.position[:2, 0, :2]
+        same = np.linalg.norm(wrists - prev, axis=1).sum()
+        swapped = np.linalg.norm(wrists[::-1] - prev, axis=1).sum()
+        return landmarks[::-1] if swapped < same else landmarks
+
+    def get_speed(self):
+        """
+        Mean landmark speed (normalized units per second) of the tracked hands.
+        """
+        if self.num_hands == 0:
+            return 0.0
+        return float(np.linalg.norm(self.velocity[:self.num_hands, :, :2], axis=-1).mean())
@@ -0,0 +1,191 @@
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Stages a frame is timestamped at, in pipeline order
+FRAME_STAGES = ["capture", "color_convert", "inference", "hit_test", "warp", "display"]
+KEY_EVENT_STAGE = "capture_to_key"
+
+
+########################################################################################################################
+#   LatencyHistogram Class - Rolling log-linear (HDR style) latency histogram
+########################################################################################################################
+
+class LatencyHistogram:
+    def __init__(self, sub_buckets=32, max_exponent=27, window_seconds=60.0, windows=6):
+        """
+        Values are recorded in microseconds into buckets that are linear within each power of two, so the
+        relative error stays around 1/sub_buckets from 1 us up to 2**max_exponent us (~2 min).
+
+        Parameters:
+        - window_seconds: Time span the percentiles cover.
+        - windows: Number of slices the span is split into, the oldest slice is dropped as time moves on.
+        """
+        self.sub_buckets = sub_buckets
+        self.max_exponent = max_exponent
+        self.slice_seconds = window_seconds / windows
+        self.counts = np.zeros((windows, (max_exponent + 1) * sub_buckets), dtype=np.int64)
+        self.slice_start = time.monotonic()
+        self.slice_index = 0
+        self.total_count = 0
+        self.max_us = 0.0
+
+    def bucket_index(self, value_us):
+        value_us = max(value_us, 1.0)
+        exponent = min(int(np.log2(value_us)), self.max_exponent)
+        fraction = min(value_us / (2.0 ** exponent) - 1.0, 0.999999)
+        return exponent * self.sub_buckets + int(fraction * self.sub_buckets)
+
+    def bucket_value(self, index):
+        # Upper edge of a bucket
+        exponent, sub = divmod(index, self.sub_buckets)
+        return (2.0 ** exponent) * (1.0 + (sub + 1) / self.sub_buckets)
+
+    def rotate(self, now):
+        while now - self.slice_start >= self.slice_seconds:
+            self.slice_start += self.slice_seconds
+            self.slice_index = (self.slice_index + 1) % len(self.counts)
+            self.counts[self.slice_index] = 0
+            if now - self.slice_start > self.slice_seconds * len(self.counts):
+                # Idle for longer than the whole window, start over
+                self.counts[:] = 0
+                self.slice_start = now
+
+    def record(self, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        self.rotate(now)
+        value_us = seconds * 1e6
+        self.counts[self.slice_index, self.bucket_index(value_us)] += 1
+        self.total_count += 1
+        self.max_us = max(self.max_us, value_us)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99), now=None):
+        """
+        Returns ({quantile: milliseconds}, count) over the rolling window.
+        """
+        self.rotate(time.monotonic() if now is None else now)
+        counts = self.counts.sum(axis=0)
+        count = int(counts.sum())
+        if count == 0:
+            return {q: None for q in quantiles}, 0
+
+        cumulative = np.cumsum(counts)
+        values = {}
+        for q in quantiles:
+            index = int(np.searchsorted(cumulative, q * count))
+            values[q] = self.bucket_value(index) / 1000.0
+        return values, count
+
+
+########################################################################################################################
+#   LatencyMetrics Class - Per-stage and capture-to-key latency for every frame
+########################################################################################################################
+
+class LatencyMetrics:
+    def __init__(self, stages=None, window_seconds=60.0):
+        self.stages = list(FRAME_STAGES if stages is None else stages)
+        self.histograms = {stage: LatencyHistogram(window_seconds=window_seconds)
+                           for stage in self.stages[1:] + ["end_to_end", KEY_EVENT_STAGE]}
+        self.frames = {}  # seq -> (last stage time, capture time)
+        self.lock = threading.Lock()
+
+    def begin_frame(self, seq, capture_timestamp):
+        with self.lock:
+            self.frames[seq] = (capture_timestamp, capture_timestamp)
+            # Frames that never reached display should not pile up
+            if len(self.frames) > 256:
+                for old_seq in sorted(self.frames)[:-128]:
+                    del self.frames[old_seq]
+
+    def mark(self, seq, stage, timestamp=None):
+        """
+        Timestamps a frame at a stage, the time since the previous mark goes into that stage's histogram.
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self.lock:
+            frame = self.frames.get(seq)
+            if frame is None:
+                return
+            last, capture = frame
+            self.histograms[stage].record(timestamp - last, timestamp)
+            self.frames[seq] = (timestamp, capture)
+
+    def end_frame(self, seq, timestamp=None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self.lock:
+            frame = self.frames.pop(seq, None)
+            if frame is not None:
+                self.histograms["end_to_end"].record(timestamp - frame[1], timestamp)
+
+    def record_key_event(self, capture_timestamp, timestamp=None):
+        # Capture of the frame that produced a key event -> the moment the event was emitted
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self.lock:
+            self.histograms[KEY_EVENT_STAGE].record(timestamp - capture_timestamp, timestamp)
+
+    def snapshot(self):
+        """
+        Returns {stage: {"count", "p50_ms", "p95_ms", "p99_ms", "max_ms"}}.
+        """
+        with self.lock:
+            snapshot = {}
+            for stage, histogram in self.histograms.items():
+                values, count = histogram.percentiles()
+                snapshot[stage] = {
+                    "count": count,
+                    "p50_ms": values[0.5],
+                    "p95_ms": values[0.95],
+                    "p99_ms": values[0.99],
+                    "max_ms": histogram.max_us / 1000.0 if histogram.total_count else None,
+                }
+            return snapshot
+
+    def export(self, path):
+        """
+        Writes a snapshot, the format follows the extension: .json, .csv or .prom (Prometheus text file).
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".json":
+            self.export_json(path)
+        elif extension == ".csv":
+            self.export_csv(path)
+        elif extension == ".prom":
+            self.export_prometheus(path)
+        else:
+            raise ValueError(f"Unknown metrics format '{extension}', expected .json, .csv or .prom")
+
+    def export_json(self, path):
+        self.write_atomic(path, json.dumps({"timestamp": time.time(), "stages": self.snapshot()}, indent=2))
+
+    def export_csv(self, path):
+        snapshot = self.snapshot()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["stage", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+            for stage, values in snapshot.items():
+                writer.writerow([stage, values["count"], values["p50_ms"], values["p95_ms"], values["p99_ms"],
+                                 values["max_ms"]])
+        os.replace(tmp_path, path)
+
+    def export_prometheus(self, path):
+        lines = ["# HELP perfectpress_latency_seconds Rolling per-stage latency.",
+                 "# TYPE perfectpress_latency_seconds summary"]
+        for stage, values in self.snapshot().items():
+            for quantile, key in (("0.5", "p50_ms"), ("0.95", "p95_ms"), ("0.99", "p99_ms")):
+                if values[key] is not None:
+                    lines.append(f'perfectpress_latency_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                                 f'{values[key] / 1000.0:.6f}')
+            lines.append(f'perfectpress_latency_seconds_count{{stage="{stage}"}} {values["count"]}')
+        self.write_atomic(path, "\n".join(lines) + "\n")
+
+    def write_atomic(self, path, text):
+        # Readers (e.g. the node exporter text file collector) never see a half written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
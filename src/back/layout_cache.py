@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from src.back.key_regions import KeyRegions, KeyLayoutIndex, TEMPLATE_CROP_BOUNDS, TEMPLATE_PATH, KEYMAP_PATH
+
+CACHE_MAGIC = b"PPLAYOUT"
+CACHE_VERSION = 2
+CACHE_ALIGNMENT = 64
+
+
+########################################################################################################################
+#   CompiledLayout Class - Everything derived from the template and the keymap
+########################################################################################################################
+
+class CompiledLayout:
+    def __init__(self, cropped_template, contours, sorted_regions, keymap, layout_index):
+        """
+        Parameters:
+        - cropped_template: The cropped BGR template image.
+        - contours: Key contours in key id order (the KeyboardTracker button regions, contours[i] is key id i + 1).
+        - sorted_regions: KeyRegions.sort_regions output (rows of bounding rects).
+        - keymap: button -> "row:col" mapping from keyMappings.csv.
+        - layout_index: Compiled KeyLayoutIndex.
+        """
+        self.cropped_template = cropped_template
+        self.contours = contours
+        self.sorted_regions = sorted_regions
+        self.keymap = keymap
+        self.layout_index = layout_index
+
+    @classmethod
+    def build(cls, template_path, keymap_path):
+        """
+        Runs the full OpenCV template analysis once (used when there is no cache hit). Raises
+        FileNotFoundError when the template can not be loaded and ValueError when its keys do not match the
+        keymap.
+        """
+        key_regions = KeyRegions(keymap_path, template_path)
+        cropped = key_regions.template_processor.cropped_template
+        region_names, contours = key_regions.find_keys()
+        index = KeyLayoutIndex.compile(region_names, contours, cropped.shape, key_regions.keymap)
+        return cls(cropped, contours, key_regions.sorted_button_regions, key_regions.keymap, index)
+
+
+########################################################################################################################
+#   LayoutCache Class - Single file binary cache, keyed by a hash of the inputs
+########################################################################################################################
+
+class LayoutCache:
+    def __init__(self, cache_dir=None):
+        """
+        Parameters:
+        - cache_dir: Where cache files are written. Defaults to a .layout_cache folder next to the template.
+        """
+        self.cache_dir = cache_dir
+
+    def get_cache_key(self, template_path, keymap_path, crop_bounds=TEMPLATE_CROP_BOUNDS):
+        """
+        Hashes the template image, the crop bounds and keyMappings.csv. Returns None if an input is missing.
+        """
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}:{tuple(crop_bounds)}".encode())
+        for path in (template_path, keymap_path):
+            try:
+                with open(path, "rb") as file:
+                    digest.update(file.read())
+            except OSError:
+                return None
+        return digest.hexdigest()
+
+    def get_cache_path(self, template_path, key):
+        cache_dir = self.cache_dir
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(template_path)), ".layout_cache")
+        return os.path.join(cache_dir, f"layout-{key[:16]}.bin")
+
+    def get_layout(self, template_path=TEMPLATE_PATH, keymap_path=KEYMAP_PATH):
+        """
+        Loads the compiled layout from the cache, building and storing it on a miss.
+        """
+        key = self.get_cache_key(template_path, keymap_path)
+        if key is None:
+            return CompiledLayout.build(template_path, keymap_path)
+
+        path = self.get_cache_path(template_path, key)
+        layout = self.load(path, key)
+        if layout is not None:
+            return layout
+
+        layout = CompiledLayout.build(template_path, keymap_path)
+        try:
+            self.save(path, key, layout)
+        except OSError as e:
+            print(f"[LayoutCache] Error: Could not write cache file '{path}': {e}")
+        return layout
+
+    def save(self, path, key, layout):
+        index = layout.layout_index
+        contours = [np.asarray(c, dtype=np.int32).reshape(-1, 1, 2) for c in layout.contours]
+        contour_offsets = np.cumsum([0] + [len(c) for c in contours]).astype(np.int64)
+        contour_points = np.concatenate(contours) if contours else np.empty((0, 1, 2), dtype=np.int32)
+
+        arrays = {
+            "cropped_template": layout.cropped_template,
+            "contour_points": contour_points,
+            "contour_offsets": contour_offsets,
+            "label_image": index.label_image,
+            "nearest_label_image": index.nearest_label_image,
+            "nearest_distance_image": index.nearest_distance_image,
+            "centroids": index.centroids,
+        }
+
+        # Header describes where every array lives, arrays follow at aligned offsets
+        header = {
+            "key": key,
+            "keymap": layout.keymap,
+            "sorted_regions": [[list(rect) for rect in row] for row in layout.sorted_regions],
+            "region_names": index.region_names,
+            "arrays": {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            arrays[name] = array
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+
+        header_bytes = json.dumps(header).encode()
+        prefix_len = len(CACHE_MAGIC) + 8 + len(header_bytes)
+        data_start = -(-prefix_len // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(CACHE_MAGIC)
+            file.write(struct.pack("<Q", len(header_bytes)))
+            file.write(header_bytes)
+            for name, array in arrays.items():
+                file.seek(data_start + header["arrays"][name]["offset"])
+                file.write(array.tobytes())
+        os.replace(tmp_path, path)
+
+    def load(self, path, key):
+        """
+        Memory maps a cache file. Returns None if it is missing, stale or corrupt.
+        """
+        try:
+            with open(path, "rb") as file:
+                if file.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                    return None
+                header_len, = struct.unpack("<Q", file.read(8))
+                header = json.loads(file.read(header_len))
+        except (OSError, ValueError, struct.error):
+            return None
+
+        if header.get("key") != key:
+            return None
+
+        prefix_len = len(CACHE_MAGIC) + 8 + header_len
+        data_start = -(-prefix_len // CACHE_ALIGNMENT) * CACHE_ALIGNMENT
+        arrays = {}
+        for name, info in header["arrays"].items():
+            shape = tuple(info["shape"])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=info["dtype"])
+            else:
+                arrays[name] = np.memmap(path, dtype=info["dtype"], mode="r",
+                                         offset=data_start + info["offset"], shape=shape)
+
+        offsets = arrays["contour_offsets"]
+        contours = [arrays["contour_points"][offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+        sorted_regions = [[tuple(rect) for rect in row] for row in header["sorted_regions"]]
+
+        index = KeyLayoutIndex(arrays["label_image"], arrays["nearest_label_image"],
+                               arrays["nearest_distance_image"], header["region_names"],
+                               arrays["centroids"], header["keymap"])
+        return CompiledLayout(arrays["cropped_template"], contours, sorted_regions, header["keymap"], index)
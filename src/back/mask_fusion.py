@@ -0,0 +1,70 @@
+import numpy as np
+
+
+########################################################################################################################
+#   MaskFusion Class - Preallocated mask stack with a single vectorized reduction
+########################################################################################################################
+
+class MaskFusion:
+    METHODS = ("max", "median", "vote")
+
+    def __init__(self, shape, capacity=8, method="max", votes=None):
+        """
+        Parameters:
+        - shape: (height, width) of the single channel masks.
+        - capacity: Number of slots in the stack. Streams longer than this keep the newest masks.
+        - method: "max" (union), "median" or "vote" (k-of-N).
+        - votes: k for the "vote" method, defaults to a majority of the valid masks.
+        """
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown fusion method '{method}', expected one of {self.METHODS}")
+
+        self.stack = np.zeros((capacity, shape[0], shape[1]), dtype=np.uint8)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.method = method
+        self.votes = votes
+        self.next_slot = 0
+
+    @property
+    def capacity(self):
+        return self.stack.shape[0]
+
+    def reserve(self):
+        """
+        Returns the index of the slot the next mask should be written into (oldest slot is reused).
+        """
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.capacity
+        self.valid[slot] = False
+        return slot
+
+    def clear(self):
+        # Forgets every mask, the stack is kept for the next burst
+        self.valid.fill(False)
+        self.next_slot = 0
+
+    def commit(self, slot, ok):
+        # Marks whether the mask written into the slot should take part in the fusion
+        self.valid[slot] = ok
+
+    def fuse(self, method=None, votes=None):
+        """
+        Reduces the valid masks into one (height, width) uint8 mask.
+        """
+        method = self.method if method is None else method
+        votes = self.votes if votes is None else votes
+
+        if not self.valid.any():
+            return np.zeros(self.stack.shape[1:], dtype=np.uint8)
+
+        masks = self.stack[self.valid] if not self.valid.all() else self.stack
+        if method == "max":
+            return masks.max(axis=0)
+        if method == "median":
+            return np.median(masks, axis=0).astype(np.uint8)
+
+        # k-of-N voting, rejects anything (e.g. a hand) that only shows up in a few frames
+        if votes is None:
+            votes = len(masks) // 2 + 1
+        count = np.count_nonzero(masks, axis=0)
+        return np.where(count >= votes, 255, 0).astype(np.uint8)
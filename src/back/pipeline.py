@@ -0,0 +1,165 @@
+import threading
+from collections import deque
+
+DROP_OLDEST = "drop_oldest"
+BLOCK = "block"
+COALESCE = "coalesce"
+
+
+########################################################################################################################
+#   StageQueue Class - Bounded queue between two stages with an explicit backpressure policy
+########################################################################################################################
+
+class StageQueue:
+    def __init__(self, capacity=1, policy=DROP_OLDEST, merge=None):
+        """
+        Parameters:
+        - capacity: Items the queue holds (coalesce always holds one).
+        - policy: What put does when the queue is full:
+            DROP_OLDEST - throw away the oldest item,
+            BLOCK       - wait until the consumer takes an item,
+            COALESCE    - fold the new item into the pending one (merge(old, new), default keeps the new one).
+        """
+        if policy not in (DROP_OLDEST, BLOCK, COALESCE):
+            raise ValueError(f"Unknown backpressure policy '{policy}'")
+
+        self.capacity = 1 if policy == COALESCE else capacity
+        self.policy = policy
+        self.merge = merge
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        """
+        Returns False if the queue was closed.
+        """
+        with self.condition:
+            if self.policy == BLOCK:
+                while len(self.items) >= self.capacity and not self.closed:
+                    self.condition.wait()
+            if self.closed:
+                return False
+
+            if len(self.items) >= self.capacity:
+                if self.policy == COALESCE:
+                    old = self.items.pop()
+                    item = item if self.merge is None else self.merge(old, item)
+                else:
+                    self.items.popleft()
+                self.dropped += 1
+
+            self.items.append(item)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout=None):
+        """
+        Returns the next item, or None on timeout / when the queue was closed and drained.
+        """
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+########################################################################################################################
+#   Stage Class - Named step running on its own worker thread
+########################################################################################################################
+
+class Stage:
+    def __init__(self, name, func, output):
+        """
+        Parameters:
+        - name: Stage name (used for the thread name and stats).
+        - func: func(item) -> item for the next stage, or None to drop it. Source stages (no input)
+          are called with None and should return None when there is nothing new.
+        - output: StageQueue the results are put into.
+        """
+        self.name = name
+        self.func = func
+        self.input = None
+        self.output = output
+        self.thread = None
+        self.running = False
+        self.processed = 0
+        self.error = None
+
+    def run(self):
+        while self.running:
+            if self.input is not None:
+                item = self.input.get(timeout=0.1)
+                if item is None:
+                    continue
+            else:
+                item = None
+
+            try:
+                result = self.func(item)
+            except Exception as e:
+                self.error = e
+                print(f"[Pipeline] Error in stage '{self.name}': {e}")
+                continue
+
+            if result is None:
+                continue
+            self.processed += 1
+            if not self.output.put(result):
+                break
+
+
+########################################################################################################################
+#   Pipeline Class - Chain of stages connected by bounded queues
+########################################################################################################################
+
+class Pipeline:
+    def __init__(self):
+        self.stages = []
+
+    def add_stage(self, name, func, capacity=1, policy=DROP_OLDEST, merge=None):
+        """
+        Appends a stage. capacity/policy/merge describe the queue between this stage and the next one
+        (for the last stage, the queue the consumer reads from).
+        """
+        stage = Stage(name, func, StageQueue(capacity, policy, merge))
+        if self.stages:
+            stage.input = self.stages[-1].output
+        self.stages.append(stage)
+        return stage
+
+    @property
+    def output(self):
+        return self.stages[-1].output
+
+    def get_output(self, timeout=None):
+        # Consumer side (e.g. the GUI), only ever reads from the final stage
+        return self.output.get(timeout)
+
+    def start(self):
+        for stage in self.stages:
+            stage.running = True
+            stage.thread = threading.Thread(target=stage.run, name=f"pipeline-{stage.name}", daemon=True)
+            stage.thread.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.running = False
+            stage.output.close()
+        for stage in self.stages:
+            if stage.thread is not None:
+                stage.thread.join(timeout=1.0)
+                stage.thread = None
+
+    def get_stats(self):
+        return {stage.name: {"processed": stage.processed, "dropped": stage.output.dropped}
+                for stage in self.stages}
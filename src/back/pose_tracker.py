@@ -0,0 +1,123 @@
+import cv2 as cv
+import numpy as np
+
+
+########################################################################################################################
+#   PoseTracker Class - Follows the keyboard corners between recalibrations with pyramidal Lucas-Kanade
+########################################################################################################################
+
+class PoseTracker:
+    def __init__(self, corner_window=40, roi_pad=60, min_points=12, min_inlier_ratio=0.6, max_fb_error=1.0):
+        """
+        Parameters:
+        - corner_window: Half size of the window around each corner where features are picked.
+        - roi_pad: Padding around the corners' bounding box, optical flow only runs inside it.
+        - min_points: Fewest tracked points that still count as a confident track.
+        - min_inlier_ratio: Fewest RANSAC inliers (as a ratio of tracked points) for a confident track.
+        - max_fb_error: Forward-backward error in pixels above which a point is dropped.
+        """
+        self.corner_window = corner_window
+        self.roi_pad = roi_pad
+        self.min_points = min_points
+        self.min_inlier_ratio = min_inlier_ratio
+        self.max_fb_error = max_fb_error
+
+        self.lk_params = dict(winSize=(21, 21), maxLevel=3,
+                              criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 20, 0.03))
+
+        self.corners = None
+        self.prev_gray = None
+        self.prev_points = None
+        self.confidence = 0.0
+        self.feature_mask = None  # Reused by find_features
+
+    def reset(self, gray=None, corners=None):
+        """
+        Starts tracking from a known pose (e.g. right after a full calibration).
+        """
+        self.corners = None if corners is None else np.float32(corners).reshape(4, 2)
+        self.prev_gray = None
+        self.prev_points = None
+        self.confidence = 0.0
+        if gray is not None and self.corners is not None:
+            self.prev_gray = gray
+            self.prev_points = self.find_features(gray)
+            self.confidence = 1.0 if self.prev_points is not None else 0.0
+
+    def is_tracking(self):
+        return self.corners is not None and self.prev_points is not None
+
+    def get_roi(self, shape):
+        height, width = shape[:2]
+        x0, y0 = np.floor(self.corners.min(axis=0)).astype(int) - self.roi_pad
+        x1, y1 = np.ceil(self.corners.max(axis=0)).astype(int) + self.roi_pad
+        return max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+
+    def find_features(self, gray):
+        # Pick good features in a small window around each corner
+        if self.feature_mask is None or self.feature_mask.shape != gray.shape[:2]:
+            self.feature_mask = np.zeros(gray.shape[:2], dtype=np.uint8)
+        mask = self.feature_mask
+        mask.fill(0)
+        for x, y in self.corners.astype(int):
+            cv.rectangle(mask, (x - self.corner_window, y - self.corner_window),
+                         (x + self.corner_window, y + self.corner_window), 255, cv.FILLED)
+
+        points = cv.goodFeaturesToTrack(gray, maxCorners=80, qualityLevel=0.01, minDistance=5, mask=mask)
+        if points is None or len(points) < self.min_points:
+            return None
+        return points.astype(np.float32)
+
+    def update(self, gray):
+        """
+        Tracks the pose into the next grayscale frame.
+
+        Returns:
+        - The new corners, or None when the tracking confidence dropped (a full recalibration is needed).
+        """
+        if not self.is_tracking():
+            return None
+
+        # Optical flow on the padded ROI only
+        x0, y0, x1, y1 = self.get_roi(gray.shape)
+        offset = np.float32([x0, y0])
+        prev_roi = self.prev_gray[y0:y1, x0:x1]
+        cur_roi = gray[y0:y1, x0:x1]
+        prev_points = self.prev_points - offset
+
+        next_points, status, _ = cv.calcOpticalFlowPyrLK(prev_roi, cur_roi, prev_points, None, **self.lk_params)
+        back_points, back_status, _ = cv.calcOpticalFlowPyrLK(cur_roi, prev_roi, next_points, None, **self.lk_params)
+
+        fb_error = np.linalg.norm((back_points - prev_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+        if good.sum() < self.min_points:
+            return self.lose_track()
+
+        src = prev_points[good] + offset
+        dst = next_points[good] + offset
+        delta, inliers = cv.findHomography(src, dst, cv.RANSAC, 2.0)
+        if delta is None:
+            return self.lose_track()
+
+        inlier_count = int(inliers.sum())
+        self.confidence = inlier_count / len(self.prev_points)
+        if inlier_count < self.min_points or inlier_count / good.sum() < self.min_inlier_ratio:
+            return self.lose_track()
+
+        # Incremental homography update of the corners
+        self.corners = cv.perspectiveTransform(self.corners.reshape(-1, 1, 2), delta).reshape(4, 2)
+        self.prev_gray = gray
+        self.prev_points = dst[inliers.ravel() == 1].reshape(-1, 1, 2)
+
+        # Top up the features when too many were lost
+        if len(self.prev_points) < 2 * self.min_points:
+            points = self.find_features(gray)
+            if points is not None:
+                self.prev_points = points
+
+        return self.corners
+
+    def lose_track(self):
+        self.confidence = 0.0
+        self.prev_points = None
+        return None
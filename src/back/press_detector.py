@@ -0,0 +1,193 @@
+import numpy as np
+
+from src.back.landmark_predictor import MAX_HANDS
+
+FINGERS_PER_HAND = 5
+NUM_FINGERS = MAX_HANDS * FINGERS_PER_HAND
+
+# Finger states
+HOVER = 0
+DESCEND = 1
+CONTACT = 2
+RELEASE = 3
+
+
+class PressEvent:
+    """
+    A detected key press ("down") or release ("up") of one fingertip.
+    """
+    __slots__ = ("finger", "key", "timestamp", "event_type")
+
+    def __init__(self, finger, key, timestamp, event_type):
+        self.finger = finger  # hand * 5 + fingertip (thumb .. pinky)
+        self.key = key  # Key id under the fingertip at contact, see get_finger_button_interaction
+        self.timestamp = timestamp  # Interpolated between the two frames around the threshold crossing
+        self.event_type = event_type
+
+    def __repr__(self):
+        return f"PressEvent(finger={self.finger}, key={self.key}, timestamp={self.timestamp:.4f}, {self.event_type})"
+
+
+########################################################################################################################
+#   PressDetector Class - Vectorized hover -> descend -> contact -> release state machine for all fingertips
+########################################################################################################################
+
+class PressDetector:
+    def __init__(self, history=8, velocity_window=3, descend_speed=0.08, stop_speed=0.02, release_speed=0.08,
+                 min_travel=0.006, max_slide_speed=600.0, min_contact_time=0.03, debounce=0.08, no_key=0):
+        """
+        The camera looks down at the hands, so a finger pushing a key moves away from the camera and its MediaPipe
+        z (relative to the wrist, smaller is closer) goes up. A press is a descend that stops after travelling far
+        enough while the finger is not sliding over the mat.
+
+        Parameters:
+        - history: Samples kept per finger in the ring buffers.
+        - velocity_window: Samples the velocity is fitted over (least squares slope).
+        - descend_speed: z velocity (units/s) that starts a descend.
+        - stop_speed: A descending finger whose z velocity drops below this made contact.
+        - release_speed: Upward z velocity (units/s) that releases a contact.
+        - min_travel: z the finger has to travel between the start of the descend and the contact.
+        - max_slide_speed: Fingers moving faster than this over the mat (template px/s) do not press.
+        - min_contact_time: Contacts shorter than this are not released (debounces z jitter).
+        - debounce: Time a finger has to wait after a release before it can press again.
+        - no_key: Key id meaning "not over a key".
+        """
+        self.history = history
+        self.velocity_window = velocity_window
+        self.descend_speed = descend_speed
+        self.stop_speed = stop_speed
+        self.release_speed = release_speed
+        self.min_travel = min_travel
+        self.max_slide_speed = max_slide_speed
+        self.min_contact_time = min_contact_time
+        self.debounce = debounce
+        self.no_key = no_key
+
+        # Ring buffers, the newest sample of every finger is at [:, head]
+        self.times = np.zeros(history, dtype=np.float64)
+        self.samples_xyz = np.zeros((NUM_FINGERS, history, 3), dtype=np.float32)
+        self.positions = self.samples_xyz[..., :2]  # Template space
+        self.depths = self.samples_xyz[..., 2]  # MediaPipe z
+        self.velocities = np.zeros((NUM_FINGERS, history, 3), dtype=np.float32)  # (vx, vy) template px/s, vz
+        self.velocity_times = np.zeros(history, dtype=np.float64)  # Time each velocity fit is centred on
+        self.head = -1
+        self.samples = np.zeros(NUM_FINGERS, dtype=np.int32)  # Consecutive valid samples per finger
+
+        self.state = np.full(NUM_FINGERS, HOVER, dtype=np.int8)
+        self.descend_depth = np.zeros(NUM_FINGERS, dtype=np.float32)  # z where the descend started
+        self.contact_time = np.zeros(NUM_FINGERS, dtype=np.float64)
+        self.release_time = np.full(NUM_FINGERS, -np.inf, dtype=np.float64)
+        self.contact_key = np.full(NUM_FINGERS, no_key, dtype=np.int32)
+
+        # Ring offsets of the samples the velocity is fitted over, oldest first
+        self.window_steps = np.arange(velocity_window)[::-1]
+        self.finger_ids = np.arange(NUM_FINGERS)
+
+    def reset(self):
+        self.head = -1
+        self.samples.fill(0)
+        self.state.fill(HOVER)
+        self.contact_key.fill(self.no_key)
+        self.release_time.fill(-np.inf)
+
+    def update(self, timestamp, points, depths, keys):
+        """
+        Adds one frame and returns the PressEvents it completed.
+
+        Parameters:
+        - timestamp: Capture time of the frame.
+        - points: (N,2) fingertips in template space, 5 per hand (N may be 0, 5 or 10).
+        - depths: (N,) MediaPipe z of the same fingertips.
+        - keys: (N,) key under each fingertip.
+        """
+        count = min(len(points), NUM_FINGERS)
+        valid = self.finger_ids < count
+
+        previous = self.head
+        if previous >= 0 and timestamp <= self.times[previous]:
+            return []
+        self.head = head = (self.head + 1) % self.history
+        self.times[head] = timestamp
+
+        self.positions[:count, head] = points[:count]
+        self.depths[:count, head] = depths[:count]
+        current_keys = np.full(NUM_FINGERS, self.no_key, dtype=np.int32)
+        current_keys[:count] = np.asarray(keys, dtype=np.int32)[:count]
+
+        # Fingers that disappeared start over (a lost hand never presses or keeps a key down)
+        self.samples += 1
+        self.samples[count:] = 0
+        lost = ~valid & (self.state == CONTACT)
+        events = [PressEvent(int(f), int(self.contact_key[f]), timestamp, "up") for f in np.flatnonzero(lost)]
+        self.state[~valid] = HOVER
+
+        velocity = self.fit_velocity(head)
+        self.velocities[:, head] = velocity
+        vz = velocity[:, 2]
+        previous_vz = self.velocities[:, previous, 2]
+        ready = valid & (self.samples >= 2)
+        sliding = np.hypot(velocity[:, 0], velocity[:, 1]) > self.max_slide_speed
+        depth = self.depths[:, head]
+        state = self.state
+
+        # hover -> descend
+        start = ready & (state == HOVER) & (vz > self.descend_speed) & (timestamp - self.release_time > self.debounce)
+        self.descend_depth[start] = self.depths[start, previous]
+
+        # descend -> contact (the downward motion stopped far enough down, over a key, not sliding)
+        stopped = ready & (state == DESCEND) & (vz < self.stop_speed)
+        travelled = depth - self.descend_depth >= self.min_travel
+        contact = stopped & travelled & ~sliding & (current_keys != self.no_key)
+        aborted = (stopped & ~contact) | (ready & (state == DESCEND) & sliding)
+
+        # contact -> release (finger lifts after being down long enough)
+        release = ready & (state == CONTACT) & (vz < -self.release_speed) & \
+            (timestamp - self.contact_time >= self.min_contact_time)
+
+        # release -> hover once the lift is over
+        settle = ready & (state == RELEASE) & (vz > -self.stop_speed)
+
+        state[start] = DESCEND
+        state[aborted | settle] = HOVER
+        state[contact] = CONTACT
+        state[release] = RELEASE
+
+        if contact.any() or release.any():
+            contact_times = self.interpolate_crossing(previous, head, previous_vz, vz, self.stop_speed)
+            release_times = self.interpolate_crossing(previous, head, previous_vz, vz, -self.release_speed)
+            self.contact_time[contact] = contact_times[contact]
+            self.contact_key[contact] = current_keys[contact]
+            self.release_time[release] = release_times[release]
+            for finger in np.flatnonzero(contact):
+                events.append(PressEvent(int(finger), int(current_keys[finger]), float(contact_times[finger]), "down"))
+            for finger in np.flatnonzero(release):
+                events.append(PressEvent(int(finger), int(self.contact_key[finger]), float(release_times[finger]),
+                                         "up"))
+        return events
+
+    def fit_velocity(self, head):
+        # Least squares slope over the last velocity_window samples, shorter runs use what they have
+        window = self.velocity_window
+        indices = (head - self.window_steps) % self.history
+        times = self.times[indices]
+        values = self.samples_xyz[:, indices]  # (F,W,3)
+
+        center = float(times.sum()) / window
+        dt = times - center
+        velocity = np.matmul(dt / max(float(dt @ dt), 1e-9), values)
+        self.velocity_times[head] = center
+
+        partial = self.samples < window
+        if partial.any():
+            step = max(times[-1] - times[-2], 1e-6)
+            velocity[partial] = (values[partial, -1] - values[partial, -2]) / step
+            velocity[self.samples < 2] = 0
+        return velocity
+
+    def interpolate_crossing(self, previous, head, previous_value, value, threshold):
+        # Time between the two velocity fits where the z velocity crossed the threshold (linear interpolation)
+        t0, t1 = self.velocity_times[previous], self.velocity_times[head]
+        span = previous_value - value
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(np.abs(span) > 1e-9, (previous_value - threshold) / span, 1.0)
+        return t0 + np.clip(ratio, 0.0, 1.0) * (t1 - t0)
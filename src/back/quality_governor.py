@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+
+
+# Quality levels from best to cheapest. inference_width None means the full frame goes to the hand model.
+QUALITY_LEVELS = [
+    dict(model_complexity=1, inference_width=None, draw_overlays=True, smooth_preview=True, run_warp=True),
+    dict(model_complexity=1, inference_width=480, draw_overlays=True, smooth_preview=False, run_warp=True),
+    dict(model_complexity=0, inference_width=480, draw_overlays=True, smooth_preview=False, run_warp=True),
+    dict(model_complexity=0, inference_width=320, draw_overlays=False, smooth_preview=False, run_warp=True),
+    dict(model_complexity=0, inference_width=320, draw_overlays=False, smooth_preview=False, run_warp=False),
+]
+
+
+########################################################################################################################
+#   QualityGovernor Class - Steps the pipeline quality up/down to stay within a frame budget
+########################################################################################################################
+
+class QualityGovernor:
+    def __init__(self, target_ms=16.0, levels=None, on_level_change=None, smoothing=0.1,
+                 downgrade_frames=5, upgrade_frames=60, headroom=0.7):
+        """
+        Parameters:
+        - target_ms: Frame budget in milliseconds.
+        - levels: Quality levels, best first (defaults to QUALITY_LEVELS).
+        - on_level_change: Called with the settings dict whenever the level changes.
+        - smoothing: Weight of the newest frame in the moving average of the frame time.
+        - downgrade_frames: Consecutive over-budget frames before stepping down.
+        - upgrade_frames: Consecutive frames under headroom * budget before stepping back up.
+        - headroom: Ratio of the budget the frame time has to stay under before stepping up.
+        """
+        self.target_ms = target_ms
+        self.levels = levels if levels is not None else QUALITY_LEVELS
+        self.on_level_change = on_level_change
+        self.smoothing = smoothing
+        self.downgrade_frames = downgrade_frames
+        self.upgrade_frames = upgrade_frames
+        self.headroom = headroom
+
+        self.level = 0
+        self.stage_ms = {}  # Moving average per stage
+        self.frame_ms = None  # Moving average of the whole frame
+        self.frame_start = None
+        self.over_budget = 0
+        self.under_budget = 0
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def start_frame(self):
+        self.frame_start = time.perf_counter()
+
+    @contextmanager
+    def measure(self, stage):
+        # with governor.measure("inference"): ...
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000.0)
+
+    def record(self, stage, elapsed_ms):
+        previous = self.stage_ms.get(stage)
+        self.stage_ms[stage] = elapsed_ms if previous is None else \
+            previous + self.smoothing * (elapsed_ms - previous)
+
+    def end_frame(self):
+        """
+        Closes the frame started with start_frame and steps the quality level if needed.
+
+        Returns:
+        - The current settings dict.
+        """
+        if self.frame_start is None:
+            return self.settings
+
+        elapsed_ms = (time.perf_counter() - self.frame_start) * 1000.0
+        self.frame_start = None
+        self.frame_ms = elapsed_ms if self.frame_ms is None else \
+            self.frame_ms + self.smoothing * (elapsed_ms - self.frame_ms)
+
+        if self.frame_ms > self.target_ms:
+            self.over_budget += 1
+            self.under_budget = 0
+        elif self.frame_ms < self.headroom * self.target_ms:
+            self.under_budget += 1
+            self.over_budget = 0
+        else:
+            self.over_budget = 0
+            self.under_budget = 0
+
+        if self.over_budget >= self.downgrade_frames and self.level < len(self.levels) - 1:
+            self.set_level(self.level + 1)
+        elif self.under_budget >= self.upgrade_frames and self.level > 0:
+            self.set_level(self.level - 1)
+
+        return self.settings
+
+    def set_level(self, level):
+        level = min(max(level, 0), len(self.levels) - 1)
+        self.over_budget = 0
+        self.under_budget = 0
+        # Let the average settle on the new level before judging it
+        self.frame_ms = None
+        if level == self.level:
+            return
+
+        self.level = level
+        if self.on_level_change is not None:
+            self.on_level_change(self.settings)
@@ -0,0 +1,167 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+########################################################################################################################
+#   RecalibrationWorker Class - Runs KeyboardTracker recalibration in the background
+########################################################################################################################
+
+class RecalibrationWorker:
+    def __init__(self, kbm_tracker, frame_timeout=5.0):
+        """
+        Frames are streamed into a StreamingCalibrator on the job thread, the job ends as soon as the corners
+        converged (often after two frames) or the calibrator gave up.
+
+        Parameters:
+        - kbm_tracker: The KeyboardTracker to recalibrate.
+        - frame_timeout: Seconds the job waits for the next frame before it fails.
+        """
+        self.kbm_tracker = kbm_tracker
+        self.frame_timeout = frame_timeout
+        self.job_executor = ThreadPoolExecutor(1, thread_name_prefix="recalibrate-job")
+        self.future = None
+        self.frames = None
+        self.job_name = "Recalibration"  # Or "Redetection", only used in messages
+        self.lock = threading.Lock()
+        self.frames_done = 0
+        self.frames_total = 0
+        # Redetection runs every few frames while the mat is lost, only the first failure of a run and then every
+        # failure_report_interval-th one is reported
+        self.redetect_failures = 0
+        self.failure_report_interval = 20
+
+    def start(self, frames=None):
+        """
+        Starts a recalibration job, frames are fed with add_frame (and/or given here).
+        Returns False if a job is already running or its result was not polled yet.
+        """
+        with self.lock:
+            if self.future is not None:
+                return False
+
+            calibrator = self.kbm_tracker.create_calibrator()
+            self.frames_done = 0
+            self.frames_total = calibrator.max_frames
+            # Only a couple of frames are ever waiting, older ones make way for the newest (see put_newest)
+            self.frames = queue.Queue(maxsize=2 if frames is None else max(2, len(frames)))
+            for frame in frames or []:
+                self.put_newest(self.frames, frame)
+            self.job_name = "Recalibration"
+            self.future = self.job_executor.submit(self.run_job, calibrator, self.frames)
+            return True
+
+    def redetect(self, frame):
+        """
+        Looks for the mat in a single frame after pose tracking was lost (see KeyboardTracker.track_pose).
+        Safe to call from any thread, returns False if a job is already running or its result was not polled yet.
+        """
+        with self.lock:
+            if self.future is not None:
+                return False
+            self.frames_done = 0
+            self.frames_total = 1
+            self.job_name = "Redetection"
+            self.future = self.job_executor.submit(self.run_redetect, frame)
+            return True
+
+    def run_redetect(self, frame):
+        corners = self.kbm_tracker.redetect_corners(frame)
+        self.report_progress()
+        if corners is None:
+            return None, None, self.kbm_tracker.last_failure or "no_mat"
+        return corners, self.kbm_tracker.build_warp_engine(corners), None
+
+    def add_frame(self, frame):
+        """
+        Hands the next frame to the running job. Returns False once the job needs no more frames.
+        """
+        frames = self.frames
+        if not self.is_running() or frames is None:
+            return False
+        self.put_newest(frames, frame)
+        return True
+
+    @staticmethod
+    def put_newest(frames, frame):
+        # While the job is busy the oldest waiting frame is dropped, the calibrator always gets the newest ones
+        while True:
+            try:
+                frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    frames.get_nowait()
+                except queue.Empty:
+                    pass  # The job took one meanwhile
+
+    def run_job(self, calibrator, frames):
+        while not calibrator.done:
+            try:
+                frame = frames.get(timeout=self.frame_timeout)
+            except queue.Empty:
+                return None, None, "no frames"
+            if frame is None:
+                return None, None, "cancelled"
+            calibrator.add_frame(frame)
+            self.report_progress()
+
+        if not calibrator.converged:
+            return None, None, calibrator.last_failure
+        return calibrator.corners, self.kbm_tracker.build_warp_engine(calibrator.corners), None
+
+    def report_progress(self):
+        with self.lock:
+            self.frames_done += 1
+
+    def is_running(self):
+        return self.future is not None and not self.future.done()
+
+    def get_progress(self):
+        with self.lock:
+            return self.frames_done, self.frames_total
+
+    def poll(self):
+        """
+        Call from the UI thread. When the job has finished the result is swapped into the tracker here,
+        so frame processing never sees a half updated projection.
+
+        Returns:
+        - None while nothing finished (or a repeated redetection failure is not reported), otherwise
+          (success, message).
+        """
+        with self.lock:
+            if self.future is None or not self.future.done():
+                return None
+            future, self.future = self.future, None
+            self.frames = None
+            name = self.job_name
+
+        try:
+            corners, warp_engine, failure = future.result()
+        except Exception as e:
+            corners, warp_engine, failure = None, None, e
+
+        redetect = name == "Redetection"
+        if corners is None:
+            if redetect and failure == "unconfirmed":
+                return None  # Found, waits for the next frame to agree (see KeyboardTracker.redetect_corners)
+            if redetect:
+                self.redetect_failures += 1
+                if (self.redetect_failures - 1) % self.failure_report_interval:
+                    return None  # Still lost, already reported
+                if self.redetect_failures > 1:
+                    return False, f"{name} failed {self.redetect_failures} times in a row ({failure})"
+            return False, f"{name} failed ({failure}): keyboard mat not found, keeping the previous calibration"
+
+        if redetect:
+            self.redetect_failures = 0
+        self.kbm_tracker.apply_projection(corners, warp_engine)
+        return True, f"{name} done"
+
+    def shutdown(self):
+        # Wakes up a job that is waiting for frames
+        frames = self.frames
+        if frames is not None:
+            self.put_newest(frames, None)
+        self.job_executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,226 @@
+import argparse
+import threading
+import time
+
+import cv2 as cv
+
+from src.back.engine import Engine
+from src.back.hand_inference_pool import HandInferencePool
+from src.back.hand_tracking import HandTracker
+from src.back.handle_webcam import FileCaptureSource, WebCamHandler
+from src.back.key_event_bus import KeyEventBus
+from src.back.layout_cache import LayoutCache
+
+
+########################################################################################################################
+#   TypingSession Class - One capture source with its own mat tracking and press detection
+########################################################################################################################
+
+class TypingSession:
+    def __init__(self, name, source, pool, layout, key_events, model_complexity=1, corners=None):
+        """
+        Parameters:
+        - name: Session name, also the source of its key events.
+        - source: Started WebCamHandler / FileCaptureSource.
+        - pool: HandInferencePool the hand inference of this session runs on.
+        - layout: CompiledLayout shared with the other sessions (read only).
+        - key_events: KeyEventBus the session publishes its key events to.
+        - corners: Known mat corners, otherwise the session calibrates itself from its first frames.
+        """
+        self.name = name
+        self.source = source
+        self.client = pool.create_client(name)
+        # Smaller crops keep the shared pool's inference time per frame down
+        self.engine = Engine(layout, HandTracker(model_complexity, remote=self.client), crop_to_mat=True)
+        if corners is not None:
+            self.engine.set_corners(corners)
+        self.key_events = key_events.create_producer(name)
+        self.thread = None
+        self.running = False
+        self.frames = 0
+        self.key_downs = 0
+        self.error = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"session-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        self.source.stop_webcam()
+        self.engine.close()
+
+    def run(self):
+        # Mat tracking and press detection run here, hand inference is handed to the pool and never waited on
+        while self.running:
+            frame = self.source.get_frame(timeout=0.1)
+            if frame is None:
+                continue
+            try:
+                result = self.engine.process(frame.image, frame.timestamp, frame.seq)
+            except Exception as e:
+                print(f"[TypingSession] Error: '{self.name}' stopped: {e}")
+                self.error = f"{type(e).__name__}: {e}"
+                return
+
+            self.frames += 1
+            for event in result.key_events:
+                self.key_events.publish(event.name, event.event_type, event.timestamp)
+                if event.event_type == "down":
+                    self.key_downs += 1
+                    self.client.metrics.record_key_event(frame.timestamp)
+
+    def get_stats(self):
+        latency = self.client.metrics.snapshot()
+        return {
+            "frames": self.frames,
+            "key_downs": self.key_downs,
+            "calibrated": self.engine.is_calibrated(),
+            "capture_dropped": self.source.get_dropped_frames(),
+            "inference_submitted": self.client.submitted,
+            "inference_processed": self.client.processed,
+            "inference_dropped": self.client.dropped_frames,
+            "latency": latency,
+            "error": self.error,
+        }
+
+
+########################################################################################################################
+#   SessionHost Class - Several typing sessions sharing one hand inference pool
+########################################################################################################################
+
+class SessionHost:
+    def __init__(self, workers=None, backend="process", model_complexity=1, layout=None, frame_shape=(480, 640, 3)):
+        """
+        The number of hand inference workers is fixed by the pool, adding sessions adds threads for capture and
+        mat tracking only, so throughput grows with the cores given to the pool and not with the sessions.
+
+        Parameters:
+        - workers: Hand inference workers (see HandInferencePool).
+        - backend: Pool backend, "process" or "inprocess".
+        - layout: CompiledLayout for every session, loaded from the LayoutCache when not given.
+        - frame_shape: Largest frame any source delivers.
+        """
+        self.layout = LayoutCache().get_layout() if layout is None else layout
+        self.model_complexity = model_complexity
+        self.pool = HandInferencePool(workers, backend, model_complexity, frame_shape=frame_shape)
+        self.key_events = KeyEventBus()
+        self.sessions = []
+        self.running = False
+
+    def add_session(self, source, name=None, corners=None):
+        """
+        Adds a session for a started capture source, it starts right away if the host is running.
+        """
+        name = f"session{len(self.sessions)}" if name is None else name
+        session = TypingSession(name, source, self.pool, self.layout, self.key_events, self.model_complexity, corners)
+        self.sessions.append(session)
+        if self.running:
+            session.start()
+        return session
+
+    def start(self):
+        self.pool.start()
+        self.running = True
+        for session in self.sessions:
+            session.start()
+
+    def stop(self):
+        self.running = False
+        for session in self.sessions:
+            session.stop()
+        self.pool.stop()
+
+    def drain_events(self, max_events=None):
+        # Key events of all sessions in time order, KeyEvent.source tells the sessions apart
+        return self.key_events.drain(max_events)
+
+    def get_stats(self):
+        pool = self.pool.get_stats()
+        return {
+            "workers": pool["workers"],
+            "backend": pool["backend"],
+            "inference_busy_seconds": pool["busy_seconds"],
+            "dropped_key_events": self.key_events.get_dropped(),
+            "sessions": {session.name: session.get_stats() for session in self.sessions},
+        }
+
+
+def format_stats(stats, seconds):
+    lines = [f"{len(stats['sessions'])} sessions on {stats['workers']} {stats['backend']} workers, "
+             f"pool busy {stats['inference_busy_seconds'] / max(seconds * stats['workers'], 1e-9):.0%}"]
+    for name, session in stats["sessions"].items():
+        inference = session["latency"].get("inference", {})
+        end_to_end = session["latency"].get("end_to_end", {})
+        lines.append(f"  {name}: {session['frames'] / seconds:.1f} fps, "
+                     f"{session['inference_processed']}/{session['inference_submitted']} inferred, "
+                     f"{session['key_downs']} presses, calibrated={session['calibrated']}, "
+                     f"inference p50 {inference.get('p50_ms') or 0:.1f} ms, "
+                     f"end to end p95 {end_to_end.get('p95_ms') or 0:.1f} ms"
+                     + (f", error {session['error']}" if session["error"] else ""))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run several typing sessions on one hand inference pool")
+    parser.add_argument("--camera", type=int, action="append", default=[], help="Camera index (repeatable)")
+    parser.add_argument("--file", action="append", default=[], help="Video file played as a camera (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Hand inference workers (default: cores - 1)")
+    parser.add_argument("--backend", choices=["process", "inprocess"], default="process")
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run")
+    parser.add_argument("--no-loop", action="store_true", help="Play the files once instead of looping")
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    args = parser.parse_args(argv)
+
+    sources = []
+    for camera in args.camera:
+        sources.append((f"camera{camera}", WebCamHandler(device=camera)))
+    for path in args.file:
+        sources.append((f"file{len(sources)}", FileCaptureSource(path, loop=not args.no_loop)))
+    if not sources:
+        print("[session_host] Error: Give at least one --camera or --file")
+        return None
+
+    # Inference slots must fit the largest source
+    shapes = []
+    for _, source in sources:
+        source.start_webcam()
+        if source.capture is not None:
+            shapes.append((int(source.capture.get(cv.CAP_PROP_FRAME_HEIGHT)),
+                           int(source.capture.get(cv.CAP_PROP_FRAME_WIDTH))))
+    frame_shape = (max([480] + [shape[0] for shape in shapes]), max([640] + [shape[1] for shape in shapes]), 3)
+
+    host = SessionHost(args.workers, args.backend, args.model_complexity, frame_shape=frame_shape)
+    for name, source in sources:
+        if source.capture is not None:
+            host.add_session(source, name)
+
+    host.start()
+    start = time.monotonic()
+    next_stats = start + args.stats_interval
+    try:
+        while time.monotonic() - start < args.duration:
+            for event in host.drain_events():
+                if event.event_type == "down":
+                    print(f"[{event.source}] {event.name}")
+            if time.monotonic() >= next_stats:
+                print(format_stats(host.get_stats(), time.monotonic() - start))
+                next_stats += args.stats_interval
+            time.sleep(0.02)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        seconds = time.monotonic() - start
+        stats = host.get_stats()
+        host.stop()
+    print(format_stats(stats, seconds))
+    return stats
+
+
+if __name__ == "__main__":
+    main()
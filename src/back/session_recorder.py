@@ -0,0 +1,347 @@
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+
+import cv2 as cv
+import numpy as np
+
+from src.back.frame_pool import FramePool
+from src.back.handle_webcam import CaptureThread, CapturedFrame, WebCamHandler
+
+VIDEO_FILE = "frames.avi"
+INDEX_FILE = "index.bin"
+SESSION_FILE = "session.json"
+
+# One fixed size record per frame so the index can be memory mapped
+INDEX_DTYPE = np.dtype([("seq", "<i8"), ("timestamp", "<f8"), ("frame", "<i8")])
+
+
+########################################################################################################################
+#   SessionRecorder Class - Saves frames, calibration state and key events of a live session
+########################################################################################################################
+
+class SessionRecorder:
+    def __init__(self, path, fps=30.0, fourcc="FFV1", queue_size=64):
+        """
+        Records into a directory holding the video, a binary frame index and session.json
+        (calibrations + key events). Frames are encoded on the recorder's own thread, record_frame only
+        queues them, so it can be called from the capture thread (see CaptureThread.recorder).
+
+        Parameters:
+        - path: Directory to write the session into (created if needed).
+        - fps: Nominal frame rate written into the video header (the index holds the real timestamps).
+        - fourcc: Video codec, "FFV1" (lossless, the default) so replayed frames match the live ones exactly,
+          or e.g. "MJPG" for smaller files.
+        - queue_size: Frames waiting for the encoder, more are dropped (and counted) instead of blocking.
+        """
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.fps = fps
+        self.fourcc = fourcc
+        self.writer = None
+        self.index_file = open(os.path.join(path, INDEX_FILE), "wb")
+        self.frame_count = 0
+        self.dropped_frames = 0  # Frames the encoder fell too far behind for
+        self.recording = True  # Cleared when the video can not be written, the index then stops with it
+        self.lock = threading.Lock()
+        # time.time() - time.monotonic(), converts wall clock key events to capture time
+        self.clock_offset = time.time() - time.monotonic()
+        self.session = {"version": 1, "fourcc": fourcc, "calibrations": [], "camera_calibration": None,
+                        "key_events": []}
+        self.frames = queue.Queue(queue_size)  # (frame, timestamp, seq) for the writer thread, None stops it
+        self.writer_thread = threading.Thread(target=self.run_writer, name="session-recorder", daemon=True)
+        self.writer_thread.start()
+
+    def record_frame(self, frame, timestamp, seq):
+        """
+        Queues the frame for the video and the index (never blocks). Returns False when it was not queued:
+        recording stopped because the video writer could not be opened, or queue_size frames are already
+        waiting (counted in dropped_frames). Pooled frame buffers stay in use until they are written.
+        """
+        if not self.recording:
+            return False
+        try:
+            self.frames.put_nowait((frame, timestamp, seq))
+        except queue.Full:
+            self.dropped_frames += 1
+            return False
+        return True
+
+    def run_writer(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            self.write_frame(*item)
+
+    def write_frame(self, frame, timestamp, seq):
+        # Writer thread, no index entries are written without their frames
+        with self.lock:
+            if not self.recording:
+                return
+            if self.writer is None:
+                height, width = frame.shape[:2]
+                self.writer = cv.VideoWriter(os.path.join(self.path, VIDEO_FILE), cv.VideoWriter_fourcc(*self.fourcc),
+                                             self.fps, (width, height))
+                if not self.writer.isOpened():
+                    print(f"[SessionRecorder] Error: Could not open video writer with codec '{self.fourcc}', "
+                          f"recording stopped.")
+                    self.writer.release()
+                    self.writer = None
+                    self.recording = False
+                    return
+
+            self.writer.write(frame)
+            record = np.array([(seq, timestamp, self.frame_count)], dtype=INDEX_DTYPE)
+            self.index_file.write(record.tobytes())
+            self.frame_count += 1
+
+    def record_calibration(self, timestamp, corners):
+        with self.lock:
+            corners = None if corners is None else np.asarray(corners, dtype=np.float64).tolist()
+            self.session["calibrations"].append({"timestamp": timestamp, "corners": corners})
+
+    def record_camera_calibration(self, camera_matrix, dist_coeffs):
+        with self.lock:
+            self.session["camera_calibration"] = {"camera_matrix": np.asarray(camera_matrix).tolist(),
+                                                  "dist_coeffs": np.asarray(dist_coeffs).tolist()}
+
+    def record_key_event(self, name, event_type="down", wall_time=None):
+        # Events from the keyboard hook carry time.time(), stored on the capture (monotonic) clock
+        wall_time = time.time() if wall_time is None else wall_time
+        with self.lock:
+            self.session["key_events"].append({"timestamp": wall_time - self.clock_offset,
+                                               "name": name, "type": event_type})
+
+    def close(self):
+        # Frames still queued are written first
+        if self.writer_thread.is_alive():
+            self.frames.put(None)
+            self.writer_thread.join()
+        with self.lock:
+            if self.writer is not None:
+                self.writer.release()
+                self.writer = None
+            if not self.index_file.closed:
+                self.index_file.close()
+            with open(os.path.join(self.path, SESSION_FILE), "w") as file:
+                json.dump(self.session, file)
+
+
+########################################################################################################################
+#   SessionReplay Class - Plays a recorded session back as a frame source
+########################################################################################################################
+
+class SessionReplay:
+    def __init__(self, path, realtime=False, loop=False):
+        """
+        Can stand in for WebCamHandler (get_frame/get_webcam_frame/start_webcam/stop_webcam) where blocking
+        is fine (batch processing). A realtime replay sleeps in read, the GUI plays it through a
+        ReplayCaptureSource instead.
+
+        Parameters:
+        - path: Directory written by SessionRecorder.
+        - realtime: Pace frames like the original capture, otherwise replay as fast as possible.
+        - loop: Start over at the end instead of running dry.
+        """
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        self.index = np.memmap(os.path.join(path, INDEX_FILE), dtype=INDEX_DTYPE, mode="r") \
+            if os.path.getsize(os.path.join(path, INDEX_FILE)) else np.empty(0, dtype=INDEX_DTYPE)
+
+        session_path = os.path.join(path, SESSION_FILE)
+        self.session = {"calibrations": [], "camera_calibration": None, "key_events": []}
+        if os.path.exists(session_path):
+            with open(session_path) as file:
+                self.session = json.load(file)
+
+        # Capture time each calibration starts at and the corners active from then on (a None entry keeps
+        # the previous corners), searched with bisect since pose tracking records one per update
+        calibrations = sorted(self.session["calibrations"], key=lambda calibration: calibration["timestamp"])
+        self.calibration_times = [calibration["timestamp"] for calibration in calibrations]
+        self.calibration_corners = []
+        corners = None
+        for calibration in calibrations:
+            if calibration["corners"] is not None:
+                corners = np.float32(calibration["corners"])
+            self.calibration_corners.append(corners)
+
+        self.capture = None
+        self.position = 0
+        self.replay_start = None
+        self.last_seq = -1
+        self.frame_pool = FramePool()
+        self.frame_shape = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def start_webcam(self, width=None, height=None, fps=None):
+        self.capture = cv.VideoCapture(os.path.join(self.path, VIDEO_FILE))
+        if not self.capture.isOpened():
+            print("[SessionReplay] Error: Could not open recorded video.")
+        self.position = 0
+        self.replay_start = None
+
+    def stop_webcam(self):
+        if self.capture is not None:
+            self.capture.release()
+            self.capture = None
+
+    def read(self):
+        """
+        Returns the next CapturedFrame with its original seq and capture timestamp, or None at the end.
+        """
+        if self.capture is None:
+            self.start_webcam()
+
+        if self.position >= len(self.index):
+            if not self.loop or len(self.index) == 0:
+                return None
+            self.capture.set(cv.CAP_PROP_POS_FRAMES, 0)
+            self.position = 0
+            self.replay_start = None
+
+        # Decoded into a recycled buffer once the frame size is known
+        buffer = self.frame_pool.acquire(self.frame_shape) if self.frame_shape is not None else None
+        ret, image = self.capture.read(buffer)
+        if not ret:
+            return None
+        self.frame_shape = image.shape
+
+        record = self.index[self.position]
+        self.position += 1
+
+        if self.realtime:
+            now = time.monotonic()
+            if self.replay_start is None:
+                self.replay_start = now - float(record["timestamp"] - self.index[0]["timestamp"])
+            delay = self.replay_start + float(record["timestamp"] - self.index[0]["timestamp"]) - now
+            if delay > 0:
+                time.sleep(delay)
+
+        return CapturedFrame(image, float(record["timestamp"]), int(record["seq"]))
+
+    def frames(self):
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def get_frame(self, timeout=None):
+        frame = self.read()
+        if frame is not None:
+            self.last_seq = frame.seq
+        return frame
+
+    def get_webcam_frame(self):
+        frame = self.get_frame()
+        return None if frame is None else frame.image
+
+    def get_calibration_at(self, timestamp):
+        """
+        Returns the corners that were active at the given capture time (None before the first calibration).
+        """
+        index = bisect.bisect_right(self.calibration_times, timestamp) - 1
+        if index < 0 or self.calibration_corners[index] is None:
+            return None
+        return self.calibration_corners[index].copy()
+
+    def get_key_events(self, start=None, end=None):
+        return [event for event in self.session["key_events"]
+                if (start is None or event["timestamp"] >= start) and (end is None or event["timestamp"] < end)]
+
+
+class ReplayVideoCapture:
+    """
+    cv.VideoCapture like view of a SessionReplay for the CaptureThread: read() blocks until the next recorded
+    frame is due (realtime replay) and fails once the session ran out.
+    """
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.replay.start_webcam()
+
+    def isOpened(self):
+        return self.replay.capture is not None and self.replay.capture.isOpened()
+
+    def read(self, image=None):
+        # The replay decodes into its own recycled buffers, image is not used
+        frame = self.replay.read()
+        if frame is None:
+            return False, None
+        return True, frame.image
+
+    def release(self):
+        self.replay.stop_webcam()
+
+
+class ReplayCaptureThread(CaptureThread):
+    """
+    Capture thread of a ReplayCaptureSource. Hands out the recorded frames with their recorded seq and capture
+    timestamp, so the recorded calibrations (get_calibration_at) line up with them.
+    """
+
+    def read_frame(self, buffer=None):
+        # The replay decodes into its own recycled buffers, buffer is not used
+        frame = self.cap.replay.read()
+        if frame is not None:
+            self.seq = frame.seq + 1
+        return frame
+
+
+class ReplayCaptureSource(WebCamHandler):
+    """
+    Plays a recorded session through the same capture thread and mailbox as a camera, so waiting for the
+    next recorded frame never happens on the consumer's (GUI) thread. Frames keep their recorded seq and
+    timestamp, and with kbm_tracker set the calibration that was active for a frame is applied to it as the
+    frame is pulled.
+    """
+
+    def __init__(self, path, loop=False, mailbox_size=1):
+        super().__init__(mailbox_size)
+        self.replay = SessionReplay(path, realtime=True, loop=loop)
+        self.kbm_tracker = None  # Recorded calibrations are applied to it by get_frame
+        self.calibration = None  # Recorded corners applied last
+
+    def start_webcam(self, width=None, height=None, fps=None):
+        self.capture = ReplayVideoCapture(self.replay)
+        if not self.capture.isOpened():
+            self.capture.release()
+            self.capture = None
+            return
+
+        self.start_capture_thread()
+
+    def create_capture_thread(self):
+        return ReplayCaptureThread(self.capture, self.mailbox, first_seq=self.next_seq, recorder=self.recorder)
+
+    def get_frame(self, timeout=None):
+        """
+        Pulls the newest recorded frame, None if none arrived. Recorded seqs start over when the session loops,
+        so unlike a camera frame it is not checked against the last seq pulled.
+        """
+        if self.capture_thread is None:
+            return None
+
+        frame = self.mailbox.get_latest(timeout)
+        if frame is None:
+            return None
+
+        self.last_seq = frame.seq
+        if self.kbm_tracker is not None:
+            self.apply_calibration(frame.timestamp)
+        return frame
+
+    def apply_calibration(self, timestamp):
+        corners = self.replay.get_calibration_at(timestamp)
+        if corners is None or (self.calibration is not None and np.array_equal(corners, self.calibration)):
+            return
+
+        self.calibration = corners
+        self.kbm_tracker.apply_projection(corners, self.kbm_tracker.build_warp_engine(corners))
@@ -0,0 +1,54 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+########################################################################################################################
+#   StartupProfiler Class - Times the startup phases of the app
+########################################################################################################################
+
+class StartupProfiler:
+    def __init__(self, start=None):
+        """
+        Parameters:
+        - start: time.perf_counter() value everything is measured from (e.g. taken before the imports).
+        """
+        self.start = time.perf_counter() if start is None else start
+        self.phases = []  # (name, start, end, thread name), phases may overlap when run on other threads
+        self.marks = {}  # Milestones (first preview, ready, ...) -> time
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        with self.lock:
+            self.phases.append((name, start, end, threading.current_thread().name))
+
+    def mark(self, name):
+        # Only the first time counts
+        with self.lock:
+            self.marks.setdefault(name, time.perf_counter())
+
+    def has_mark(self, name):
+        return name in self.marks
+
+    def report(self):
+        """
+        Returns the phases and milestones as a text table (milliseconds since start).
+        """
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase[1])
+            marks = sorted(self.marks.items(), key=lambda mark: mark[1])
+
+        lines = [f"{'phase':<24}{'start ms':>10}{'took ms':>10}  thread"]
+        for name, start, end, thread in phases:
+            lines.append(f"{name:<24}{(start - self.start) * 1000:>10.1f}{(end - start) * 1000:>10.1f}  {thread}")
+        for name, timestamp in marks:
+            lines.append(f"{'@ ' + name:<24}{(timestamp - self.start) * 1000:>10.1f}")
+        return "\n".join(lines)
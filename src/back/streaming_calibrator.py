@@ -0,0 +1,398 @@
+import cv2 as cv
+import numpy as np
+
+from src.back.mask_fusion import MaskFusion
+
+
+########################################################################################################################
+#   StreamingCalibrator Class - Frame by frame mat calibration that stops once the corners settle
+########################################################################################################################
+
+class StreamingCalibrator:
+    def __init__(self, kbm_tracker, tolerance=0.003, min_frames=2, max_frames=10, threshold=150,
+                 fusion_method=None, fusion_votes=None, fusion_capacity=8, detection_mode="full",
+                 detection_width=640, roi_pad_ratio=0.2):
+        """
+        Every frame gives its own corner estimate: the mat's sides are fitted as lines (homogeneous least
+        squares over the contour points of every candidate edge of a side) and the corners are their
+        intersections, so the corner cut off at the chamfer comes out of the same fit as the others.
+        Corners that are actual image corners are then refined with cornerSubPix, estimates whose shape can not
+        be the mat (see check_shape) are rejected. The calibration is done as
+        soon as a new frame moves the running (per corner median) estimate by at most tolerance times the mat
+        diagonal, or failed after max_frames frames. Only frames given since the last reset are ever used and
+        corners is only set once converged. With a fusion_method every frame's mat mask goes into a MaskFusion
+        and the frame's estimate is taken from the masks fused so far (e.g. "vote" drops a hand that is only
+        in some of the frames). In "fast" detection_mode the sides are found on a downscaled frame, inside a
+        padded ROI around the tracker's current pose when there is one, and only the corner refinement runs at
+        full resolution.
+
+        Parameters:
+        - kbm_tracker: KeyboardTracker whose refine_corners / refine_window are used.
+        - tolerance: Largest corner movement that still counts as converged, as a ratio of the mat diagonal
+          (the estimate noise grows with the mat's size in pixels, i.e. with the camera resolution).
+        - min_frames: Estimates needed before converging (2 = the second frame can finish the calibration).
+        - max_frames: Frames (failed ones included) after which the calibration gives up.
+        - threshold: Gray level separating the bright mat from the background (same as refine_corners).
+        - fusion_method: None (every frame on its own), "max", "median" or "vote" (see MaskFusion).
+        - fusion_votes: k for "vote", None means a majority of the frames so far.
+        - fusion_capacity: Masks kept for the fusion, longer calibrations keep the newest.
+        - detection_mode: "full" or "fast" (fused masks are always full resolution).
+        - detection_width: Fast mode: the frame (or ROI) is halved until it is narrower than twice this.
+        - roi_pad_ratio: Fast mode: padding around the current pose, as a ratio of the mat's larger extent.
+        """
+        self.kbm_tracker = kbm_tracker
+        self.tolerance = tolerance
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.threshold = threshold
+        self.fusion_method = fusion_method
+        self.fusion_votes = fusion_votes
+        self.fusion_capacity = fusion_capacity
+        self.fusion = None  # MaskFusion, made for the first frame's size
+        self.detection_mode = detection_mode
+        self.detection_width = detection_width
+        self.roi_pad_ratio = roi_pad_ratio
+        self.approx_ratio = 0.02  # approxPolyDP epsilon as a ratio of the hull perimeter
+        self.close_ratio = 0.005  # Closing kernel size as a ratio of the frame's longer side
+        self.fit_distance = 1.5  # Contour points this close to a side's fitted line are used for its final fit
+        self.fit_samples = 12  # Points per side the candidate lines are drawn through
+        self.fit_iterations = 2  # Least squares refits of each side on the points near its line
+        self.merge_angle = np.deg2rad(8.0)  # Neighbouring edges closer in angle than this are one side
+        # Plausibility limits of a single frame estimate (an occluding hand merged into the mat's blob)
+        height, width = kbm_tracker.og_kbm_template.shape[:2]
+        self.template_aspect = width / height
+        self.min_area_ratio = 0.05  # Smallest mat area as a ratio of the frame area
+        self.max_aspect_error = 1.6  # Largest factor between the estimate's and the template's aspect ratio
+        self.max_side_ratio = 1.8  # Largest length ratio of two opposite sides (perspective)
+        self.reset()
+
+    def reset(self):
+        self.estimates = []
+        self.frames_used = 0
+        self.running = None  # Per corner median of the estimates so far
+        self.corners = None  # Calibrated corners, only set once converged
+        self.converged = False
+        self.done = False
+        self.last_failure = None  # Reason the last frame gave no estimate, or "not_converged" at the end
+        self.last_change = None  # How far (px) the last estimate moved the running estimate
+        self.last_tolerance = None  # tolerance in pixels for the running estimate's mat size
+        if self.fusion is not None:
+            self.fusion.clear()
+
+    def add_frame(self, frame):
+        """
+        Feeds the next frame, returns True once the calibration is done (see converged / corners).
+        """
+        if self.done:
+            return True
+
+        self.frames_used += 1
+        estimate = self.estimate_corners(frame, self.fuse_mask(frame) if self.fusion_method is not None else None)
+        if estimate is not None:
+            self.estimates.append(estimate)
+            running = np.median(np.stack(self.estimates), axis=0).astype(np.float32)
+            if self.running is not None:
+                self.last_change = float(np.linalg.norm(running - self.running, axis=1).max())
+            self.running = running
+            self.last_tolerance = self.tolerance * self.get_diagonal(running)
+            if len(self.estimates) >= self.min_frames and self.last_change <= self.last_tolerance:
+                self.corners = running
+                self.converged = True
+                self.done = True
+                return True
+
+        if self.frames_used >= self.max_frames:
+            # A running estimate that never settled is not a calibration
+            self.done = True
+            if self.estimates:
+                self.last_failure = "not_converged"
+        return self.done
+
+    def estimate_corners(self, frame, mask=None):
+        """
+        Corner estimate [top_left, top_right, bottom_right, bottom_left] (image orientation) from a single
+        frame, None (and last_failure set) when the mat can not be made out.
+
+        Parameters:
+        - frame: BGR or grayscale frame, the corners are refined on it.
+        - mask: Mat mask to find the sides in instead of the frame's own (see get_mask), e.g. a fused one.
+        """
+        self.last_failure = None
+        if mask is None and self.detection_mode == "fast":
+            roi = self.get_detection_roi(frame.shape)
+            if roi is not None:
+                corners = self.estimate_corners_fast(frame, roi)
+                if corners is not None:
+                    return corners
+            # No pose yet, or the mat is not (entirely) inside the ROI any more
+            return self.estimate_corners_fast(frame, None)
+
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        thresh = self.get_mask(gray) if mask is None else mask
+        return self.find_corners(frame, thresh)
+
+    def estimate_corners_fast(self, frame, roi):
+        # Mask of the (ROI of the) frame on the pyramid level narrower than 2 * detection_width
+        x0, y0, x1, y1 = (0, 0, frame.shape[1], frame.shape[0]) if roi is None else roi
+        gray = frame[y0:y1, x0:x1]
+        gray = cv.cvtColor(gray, cv.COLOR_BGR2GRAY) if gray.ndim == 3 else gray
+        scale = 1
+        while gray.shape[1] // (2 * scale) >= self.detection_width:
+            scale *= 2
+        if scale > 1:
+            # Area averaging already smooths the noise, another blur (or a pyramid's) would darken the thin rim
+            # outside the printed outline until the mask shrinks to the outline
+            gray = cv.resize(gray, (gray.shape[1] // scale, gray.shape[0] // scale), interpolation=cv.INTER_AREA)
+        # The closing kernel follows the full frame (the outline's width), not the ROI
+        thresh = self.get_mask(gray, side=max(frame.shape[:2]) / scale, blur=scale == 1)
+        # A mat cut off by an ROI side that is not the image border was not (entirely) inside the ROI
+        clipped = (x0 > 0, y0 > 0, x1 < frame.shape[1], y1 < frame.shape[0])
+        return self.find_corners(frame, thresh, scale, (x0, y0), clipped)
+
+    def get_detection_roi(self, shape):
+        # Padded bounding box (x0, y0, x1, y1) around the tracker's current pose, None if there is no pose yet
+        corners = self.kbm_tracker.get_projection()[0]
+        if corners is None or None in corners:
+            return None
+
+        corners = np.float32(corners).reshape(-1, 2)
+        height, width = shape[:2]
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        pad = self.roi_pad_ratio * (high - low).max()
+        x0, y0 = np.maximum(np.floor(low - pad), 0).astype(int)
+        x1, y1 = np.minimum(np.ceil(high + pad), [width, height]).astype(int)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
+
+    def find_corners(self, frame, thresh, scale=1, offset=(0, 0), clipped=None):
+        """
+        Corners of the largest blob in the mat mask, in frame pixels.
+
+        Parameters:
+        - frame: The full resolution frame (refinement, image size).
+        - thresh: Mat mask of the frame, or of its ROI at offset downscaled by scale.
+        - clipped: (left, top, right, bottom) ROI sides that cut the frame, a blob touching one fails.
+        """
+        contours, _ = cv.findContours(thresh, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_NONE)
+        if not contours:
+            self.last_failure = "no_contours"
+            return None
+
+        contour = max(contours, key=cv.contourArea)
+        if clipped is not None:
+            x, y, w, h = cv.boundingRect(contour)
+            touches = (x <= 0, y <= 0, x + w >= thresh.shape[1], y + h >= thresh.shape[0])
+            if any(side and touch for side, touch in zip(clipped, touches)):
+                self.last_failure = "roi_clipped"
+                return None
+
+        contour = contour.reshape(-1, 2).astype(np.float64)
+        hull = cv.convexHull(contour.astype(np.float32))
+        epsilon = self.approx_ratio * cv.arcLength(hull, True)
+        polygon = cv.approxPolyDP(hull, epsilon, True).reshape(-1, 2)
+        if len(polygon) < 4:
+            self.last_failure = "not_4_sides"
+            return None
+
+        sides = self.find_sides(polygon.astype(np.float64), contour, epsilon)
+        if len(sides) < 4:
+            self.last_failure = "not_4_sides"
+            return None
+
+        # The four longest sides in contour order, the short ones are the chamfer (or noise)
+        keep = sorted(sorted(range(len(sides)), key=lambda index: sides[index][1])[-4:])
+        lines = [sides[index][0] for index in keep]
+        corners = []
+        for index in range(4):
+            corner = self.intersect(lines[index - 1], lines[index])
+            if corner is None:
+                self.last_failure = "parallel_sides"
+                return None
+            corners.append(corner)
+        # Downscaled pixel centres back to frame pixels
+        shift = np.float32(offset) + (scale - 1) / 2
+        corners = self.order_corners(np.float32(corners)) * scale + shift
+        polygon = polygon * scale + shift
+
+        height, width = frame.shape[:2]
+        if np.any(np.abs(corners - [width / 2, height / 2]) > [width, height]):
+            self.last_failure = "corner_out_of_range"
+            return None
+        self.last_failure = self.check_shape(corners, width * height)
+        if self.last_failure is not None:
+            return None
+
+        # Only corners with a polygon vertex next to them exist in the image, the chamfer corner is computed
+        distances = np.linalg.norm(corners[:, None, :] - polygon[None, :, :], axis=2).min(axis=1)
+        measured = distances <= self.kbm_tracker.refine_window * scale
+        if measured.any():
+            coarse = corners.copy()
+            corners[measured] = self.kbm_tracker.refine_corners(frame, corners[measured])
+            # A computed corner between two refined ones: its sides keep their direction but go through the
+            # refined corners (a side fitted on a pyramid level is only as exact as that level)
+            for index in np.flatnonzero(~measured):
+                previous, following = (index - 1) % 4, (index + 1) % 4
+                if measured[previous] and measured[following]:
+                    corner = self.intersect(self.shift_line(coarse[index], coarse[previous], corners[previous]),
+                                            self.shift_line(coarse[index], coarse[following], corners[following]))
+                    if corner is not None:
+                        corners[index] = corner
+        return corners
+
+    @staticmethod
+    def shift_line(start, end, point):
+        # Homogeneous line with the direction of start -> end through point
+        direction = np.float64(end) - start
+        normal = np.array([-direction[1], direction[0]]) / np.linalg.norm(direction)
+        return np.array([normal[0], normal[1], -normal @ point])
+
+    def get_mask(self, gray, dst=None, side=None, blur=True):
+        # Bright mat against the darker background, written into dst when given. side: the frame's longer side
+        # in gray's pixels when gray is only part of it
+        if blur:
+            gray = cv.GaussianBlur(gray, (5, 5), 0)
+        thresh = cv.threshold(gray, self.threshold, 255, cv.THRESH_BINARY, dst=dst)[1]
+        # Bridge the mat's printed outline, otherwise the thin rim outside it comes and goes between frames
+        # (the outline is wider in pixels the higher the resolution)
+        size = max(3, int(round(self.close_ratio * (side or max(gray.shape[:2]))))) | 1
+        cv.morphologyEx(thresh, cv.MORPH_CLOSE, cv.getStructuringElement(cv.MORPH_RECT, (size, size)), dst=thresh)
+        return thresh
+
+    def fuse_mask(self, frame):
+        # Adds the frame's mask to the fusion stack and returns the masks fused so far
+        gray = cv.cvtColor(frame, cv.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.fusion is None or self.fusion.stack.shape[1:] != gray.shape[:2]:
+            self.fusion = MaskFusion(gray.shape[:2], self.fusion_capacity, self.fusion_method, self.fusion_votes)
+        slot = self.fusion.reserve()
+        self.get_mask(gray, self.fusion.stack[slot])
+        self.fusion.commit(slot, True)
+        return self.fusion.fuse()
+
+    def check_shape(self, corners, frame_area):
+        """
+        Returns why the ordered corners can not be the mat ("not_convex", "too_small", "aspect_ratio",
+        "opposite_sides"), None when they can.
+        """
+        if not cv.isContourConvex(corners.reshape(-1, 1, 2)):
+            return "not_convex"
+        if cv.contourArea(corners) < self.min_area_ratio * frame_area:
+            return "too_small"
+
+        # Side lengths top, right, bottom, left; the longer pair is the template's width in any orientation
+        sides = np.linalg.norm(np.roll(corners, -1, axis=0) - corners, axis=1)
+        if sides.min() <= 0:
+            return "too_small"
+        pairs = sorted([sides[0] + sides[2], sides[1] + sides[3]])
+        aspect = pairs[1] / pairs[0] / self.template_aspect
+        if max(aspect, 1 / aspect) > self.max_aspect_error:
+            return "aspect_ratio"
+        if max(sides[0] / sides[2], sides[2] / sides[0], sides[1] / sides[3], sides[3] / sides[1]) > \
+                self.max_side_ratio:
+            return "opposite_sides"
+        return None
+
+    def find_sides(self, polygon, contour, epsilon):
+        """
+        Returns [(line, length)] for the sides of the polygon in order, neighbouring edges that are
+        (nearly) collinear are merged into one side and fitted together.
+        """
+        edges = []
+        for index in range(len(polygon)):
+            start, end = polygon[index], polygon[(index + 1) % len(polygon)]
+            direction = end - start
+            length = float(np.linalg.norm(direction))
+            if length < 1e-6:
+                continue
+            edges.append((start, end, np.arctan2(direction[1], direction[0]), length))
+
+        # Group runs of collinear edges (the run may wrap around the end of the polygon)
+        groups = []
+        for edge in edges:
+            if groups and self.angle_difference(groups[-1][-1][2], edge[2]) < self.merge_angle:
+                groups[-1].append(edge)
+            else:
+                groups.append([edge])
+        if len(groups) > 1 and self.angle_difference(groups[-1][-1][2], groups[0][0][2]) < self.merge_angle:
+            groups[0] = groups.pop() + groups[0]
+
+        sides = []
+        for group in groups:
+            # Every contour point approxPolyDP folded into these edges
+            points = np.concatenate([self.get_edge_points(contour, start, end, epsilon)
+                                     for start, end, _, _ in group])
+            sides.append((self.fit_side(points), sum(edge[3] for edge in group)))
+        return sides
+
+    def fit_side(self, points):
+        """
+        Line of the dominant straight run in the points. A polygon edge that cuts across the chamfer also
+        holds the chamfer's points, so the line with the most points within fit_distance is picked from lines
+        through pairs of points spread along the side and then refitted on its inliers.
+        """
+        samples = points[np.linspace(0, len(points) - 1, min(len(points), self.fit_samples)).astype(int)]
+        first, second = np.triu_indices(len(samples), 1)
+        normals = np.stack([samples[first, 1] - samples[second, 1], samples[second, 0] - samples[first, 0]], axis=1)
+        lengths = np.linalg.norm(normals, axis=1)
+        valid = lengths > 1e-6
+        if not valid.any():
+            return self.fit_line(points)
+
+        normals = normals[valid] / lengths[valid, None]
+        offsets = -np.sum(normals * samples[first[valid]], axis=1)
+        support = (np.abs(points @ normals.T + offsets) <= self.fit_distance).sum(axis=0)
+        best = int(np.argmax(support))
+        line = np.array([normals[best, 0], normals[best, 1], offsets[best]])
+
+        for _ in range(self.fit_iterations):
+            inliers = points[np.abs(points @ line[:2] + line[2]) <= self.fit_distance]
+            if len(inliers) < 2:
+                break
+            line = self.fit_line(inliers)
+        return line
+
+    def get_edge_points(self, contour, start, end, max_distance):
+        # Contour points along the middle of the edge, the rounded ends near the vertices are left out
+        direction = end - start
+        length_sq = float(direction @ direction)
+        t = (contour - start) @ direction / length_sq
+        normal = np.array([-direction[1], direction[0]]) / np.sqrt(length_sq)
+        distance = np.abs((contour - start) @ normal)
+        selected = contour[(t > 0.1) & (t < 0.9) & (distance <= max_distance)]
+        return selected if len(selected) >= 5 else np.array([start, end])
+
+    @staticmethod
+    def fit_line(points):
+        """
+        Homogeneous least squares line (a, b, c) with a*x + b*y + c = 0 and a^2 + b^2 = 1 through the points
+        (smallest singular vector of the centred points, i.e. total least squares).
+        """
+        mean = points.mean(axis=0)
+        _, _, vt = np.linalg.svd(points - mean, full_matrices=False)
+        normal = vt[-1]
+        return np.array([normal[0], normal[1], -normal @ mean])
+
+    @staticmethod
+    def get_diagonal(corners):
+        # Mean length of the two diagonals of [top_left, top_right, bottom_right, bottom_left]
+        return float(np.linalg.norm(corners[0] - corners[2]) + np.linalg.norm(corners[1] - corners[3])) / 2
+
+    @staticmethod
+    def intersect(line_a, line_b):
+        # Homogeneous intersection of two lines, None if they are (nearly) parallel
+        point = np.cross(line_a, line_b)
+        if abs(point[2]) < 1e-9:
+            return None
+        return point[:2] / point[2]
+
+    @staticmethod
+    def angle_difference(a, b):
+        return abs((a - b + np.pi) % (2 * np.pi) - np.pi)
+
+    @staticmethod
+    def order_corners(corners):
+        # Clockwise on screen (y points down) starting with the corner closest to the image top-left
+        center = corners.mean(axis=0)
+        angles = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+        corners = corners[np.argsort(angles)]
+        return np.roll(corners, -int(np.argmin(corners.sum(axis=1))), axis=0)
@@ -0,0 +1,151 @@
+import os
+
+import cv2 as cv
+import numpy as np
+
+from src.back.key_regions import RESOURCES_DIR, TEMPLATE_PATH
+
+
+class SyntheticScene:
+    """
+    One generated frame with the ground truth corners [top_left, top_right, bottom_right, bottom_left]
+    of the mat in image pixels.
+    """
+    __slots__ = ("image", "corners")
+
+    def __init__(self, image, corners):
+        self.image = image
+        self.corners = corners
+
+
+########################################################################################################################
+#   SceneGenerator Class - Renders the mat template into backgrounds under random conditions
+########################################################################################################################
+
+class SceneGenerator:
+    def __init__(self, template_path=None, background_path=None, frame_size=(640, 480), seed=None,
+                 max_tilt=0.12, max_rotation=12.0, scale_range=(0.55, 0.8), chamfer=0.2,
+                 blur_range=(0.0, 2.0), occlusion_probability=0.5, noise_sigma=4.0):
+        """
+        Parameters:
+        - template_path / background_path: Default to Resources/kbmTemplate.jpg and Resources/kbmBase.jpg.
+        - frame_size: (width, height) of the generated frames.
+        - seed: Seed for repeatable scenes.
+        - max_tilt: Largest perspective jitter of each corner (ratio of the mat size).
+        - max_rotation: Largest in-plane rotation in degrees.
+        - scale_range: Mat width as a ratio of the frame width.
+        - chamfer: Size (ratio of the edges) of the corner cut off at the image top-left, like the real mat
+          where the calibration has to compute the missing corner.
+        - blur_range: Gaussian blur sigma range.
+        - occlusion_probability: Chance of a hand-like blob over the mat.
+        - noise_sigma: Sensor noise standard deviation.
+        """
+        template_path = template_path or TEMPLATE_PATH
+        background_path = background_path or os.path.join(RESOURCES_DIR, "kbmBase.jpg")
+        self.template = cv.imread(template_path)
+        self.background = cv.imread(background_path)
+        if self.template is None or self.background is None:
+            raise FileNotFoundError(f"Could not load '{template_path}' or '{background_path}'")
+
+        self.frame_size = frame_size
+        self.rng = np.random.default_rng(seed)
+        self.max_tilt = max_tilt
+        self.max_rotation = max_rotation
+        self.scale_range = scale_range
+        self.chamfer = chamfer
+        self.blur_range = blur_range
+        self.occlusion_probability = occlusion_probability
+        self.noise_sigma = noise_sigma
+        self.background = cv.resize(self.background, frame_size, interpolation=cv.INTER_AREA)
+
+    def random_corners(self):
+        width, height = self.frame_size
+        t_height, t_width = self.template.shape[:2]
+
+        mat_width = width * self.rng.uniform(*self.scale_range)
+        mat_height = mat_width * t_height / t_width
+        half = np.array([mat_width, mat_height]) / 2
+        corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]], dtype=np.float64) * half
+
+        # Perspective jitter, rotation, then a random placement that keeps the mat in frame
+        corners += self.rng.uniform(-self.max_tilt, self.max_tilt, (4, 2)) * np.array([mat_width, mat_height])
+        angle = np.deg2rad(self.rng.uniform(-self.max_rotation, self.max_rotation))
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        corners = corners @ rotation.T
+
+        low = -corners.min(axis=0) + 5
+        high = np.array([width, height]) - corners.max(axis=0) - 5
+        center = self.rng.uniform(low, np.maximum(high, low))
+        return (corners + center).astype(np.float32)
+
+    def render_background(self):
+        background = self.background
+        if self.rng.random() < 0.5:
+            background = cv.flip(background, 1)
+        # Keep the real keyboard in the photo well below the detection threshold
+        return background.astype(np.float32) * self.rng.uniform(0.25, 0.45)
+
+    def generate_pose(self):
+        # A pose is the random part shared by every frame of a calibration burst
+        return self.random_corners(), self.rng.uniform(0.75, 1.15), self.rng.uniform(-20, 20)
+
+    def generate(self, pose=None):
+        """
+        Renders one frame. Pass the same pose for every frame of a burst (see generate_pose).
+        """
+        corners, gain, offset = self.generate_pose() if pose is None else pose
+        width, height = self.frame_size
+        t_height, t_width = self.template.shape[:2]
+
+        template_corners = np.float32([[0, 0], [t_width, 0], [t_width, t_height], [0, t_height]])
+        # The camera looks at the mat upside down, the template top-left ends up at the image bottom-right
+        matrix = cv.getPerspectiveTransform(template_corners, corners[[2, 3, 0, 1]])
+        mat = cv.warpPerspective(self.template, matrix, (width, height)).astype(np.float32)
+
+        mask = np.zeros((height, width), dtype=np.uint8)
+        polygon = self.chamfered_polygon(corners)
+        cv.fillPoly(mask, [np.round(polygon).astype(np.int32)], 255)
+        mask = cv.GaussianBlur(mask, (3, 3), 0).astype(np.float32)[..., None] / 255.0
+
+        frame = self.render_background() * (1 - mask) + mat * mask
+
+        # Lighting: global gain/offset plus a linear gradient
+        gradient = np.linspace(self.rng.uniform(-25, 0), self.rng.uniform(0, 25), width, dtype=np.float32)
+        frame = frame * gain + offset + gradient[None, :, None]
+
+        if self.rng.random() < self.occlusion_probability:
+            self.draw_occlusion(frame, corners)
+
+        sigma = self.rng.uniform(*self.blur_range)
+        if sigma > 0.3:
+            frame = cv.GaussianBlur(frame, (0, 0), sigma)
+        frame += self.rng.normal(0, self.noise_sigma, frame.shape).astype(np.float32)
+
+        return SyntheticScene(np.clip(frame, 0, 255).astype(np.uint8), corners)
+
+    def generate_burst(self, count):
+        """
+        Frames of one calibration burst: same pose, fresh lighting noise, blur and occlusion per frame.
+        """
+        pose = self.generate_pose()
+        return [self.generate(pose) for _ in range(count)]
+
+    def chamfered_polygon(self, corners):
+        # Cut the corner closest to the image top-left
+        cut = int(np.argmin(corners.sum(axis=1)))
+        previous, current, following = corners[cut - 1], corners[cut], corners[(cut + 1) % 4]
+        a = current + (previous - current) * self.chamfer
+        b = current + (following - current) * self.chamfer
+        points = []
+        for i in range(4):
+            points.extend([a, b] if i == cut else [corners[i]])
+        return np.array(points, dtype=np.float32)
+
+    def draw_occlusion(self, frame, corners):
+        # Skin coloured ellipse (a hand / forearm) overlapping the mat somewhere
+        t = self.rng.uniform(0, 1)
+        edge = self.rng.integers(0, 4)
+        center = corners[edge] * (1 - t) + corners[(edge + 1) % 4] * t
+        axes = (int(self.rng.uniform(20, 60)), int(self.rng.uniform(40, 110)))
+        color = tuple(float(c) for c in self.rng.uniform([90, 120, 170], [140, 170, 230]))
+        cv.ellipse(frame, (int(center[0]), int(center[1])), axes, self.rng.uniform(0, 180), 0, 360, color, -1)
@@ -0,0 +1,122 @@
+from src.back.pipeline import Pipeline, BLOCK, COALESCE, DROP_OLDEST
+
+
+class FramePacket:
+    """
+    Everything known about one captured frame as it moves through the pipeline.
+    """
+    __slots__ = ("seq", "timestamp", "image", "landmarks", "template_points", "keys", "presses", "render",
+                 "warp_engine")
+
+    def __init__(self, seq, timestamp, image):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = image
+        self.landmarks = None  # (num_hands, 21, 3) normalized landmarks
+        self.template_points = None  # (N,2) fingertips in template space
+        self.keys = None  # Key under each fingertip
+        self.presses = []  # PressEvents detected on this frame
+        self.render = None  # Warped preview image (BGR) for the GUI
+        self.warp_engine = None  # Calibration (corners + homography) of this frame, taken after the pose stage
+
+
+########################################################################################################################
+#   TrackingPipeline Class - capture -> inference -> pose -> hit-test -> render
+########################################################################################################################
+
+class TrackingPipeline:
+    def __init__(self, webcam_handler, kbm_tracker, hand_tracker, key_press_processing, render_scale=0.3,
+                 metrics=None, key_events=None):
+        self.webcam_handler = webcam_handler
+        self.kbm_tracker = kbm_tracker
+        self.hand_tracker = hand_tracker
+        self.key_press_processing = key_press_processing
+        self.render_scale = render_scale
+        self.metrics = metrics  # Optional LatencyMetrics, frames are marked as they leave each stage
+        self.key_events = key_events  # Optional KeyEventRing, detected presses are published from hit_test
+        self.track_pose = True  # Turned off by the GUI while a recalibration is collecting frames
+        self.redetect = None  # Optional redetect(frame) (RecalibrationWorker.redetect) for when the pose is lost
+        self.render_enabled = True
+        self.draw_hands = False
+        self.draw_layout = True
+
+        self.pipeline = Pipeline()
+        # Newest frame wins, a slow inference stage never works on a stale frame
+        self.pipeline.add_stage("capture", self.capture, policy=COALESCE)
+        self.pipeline.add_stage("inference", self.inference, capacity=2, policy=BLOCK)
+        self.pipeline.add_stage("pose", self.pose, capacity=2, policy=BLOCK)
+        # Rendering must never hold up key detection
+        self.pipeline.add_stage("hit_test", self.hit_test, capacity=2, policy=DROP_OLDEST)
+        self.pipeline.add_stage("render", self.render, policy=COALESCE)
+
+    def start(self):
+        self.pipeline.start()
+
+    def stop(self):
+        self.pipeline.stop()
+
+    def get_output(self):
+        # Latest rendered packet, or None if nothing new since the last call (never blocks, called from the GUI)
+        return self.pipeline.get_output(timeout=0)
+
+    def capture(self, _):
+        captured = self.webcam_handler.get_frame(timeout=0.1)
+        if captured is None:
+            return None
+        if self.metrics is not None:
+            self.metrics.begin_frame(captured.seq, captured.timestamp)
+        return FramePacket(captured.seq, captured.timestamp, captured.image)
+
+    def mark(self, packet, stage, timestamp=None):
+        if self.metrics is not None:
+            self.metrics.mark(packet.seq, stage, timestamp)
+
+    def inference(self, packet):
+        corners, _ = self.kbm_tracker.get_projection()
+        packet.landmarks = self.hand_tracker.track(packet.image, packet.timestamp, corners)
+        if self.hand_tracker.last_inferred and self.hand_tracker.color_convert_done is not None:
+            self.mark(packet, "color_convert", self.hand_tracker.color_convert_done)
+        self.mark(packet, "inference")
+        return packet
+
+    def pose(self, packet):
+        if self.track_pose:
+            self.kbm_tracker.track_pose(packet.image, self.redetect)
+        # Later stages use this snapshot, a recalibration applied meanwhile only affects later frames
+        _, packet.warp_engine = self.kbm_tracker.get_projection()
+        return packet
+
+    def hit_test(self, packet):
+        if packet.warp_engine is None or packet.warp_engine.corners is None:
+            return packet
+
+        packet.template_points = self.key_press_processing.update_hand_landmarks(packet.landmarks,
+                                                                                 packet.image.shape,
+                                                                                 packet.warp_engine)
+        packet.keys = self.key_press_processing.get_finger_button_interaction()
+        packet.presses = self.key_press_processing.detect_key_presses(packet.timestamp, packet.keys)
+        self.mark(packet, "hit_test")
+        for press in packet.presses:
+            if self.key_events is not None:
+                self.key_events.publish(self.key_press_processing.get_key_name(press.key), press.event_type,
+                                        press.timestamp)
+            if self.metrics is not None and press.event_type == "down":
+                self.metrics.record_key_event(packet.timestamp)
+        return packet
+
+    def render(self, packet):
+        if not self.render_enabled or packet.template_points is None:
+            return packet
+
+        warped = self.kbm_tracker.get_wapped_frame(packet.image, self.render_scale,
+                                                   warp_engine=packet.warp_engine)
+        if warped is None:
+            return packet
+        self.mark(packet, "warp")
+
+        if self.draw_hands:
+            self.key_press_processing.draw_fingertips(warped, self.render_scale, packet.template_points)
+        if self.draw_layout:
+            self.kbm_tracker.draw_button_regions(warped, self.render_scale)
+        packet.render = warped
+        return packet
@@ -0,0 +1,178 @@
+import threading
+from collections import OrderedDict
+
+import cv2 as cv
+import numpy as np
+
+
+########################################################################################################################
+#   WarpEngine Class - Single pass frame -> template remapping
+########################################################################################################################
+
+class WarpEngine:
+    """
+    Precomputes one cv.remap lookup table per calibration and output size. The table folds in the
+    (optional) lens undistortion, the perspective transform, the 180 degree rotation and the display
+    scale so each frame only needs a single cv.remap. Until the same corners were used for
+    lut_min_uses frames (pose tracking applies a drifting mat every few frames) frames are warped with
+    cv.warpPerspective instead, so a moving mat never allocates tables that are thrown away right after.
+
+    set_camera_calibration / set_corners are only called while building an engine. Once applied it is shared
+    (render stage, UI thread) and only warp / project_points are used, the table cache is guarded by a lock.
+    """
+
+    def __init__(self, template_size):
+        """
+        Parameters:
+        - template_size: (width, height) of the cropped keyboard template.
+        """
+        self.template_size = template_size
+        self.camera_matrix = None
+        self.dist_coeffs = None
+        self.corners = None
+        self.transformation_matrix = None  # frame -> warped template (before rotation)
+        self.projection_matrix = None  # frame -> template (rotation included)
+        self.maps = OrderedDict()  # (out_w, out_h) -> (map1, map2), least recently used first
+        self.uses = {}  # (out_w, out_h) -> frames warped without a table
+        self.lut_min_uses = 30  # About a second of a still mat, a table costs ~5 MB of temporaries to build
+        self.max_maps = 2  # Tables kept per calibration, every window resize asks for a new output size
+        self.lock = threading.Lock()  # Guards maps / uses, the engine is warped from several threads
+
+    def set_camera_calibration(self, camera_matrix, dist_coeffs):
+        """
+        Sets the lens calibration used to undistort frames. Pass None to disable undistortion.
+        """
+        if camera_matrix is None:
+            self.camera_matrix = None
+            self.dist_coeffs = None
+        else:
+            self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64)
+            self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+        self.set_corners(self.corners)
+
+    def set_corners(self, corners):
+        """
+        Recomputes the homography from the keyboard corners [top_left, top_right, bottom_right, bottom_left]
+        given in raw frame pixels. Drops every cached lookup table.
+        """
+        self.maps = OrderedDict()
+        self.uses = {}
+        self.corners = corners
+        if corners is None:
+            self.transformation_matrix = None
+            self.projection_matrix = None
+            return
+
+        width, height = self.template_size
+        pts1 = np.float32(corners).reshape(4, 2)
+        if self.camera_matrix is not None:
+            pts1 = cv.undistortPoints(pts1.reshape(-1, 1, 2), self.camera_matrix, self.dist_coeffs,
+                                      P=self.camera_matrix).reshape(4, 2)
+        pts2 = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+
+        self.transformation_matrix = cv.getPerspectiveTransform(pts1, pts2)
+        rotate_180 = np.array([[-1, 0, width - 1],
+                               [0, -1, height - 1],
+                               [0, 0, 1]], dtype=np.float64)
+        self.projection_matrix = rotate_180 @ self.transformation_matrix
+
+    def get_output_size(self, scale=1.0):
+        width, height = self.template_size
+        return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+    def get_maps(self, out_size):
+        """
+        Returns the (cached) fixed point remap tables for the given output size. Only the max_maps most
+        recently used sizes are kept.
+        """
+        with self.lock:
+            maps = self.maps.get(out_size)
+            if maps is not None:
+                self.maps.move_to_end(out_size)
+                return maps
+
+        # Built outside the lock, two threads asking for the same new size at once both build it
+        maps = self.build_maps(out_size)
+        with self.lock:
+            self.maps[out_size] = maps
+            while len(self.maps) > self.max_maps:
+                stale, _ = self.maps.popitem(last=False)
+                self.uses.pop(stale, None)
+        return maps
+
+    def count_use(self, out_size):
+        # True while frames of this size should still be warped without a table (see lut_min_uses)
+        with self.lock:
+            if out_size in self.maps or self.camera_matrix is not None:
+                return False
+            uses = self.uses.get(out_size, 0)
+            if uses >= self.lut_min_uses:
+                return False
+            if uses == 0 and len(self.uses) >= self.max_maps:
+                self.uses.clear()  # Sizes a resize went through and never came back to
+            self.uses[out_size] = uses + 1
+            return True
+
+    def get_output_matrix(self, out_size):
+        # Frame pixel -> output pixel, template -> output uses the same convention as build_maps / cv.resize
+        out_w, out_h = out_size
+        width, height = self.template_size
+        scale_x, scale_y = out_w / width, out_h / height
+        to_output = np.array([[scale_x, 0, 0.5 * scale_x - 0.5],
+                              [0, scale_y, 0.5 * scale_y - 0.5],
+                              [0, 0, 1]], dtype=np.float64)
+        return to_output @ self.projection_matrix
+
+    def build_maps(self, out_size):
+        out_w, out_h = out_size
+        width, height = self.template_size
+
+        # Output pixel -> template pixel (same convention as cv.resize)
+        u = (np.arange(out_w, dtype=np.float64) + 0.5) * (width / out_w) - 0.5
+        v = (np.arange(out_h, dtype=np.float64) + 0.5) * (height / out_h) - 0.5
+        grid_u, grid_v = np.meshgrid(u, v)
+        template_pts = np.stack([grid_u.ravel(), grid_v.ravel(), np.ones(grid_u.size)])
+
+        # Template pixel -> (undistorted) frame pixel
+        frame_pts = np.linalg.inv(self.projection_matrix) @ template_pts
+        frame_pts = frame_pts[:2] / frame_pts[2]
+
+        # Undistorted frame pixel -> raw (distorted) frame pixel
+        if self.camera_matrix is not None:
+            fx, fy = self.camera_matrix[0, 0], self.camera_matrix[1, 1]
+            cx, cy = self.camera_matrix[0, 2], self.camera_matrix[1, 2]
+            normalized = np.stack([(frame_pts[0] - cx) / fx, (frame_pts[1] - cy) / fy, np.ones(frame_pts.shape[1])])
+            projected, _ = cv.projectPoints(normalized.T.reshape(-1, 1, 3), np.zeros(3), np.zeros(3),
+                                            self.camera_matrix, self.dist_coeffs)
+            frame_pts = projected.reshape(-1, 2).T
+
+        map_x = frame_pts[0].reshape(out_h, out_w).astype(np.float32)
+        map_y = frame_pts[1].reshape(out_h, out_w).astype(np.float32)
+        return cv.convertMaps(map_x, map_y, cv.CV_16SC2)
+
+    def project_points(self, points):
+        """
+        Maps raw frame pixel points (N,2) into (rotated) template space without touching any image.
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 1, 2)
+        if self.projection_matrix is None or len(points) == 0:
+            return np.empty((0, 2), dtype=np.float32)
+
+        if self.camera_matrix is not None:
+            points = cv.undistortPoints(points, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix)
+        return cv.perspectiveTransform(points, self.projection_matrix).reshape(-1, 2)
+
+    def warp(self, frame, scale=1.0, dst=None):
+        """
+        Warps a raw frame into the (rotated) template space at the given display scale with one cv.remap.
+        """
+        if frame is None or self.projection_matrix is None:
+            return None
+
+        out_size = self.get_output_size(scale)
+        if self.count_use(out_size):
+            return cv.warpPerspective(frame, self.get_output_matrix(out_size), out_size, dst=dst,
+                                      flags=cv.INTER_LINEAR, borderMode=cv.BORDER_CONSTANT)
+
+        map1, map2 = self.get_maps(out_size)
+        return cv.remap(frame, map1, map2, cv.INTER_LINEAR, dst=dst, borderMode=cv.BORDER_CONSTANT)
@@ -1,13 +1,29 @@
 import sys
+import time
+STARTUP_START = time.perf_counter()  # Before the imports, --profile-startup measures from here
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import cv2 as cv
 from PyQt5.QtCore import QTimer, Qt
-from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtWidgets import QApplication, QMainWindow, QLabel, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, \
     QCheckBox
-import keyboard
 
 from src.back.kbm_tracking import KeyboardTracker
 from src.back.hand_tracking import HandTracker
+from src.back.handle_webcam import WebCamHandler
+from src.back.keyPressProcessing import KeyPressProcessing
+from src.back.layout_cache import LayoutCache
+from src.back.recalibration_worker import RecalibrationWorker
+from src.back.quality_governor import QualityGovernor
+from src.back.tracking_pipeline import TrackingPipeline
+from src.back.latency_metrics import LatencyMetrics
+from src.back.session_recorder import ReplayCaptureSource, SessionRecorder
+from src.back.key_event_bus import KeyEventBus
+from src.back.startup_profiler import StartupProfiler
+from src.front.frame_view import FrameView
+
+# MediaPipe and keyboard are imported on the startup thread (see VideoApp.load_trackers)
+IMPORTS_DONE = time.perf_counter()
 
 c = 0
 
@@ -31,27 +47,69 @@ class Calulate_FPS:
 
 
 class VideoApp(QMainWindow):
-    def __init__(self):
+    def __init__(self, hand_backend="inprocess", pipelined=False, metrics_path=None, record_path=None,
+                 replay_path=None, profiler=None, profile_startup=False):
         super().__init__()
+        self.profiler = profiler if profiler is not None else StartupProfiler()
+        self.profile_startup = profile_startup
+        self.startup_reported = False
 
 
         # Set up the main UI
         self.setWindowTitle("OpenCV with PyQt5")
         self.setGeometry(100, 100, 1400, 700)
 
-        # Set up OpenCV video capture
-        self.cap = cv.VideoCapture(0, cv.CAP_DSHOW)
-        self.cap.set(cv.CAP_PROP_FRAME_WIDTH, 640)
-        self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, 480)
-        self.cap.set(cv.CAP_PROP_FPS, 30)
-
-        # Initialize FPS and KeyboardTracker and HandTracker
+        # Set up OpenCV video capture (frames are read on a background thread)
+        # or play back a recorded session instead of the camera
+        if replay_path is not None:
+            self.webcam_handler = ReplayCaptureSource(replay_path)
+        else:
+            self.webcam_handler = WebCamHandler()
+
+        # Optionally record frames, calibrations and key events for offline replay. Frames are recorded on the
+        # capture thread (every captured frame, also the ones the UI never pulls)
+        self.sessionRecorder = SessionRecorder(record_path) if record_path is not None else None
+        self.webcam_handler.recorder = self.sessionRecorder
+        with self.profiler.phase("webcam"):
+            self.webcam_handler.start_webcam(640, 480, 30)
+
+        # Initialize FPS
         self.fps_tracker = Calulate_FPS()
-        self.kbmTracker = KeyboardTracker()
-        self.handTracker = HandTracker()
 
-        # Set up the QLabel to display the video frames
-        self.webcam_video = QLabel(self)
+        # Steps hand model / preview quality up and down to stay within the frame budget
+        self.qualityGovernor = QualityGovernor(target_ms=16.0, on_level_change=self.apply_quality_settings)
+        self.quality = self.qualityGovernor.settings
+
+        # The layout, KeyboardTracker and HandTracker (model load + warm-up) and the keyboard hook are set up
+        # on a startup thread so the window and the raw feed show right away, finish_startup wires them in
+        self.hand_backend = hand_backend
+        self.pipelined = pipelined
+        self.kbm_layout = None
+        self.kbmTracker = None
+        self.handTracker = None
+        self.recalibrationWorker = None
+        self.keyLayoutIndex = None
+        self.keyPressProcessing = None
+        self.keyboard = None
+        self.startup_executor = ThreadPoolExecutor(1, thread_name_prefix="startup")
+        self.startup_future = self.startup_executor.submit(self.load_trackers)
+
+        # Per-stage latency histograms, exported to metrics_path (.json/.csv/.prom) every few seconds
+        self.latencyMetrics = LatencyMetrics()
+        self.metrics_path = metrics_path
+        self.metrics_export_interval = 5.0
+        self.last_metrics_export = time.monotonic()
+
+        # Key events from the press detector and the global keyboard hook, drained once per display refresh
+        self.keyEventBus = KeyEventBus()
+        self.detectedKeyEvents = self.keyEventBus.create_producer("detector")
+        self.globalKeyEvents = self.keyEventBus.create_producer("keyboard")
+        self.keyEventBus.subscribe(self.handle_key_events)
+        self.typed_text = ""
+        self.max_typed_chars = 80
+
+        # Set up the label to display the raw webcam frames (painted by Qt, no separate HighGUI window)
+        self.webcam_video = FrameView(self)
         self.webcam_video.setAlignment(Qt.AlignCenter)
 
         # Initialize the text_box label
@@ -67,7 +125,7 @@ class VideoApp(QMainWindow):
         """)
 
         # Initialize the video_feed label
-        self.warped_video = QLabel(self)
+        self.warped_video = FrameView(self)
         self.warped_video.setAlignment(Qt.AlignCenter)
         self.warped_video.setText("Warped Video Area")  # Optional: Placeholder text
         self.warped_video.setStyleSheet("""
@@ -80,8 +138,8 @@ class VideoApp(QMainWindow):
         # Set up the button to trigger recalibrate
         self.recalibrate_button = QPushButton("Recalibrate", self)
         self.recalibrate_button.clicked.connect(self.start_recalibration)
+        self.recalibrate_button.setEnabled(False)  # Until the trackers are loaded
         self.recalibrate_active = False
-        self.prev_five_frames = []
 
         # Set up button to Draw Hand
         self.draw_hands_button = QCheckBox("Draw Hand Tracking?",self)
@@ -97,6 +155,7 @@ class VideoApp(QMainWindow):
         center_layout = QHBoxLayout()
         # center_layout.addStretch()  # Add stretch on the left side
         center_layout.addWidget(self.warped_video)  # Add the video_feed label
+        center_layout.addWidget(self.webcam_video)  # Raw webcam feed next to it
         # center_layout.addStretch()  # Add stretch on the right side
 
         # Create the main layout
@@ -119,121 +178,356 @@ class VideoApp(QMainWindow):
         self.setCentralWidget(container)
 
         # Set up a QTimer to refresh frames periodically
+        # In pipelined mode capture/inference/pose/hit-test/render run on their own threads and
+        # the timer only consumes the final render stage
+        self.trackingPipeline = None  # Started by finish_startup
+
         self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        self.timer.timeout.connect(self.update_frame if not pipelined else self.update_pipelined_frame)
         self.timer.start(30)  # Set timer to update every 30 ms (about 33 FPS)
 
-        # Set up global keyboard listener
-        keyboard.on_press(self.handle_global_key_press)
+        # Key events are drained in batches at the display refresh rate, the text box repaints at most once a tick
+        refresh_rate = self.screen().refreshRate() if self.screen() is not None else 60.0
+        self.key_event_timer = QTimer()
+        self.key_event_timer.timeout.connect(self.keyEventBus.dispatch)
+        self.key_event_timer.start(max(1, int(1000 / max(refresh_rate, 1.0))))
+
+    def load_trackers(self):
+        # Runs on the startup thread, nothing in here touches Qt
+        with self.profiler.phase("layout"):
+            layout = LayoutCache().get_layout()
+            kbm_tracker = KeyboardTracker(layout)
+
+        with self.profiler.phase("hand_model"):
+            hand_tracker = HandTracker(model_complexity=self.quality["model_complexity"], backend=self.hand_backend)
+            hand_tracker.decimation_enabled = True
+            hand_tracker.roi_enabled = True  # Only the mat area goes to the model once calibrated
+            hand_tracker.inference_width = self.quality["inference_width"]
+
+        # Pays the graph initialization now instead of on the first tracked frame
+        with self.profiler.phase("hand_warm_up"):
+            if not hand_tracker.warm_up((480, 640, 3)):
+                print("[VideoApp] Error: Hand model warm-up timed out.")
+
+        with self.profiler.phase("keyboard_hook_import"):
+            import keyboard
+
+        return layout, kbm_tracker, hand_tracker, keyboard
+
+    def finish_startup(self):
+        """
+        Wires in the trackers once the startup thread is done. Returns True when that happened on this call.
+        """
+        if self.startup_future is None or not self.startup_future.done():
+            return False
+
+        future, self.startup_future = self.startup_future, None
+        self.startup_executor.shutdown(wait=False)
+        try:
+            self.kbm_layout, self.kbmTracker, self.handTracker, self.keyboard = future.result()
+        except Exception as e:
+            print(f"[VideoApp] Error: Startup failed: {e}")
+            return False
+
+        with self.profiler.phase("finish_startup"):
+            self.apply_quality_settings(self.quality)
+            self.recalibrationWorker = RecalibrationWorker(self.kbmTracker)
+            if self.sessionRecorder is not None:
+                # Every projection change is recorded: recalibrations, pose tracking and redetection
+                corners, _ = self.kbmTracker.get_projection()
+                if corners is not None and None not in corners:
+                    self.sessionRecorder.record_calibration(time.monotonic(), corners)
+                self.kbmTracker.on_projection_change = self.sessionRecorder.record_calibration
+            if isinstance(self.webcam_handler, ReplayCaptureSource):
+                self.webcam_handler.kbm_tracker = self.kbmTracker  # Applies the recorded calibrations
+            self.keyLayoutIndex = self.kbm_layout.layout_index
+            self.keyPressProcessing = KeyPressProcessing(self.kbmTracker, self.handTracker, self.keyLayoutIndex)
+
+            # In pipelined mode capture/inference/pose/hit-test/render run on their own threads and
+            # the timer only consumes the final render stage
+            if self.pipelined:
+                self.trackingPipeline = TrackingPipeline(self.webcam_handler, self.kbmTracker, self.handTracker,
+                                                         self.keyPressProcessing, self.get_warped_scale(),
+                                                         self.latencyMetrics, self.detectedKeyEvents)
+                self.trackingPipeline.redetect = self.recalibrationWorker.redetect
+                self.trackingPipeline.start()
+
+            # Set up global keyboard listener
+            self.keyboard.on_press(self.handle_global_key_press)
+            self.recalibrate_button.setEnabled(True)
+
+        self.profiler.mark("ready")
+        self.report_startup()
+        return True
+
+    def update_startup_frame(self):
+        # Until the trackers are loaded only the raw feed is shown
+        if self.finish_startup():
+            return
+
+        captured = self.webcam_handler.get_frame()
+        if captured is None:
+            return
+        self.handleWebcamImage(captured.image)
+
+    def report_startup(self):
+        # Printed once, when both the first preview and the trackers are up
+        if not self.profile_startup or self.startup_reported:
+            return
+        if self.profiler.has_mark("first_preview") and self.profiler.has_mark("ready"):
+            self.startup_reported = True
+            print(self.profiler.report())
 
     def handle_global_key_press(self, event):
         """
-        Handles global key press events (from the keyboard library).
+        Handles global key press events (from the keyboard library). Runs on the hook thread, so it only
+        publishes to the key event bus.
         """
         key_name = event.name
-        print(f"Global key pressed: {key_name}")
+        self.globalKeyEvents.publish(key_name, event.event_type)
+        if self.sessionRecorder is not None:
+            self.sessionRecorder.record_key_event(key_name, event.event_type, event.time)
+
+
+    def handle_key_events(self, batch):
+        # One batch per display refresh, however fast the keys came in
+        global_keys = [event.name for event in batch if event.source == "keyboard"]
+        if global_keys:
+            print(f"Global keys pressed: {' '.join(global_keys)}")
+
+        text = self.typed_text
+        for event in batch:
+            if event.source != "detector" or event.event_type != "down":
+                continue
+            if event.name == "space":
+                text += " "
+            elif event.name == "backspace":
+                text = text[:-1]
+            elif len(event.name) == 1:
+                text += event.name
+            else:
+                text += f"[{event.name}]"
 
+        if text != self.typed_text:
+            self.typed_text = text[-self.max_typed_chars:]
+            self.text_box.setText(self.typed_text)
 
     def update_frame(self):
-        # Read a frame from the camera
-        ret, frame = self.cap.read()
-        if not ret:
-            print("Failed to grab frame")
+        if self.kbmTracker is None:
+            self.update_startup_frame()
             return
 
-        self.handleWebcamImage(frame)
+        # Pull the newest frame from the capture thread, nothing to do if no new frame arrived
+        captured = self.webcam_handler.get_frame()
+        if captured is None:
+            return
+        frame = captured.image
+        self.qualityGovernor.start_frame()
+        self.latencyMetrics.begin_frame(captured.seq, captured.timestamp)
+
+        ################################################################################
+        # follow the mat between recalibrations (optical flow, when lost the recalibration worker looks for it)
+        if not self.recalibrate_active and not self.recalibrationWorker.is_running():
+            with self.qualityGovernor.measure("pose"):
+                self.kbmTracker.track_pose(frame, self.recalibrationWorker.redetect)
+
+        ################################################################################
+        # key detection (fingertips are projected into template space, no warping needed)
+        with self.qualityGovernor.measure("inference"):
+            self.handleKeyDetection(frame, captured.seq, captured.timestamp)
+
+        with self.qualityGovernor.measure("webcam_display"):
+            self.handleWebcamImage(frame)
 
         ################################################################################
-        # warped img
-        self.handleWarpedImage(frame)
+        # warped img (only when the preview can actually be seen and the budget allows it)
+        if self.quality["run_warp"] and self.warped_video.isVisible():
+            with self.qualityGovernor.measure("warp_display"):
+                self.handleWarpedImage(frame, captured.seq)
+
+        self.latencyMetrics.mark(captured.seq, "display")
+        self.latencyMetrics.end_frame(captured.seq)
+        self.export_metrics()
+        self.qualityGovernor.end_frame()
 
 
         ################################################################################
-        self.handle_recalibrate()
+        self.handle_recalibrate(frame)
 
 
 
     def handleWebcamImage(self, frame):
-        # Display FPS on the frame
-        frame = self.fps_tracker.display_fps(frame)
+        if not self.webcam_video.isVisible():
+            return
 
-        cv.imshow("Webcam", frame)
+        # Resize into the label's display buffer, FPS is drawn there so the captured frame stays untouched
+        display = self.webcam_video.fit_frame(frame)
+        self.fps_tracker.display_fps(display)
+        self.webcam_video.show_buffer()
 
-        # # Convert the frame to RGB format for PyQt
-        # rgb_frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-        # h, w, ch = rgb_frame.shape
-        # bytes_per_line = ch * w
-        # qt_image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        #
-        # # Set the image in the QLabel
-        # self.webcam_video.setPixmap(QPixmap.fromImage(qt_image))
+        if not self.profiler.has_mark("first_preview"):
+            self.profiler.mark("first_preview")
+            self.report_startup()
+
+    def update_pipelined_frame(self):
+        # Latest fully processed frame from the pipeline, nothing to paint if none arrived
+        pipeline = self.trackingPipeline
+        if pipeline is None:
+            self.update_startup_frame()
+            return
+        pipeline.track_pose = not self.recalibrate_active and not self.recalibrationWorker.is_running()
+        pipeline.render_enabled = self.warped_video.isVisible()
+        pipeline.render_scale = self.get_warped_scale()
+        pipeline.draw_hands = self.draw_hands_button.isChecked()
+        pipeline.draw_layout = self.draw_kbm_layout.isChecked()
+
+        packet = pipeline.get_output()
+        if packet is None:
+            return
 
-    def handleWarpedImage(self, frame):
+        self.handleWebcamImage(packet.image)
+        if packet.render is not None:
+            self.show_warped_image(packet.render)
+        self.latencyMetrics.mark(packet.seq, "display")
+        self.latencyMetrics.end_frame(packet.seq)
+        self.export_metrics()
+        self.handle_recalibrate(packet.image)
+
+    def handleKeyDetection(self, frame, seq, timestamp):
         if self.kbmTracker.kbm_corners is None or None in self.kbmTracker.kbm_corners:
             return
 
-        frame_copy = frame.copy()
-        drawn_img = None
+        # Runs the hand model only every few frames, predicted landmarks in between
+        hand_landmarks = self.handTracker.track(frame, timestamp, self.kbmTracker.kbm_corners)
+        if self.handTracker.last_inferred and self.handTracker.color_convert_done is not None:
+            self.latencyMetrics.mark(seq, "color_convert", self.handTracker.color_convert_done)
+        self.latencyMetrics.mark(seq, "inference")
+
+        self.keyPressProcessing.update_hand_landmarks(hand_landmarks, frame.shape)
+        keys = self.keyPressProcessing.get_finger_button_interaction()
+        presses = self.keyPressProcessing.detect_key_presses(timestamp, keys)
+        self.latencyMetrics.mark(seq, "hit_test")
+        for press in presses:
+            self.detectedKeyEvents.publish(self.keyPressProcessing.get_key_name(press.key), press.event_type,
+                                           press.timestamp)
+            if press.event_type == "down":
+                self.latencyMetrics.record_key_event(timestamp)
+        return presses
+
+    def handleWarpedImage(self, frame, seq=None):
+        corners, warp_engine = self.kbmTracker.get_projection()
+        if corners is None or None in corners:
+            return
 
-        # Draw Hand tracking on the projection
-        if self.draw_hands_button.isChecked():
-            hand_landmarks = self.handTracker.get_hand_landmarks(frame_copy)
-            self.handTracker.draw_landmarks(frame_copy, hand_landmarks)
+        # Warp straight into the label's display buffer at its pixel size (one remap, no rotate/resize/convert)
+        scale = self.get_warped_scale()
+        display = self.warped_video.get_buffer(warp_engine.get_output_size(scale))
+        warped_img = self.kbmTracker.get_wapped_frame(frame, scale, dst=display, warp_engine=warp_engine)
+        if warped_img is None:
+            return
+        if seq is not None:
+            self.latencyMetrics.mark(seq, "warp")
 
-        warped_img = self.kbmTracker.get_wapped_frame(frame_copy)
+        # Draw Hand tracking on the projection (fingertips are already in template space)
+        if self.quality["draw_overlays"] and self.draw_hands_button.isChecked():
+            self.keyPressProcessing.draw_fingertips(warped_img, scale)
 
         # Draw Button Regions
-        if self.draw_kbm_layout.isChecked():
-            draw_on_img = warped_img if drawn_img is None else drawn_img
-            drawn_img = self.kbmTracker.draw_button_regions(draw_on_img)
-
-        show_img = warped_img if drawn_img is None else drawn_img
-
-        if show_img.any: # Show the projection
-            show_img = cv.resize(show_img, (0,0), fx=0.3, fy=0.3)
-            # Convert the frame to RGB format for PyQt
-            rgb_warped_img = cv.cvtColor(show_img, cv.COLOR_BGR2RGB)
-            h, w, ch = rgb_warped_img.shape
-            bytes_per_line = ch * w
-            qt_warped_img = QImage(rgb_warped_img.data, w, h, bytes_per_line, QImage.Format_RGB888)
-
-            # Create a QPixmap from the QImage
-            pixmap = QPixmap.fromImage(qt_warped_img)
-
-            # Scale the pixmap to fit the size of the video_feed label, maintaining aspect ratio
-            scaled_pixmap = pixmap.scaled(self.warped_video.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
-
-            # Set the scaled pixmap as the label's image
-            self.warped_video.setPixmap(scaled_pixmap)
-
-    def handle_recalibrate(self):
-        if self.recalibrate_active:
-            # Store the last 5 frames
-            if len(self.prev_five_frames) < 5:
-                print(len(self.prev_five_frames))
-                ret, frame = self.cap.read()
-                if frame is not None:
-                    self.prev_five_frames.append(frame)
-            else:
-                # Recalibrate the KeyboardTracker with the last 5 frames
-                self.kbmTracker.recalibrate_projection(self.prev_five_frames)
-                self.recalibrate_active = False
-                self.prev_five_frames = []
+        if self.quality["draw_overlays"] and self.draw_kbm_layout.isChecked():
+            self.kbmTracker.draw_button_regions(warped_img, scale)
+
+        self.warped_video.show_buffer()
+
+    def show_warped_image(self, show_img):
+        # Pipelined mode, the render stage already warped at get_warped_scale so this is a plain copy
+        self.warped_video.show_frame(show_img)
+
+    def get_warped_scale(self):
+        # Template -> preview scale that fills the warped video label
+        width, height = self.kbmTracker.warp_engine.template_size
+        return self.warped_video.fit_scale(width, height)
+
+    def export_metrics(self, force=False):
+        if self.metrics_path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_metrics_export < self.metrics_export_interval:
+            return
+
+        self.last_metrics_export = now
+        try:
+            self.latencyMetrics.export(self.metrics_path)
+        except (OSError, ValueError) as e:
+            print(f"[VideoApp] Error: Could not export metrics: {e}")
+            self.metrics_path = None
+
+    def apply_quality_settings(self, settings):
+        # Called by the QualityGovernor whenever it steps the quality level
+        self.quality = settings
+        self.warped_video.smooth = settings["smooth_preview"]
+        self.webcam_video.smooth = settings["smooth_preview"]
+        if self.handTracker is None:
+            return  # Picked up by finish_startup
+        self.handTracker.set_model(model_complexity=settings["model_complexity"])
+        self.handTracker.inference_width = settings["inference_width"]
+        print(f"Quality level {self.qualityGovernor.level}: {settings}")
+
+    def handle_recalibrate(self, frame):
+        if self.recalibrate_active and frame is not None:
+            # Frames stream into the calibrator in the background until its corners settle
+            self.recalibrationWorker.add_frame(frame)
+
+        # Report progress, the new calibration is swapped in here once the worker is done
+        if self.recalibrationWorker.is_running():
+            done, total = self.recalibrationWorker.get_progress()
+            self.statusBar().showMessage(f"Recalibrating... {done}/{total} frames")
+
+        result = self.recalibrationWorker.poll()
+        if result is not None:
+            self.recalibrate_active = False
+            success, message = result
+            self.statusBar().showMessage(message, 5000)
+            self.recalibrate_button.setEnabled(True)
+            print(message)
+            if success:
                 print(self.kbmTracker.transformation_matrix)
 
     def start_recalibration(self):
         print("Recalibrate button clicked.")
-        # Set flag to start recalibration and store frames
+        if self.recalibrationWorker is None or self.recalibrationWorker.is_running():
+            return
+
+        # Start the job and stream the next frames into it
+        if not self.recalibrationWorker.start():
+            return
         self.recalibrate_active = True
+        self.recalibrate_button.setEnabled(False)
 
     def closeEvent(self, event):
 
-        keyboard.unhook_all()  # Remove all hooks to prevent lingering listeners
+        # Closed before the startup thread finished, let it finish so its hand tracker can be closed too
+        if self.startup_future is not None:
+            self.startup_executor.shutdown(wait=True)
+            if self.startup_future.exception() is None:
+                self.handTracker = self.startup_future.result()[2]
+            self.startup_future = None
+
+        if self.keyboard is not None:
+            self.keyboard.unhook_all()  # Remove all hooks to prevent lingering listeners
         event.accept()
 
+        self.export_metrics(force=True)
+
         # Release video capture when the window is closed
-        self.cap.release()
-        cv.destroyAllWindows()
+        if self.trackingPipeline is not None:
+            self.trackingPipeline.stop()
+        self.webcam_handler.stop_webcam()
+        if self.sessionRecorder is not None:
+            self.sessionRecorder.close()
+        if self.recalibrationWorker is not None:
+            self.recalibrationWorker.shutdown()
+        if self.handTracker is not None:
+            self.handTracker.close()
         event.accept()
 
     def disable_button_focus(self):
@@ -247,7 +541,26 @@ class VideoApp(QMainWindow):
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = VideoApp()
-    window.show()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hand-backend", choices=["inprocess", "process"], default="inprocess",
+                        help="Run hand inference in this process (default) or in a worker process")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Run capture, inference, pose, hit-test and render as separate pipeline stages")
+    parser.add_argument("--metrics-out", default=None,
+                        help="Write latency percentiles to this file (.json, .csv or .prom) every few seconds")
+    parser.add_argument("--record", default=None, help="Record the session (frames, calibrations, key events) here")
+    parser.add_argument("--replay", default=None, help="Play back a recorded session instead of the webcam")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="Print the time spent in each startup phase once the app is ready")
+    args, qt_args = parser.parse_known_args()
+
+    profiler = StartupProfiler(STARTUP_START)
+    profiler.record("imports", STARTUP_START, IMPORTS_DONE)
+    with profiler.phase("qt_app"):
+        app = QApplication(sys.argv[:1] + qt_args)
+    with profiler.phase("window"):
+        window = VideoApp(args.hand_backend, args.pipeline, args.metrics_out, args.record, args.replay, profiler,
+                          args.profile_startup)
+    with profiler.phase("show"):
+        window.show()
     sys.exit(app.exec_())
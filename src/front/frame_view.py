@@ -0,0 +1,93 @@
+import cv2 as cv
+import numpy as np
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QLabel
+
+
+########################################################################################################################
+#   FrameView Class - QLabel that paints BGR frames straight from a persistent NumPy buffer
+########################################################################################################################
+
+class FrameView(QLabel):
+    def __init__(self, parent=None):
+        """
+        Frames are rendered once at the label's pixel size into a buffer that lives as long as the size stays the
+        same. The QImage wraps that buffer (Format_BGR888, no RGB conversion, no QPixmap) and is painted directly,
+        the fit is only recomputed when the widget is resized. Shows the label text / style until the first frame.
+        """
+        super().__init__(parent)
+        self.buffer = None  # (H,W,3) uint8, what gets painted
+        self.image = None  # QImage over self.buffer
+        self.has_frame = False
+        self.smooth = True  # INTER_AREA when a frame has to be resized into the buffer, else INTER_NEAREST
+        self.pixel_size = self.get_pixel_size()
+
+    def get_pixel_size(self):
+        ratio = self.devicePixelRatioF()
+        return max(1, int(self.width() * ratio)), max(1, int(self.height() * ratio))
+
+    def resizeEvent(self, event):
+        self.pixel_size = self.get_pixel_size()
+        super().resizeEvent(event)
+
+    def fit_scale(self, width, height):
+        """
+        Scale that fits a width x height source into the widget (keeping the aspect ratio), in device pixels.
+        """
+        view_width, view_height = self.pixel_size
+        return min(view_width / width, view_height / height)
+
+    def fit_size(self, width, height):
+        scale = self.fit_scale(width, height)
+        return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+    def get_buffer(self, size):
+        """
+        Returns the persistent (H,W,3) buffer for a (width, height) size, reallocated only when the size changes.
+        Render into it, then call show_buffer.
+        """
+        width, height = size
+        if self.buffer is None or self.buffer.shape[:2] != (height, width):
+            self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+            self.image = QImage(self.buffer.data, width, height, self.buffer.strides[0], QImage.Format_BGR888)
+            self.image.setDevicePixelRatio(self.devicePixelRatioF())
+        return self.buffer
+
+    def fit_frame(self, frame):
+        """
+        Writes a frame into the buffer at the fitted size (a plain copy when it already has that size).
+        """
+        height, width = frame.shape[:2]
+        buffer = self.get_buffer(self.fit_size(width, height))
+        if buffer.shape[:2] == (height, width):
+            np.copyto(buffer, frame)
+        else:
+            interpolation = cv.INTER_AREA if self.smooth else cv.INTER_NEAREST
+            cv.resize(frame, (buffer.shape[1], buffer.shape[0]), dst=buffer, interpolation=interpolation)
+        return buffer
+
+    def show_buffer(self):
+        self.has_frame = True
+        self.update()
+
+    def show_frame(self, frame):
+        self.fit_frame(frame)
+        self.show_buffer()
+
+    def clear_frame(self):
+        # Back to the label text
+        self.has_frame = False
+        self.update()
+
+    def paintEvent(self, event):
+        if not self.has_frame or self.image is None:
+            super().paintEvent(event)
+            return
+
+        painter = QPainter(self)
+        ratio = self.image.devicePixelRatio()
+        width, height = self.image.width() / ratio, self.image.height() / ratio
+        target = QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height)
+        painter.drawImage(target, self.image)
+        painter.end()
@@ -1,10 +1,8 @@
-import numpy as np
 from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QPushButton, QCheckBox
 from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QImage, QPixmap
-import cv2 as cv
 
 from src.back.handle_webcam import WebCamHandler
+from src.front.frame_view import FrameView
 
 
 class TypingMenu(QWidget):
@@ -15,6 +13,7 @@ class TypingMenu(QWidget):
 
         self.text_box = self.init_text_box()
         self.video_feed_area = self.init_video_feed()
+        self.raw_video_area = self.init_raw_video_feed()
         self.recalibrate_button = None
         self.draw_hands_button = None
         self.draw_kbm_layout = None
@@ -55,6 +54,7 @@ class TypingMenu(QWidget):
     def stop_webcam_feed(self):
         self.timer.stop()
         self.webcam_handler.stop_webcam()
+        self.video_feed_area.clear_frame()
         self.video_feed_area.setText("Webcam Feed Area")
         self.update_raw_video_window_to_blank()
 
@@ -66,16 +66,18 @@ class TypingMenu(QWidget):
             self.stop_raw_video_feed_window()
 
     def start_raw_video_feed_window(self):
-        cv.namedWindow("Webcam Feed", cv.WINDOW_NORMAL)
-        cv.resizeWindow("Webcam Feed", 427, 320)
         self.update_raw_video_window_to_blank()
+        self.raw_video_area.show()
 
     def stop_raw_video_feed_window(self):
-        cv.destroyWindow("Webcam Feed")
+        self.raw_video_area.hide()
 
 
     def update_video_frames(self):
+        # Pull the newest frame from the capture thread, skip the tick if no new frame arrived
         frame = self.webcam_handler.get_webcam_frame()
+        if frame is None:
+            return
 
         # TODO only show the raw frame on the pyqt5 window if the warped frame is not calibrated
         self.update_warped_video_frame(frame)
@@ -85,42 +87,22 @@ class TypingMenu(QWidget):
 
         pass
 
-    # This is the video frame that is on the OpenCV window
+    # This is the raw video frame, painted next to the main feed
     def update_raw_video_frame(self, openCV_frame):
         if openCV_frame is not None:
-            cv.imshow("Webcam Feed", openCV_frame)
+            self.raw_video_area.show_frame(openCV_frame)
         else:
             self.update_raw_video_window_to_blank()
 
     def update_raw_video_window_to_blank(self):
-        if self.show_raw_video_button.isChecked():
-            blank = np.zeros((320, 427, 3), np.uint8)
-            blank = cv.putText(blank, "No webcam feed", (85, blank.shape[0]//2), cv.FONT_HERSHEY_DUPLEX, 1, (255, 255, 255), 1, cv.LINE_AA)
-            cv.imshow("Webcam Feed", blank)
+        # Back to the label's "No webcam feed" text
+        self.raw_video_area.clear_frame()
 
 
     # This is the video frame that is on the pyqt5 window
     def update_warped_video_frame(self, openCV_frame):
-        # Convert the OpenCV frame from BGR to RGB
-        rgb_frame = cv.cvtColor(openCV_frame, cv.COLOR_BGR2RGB)
-
-        # Get the shape of the frame
-        h, w, ch = rgb_frame.shape
-        bytesPerLine = ch * w
-
-        # Create a QImage from the OpenCV frame
-        q_img = QImage(rgb_frame.data, w, h, bytesPerLine, QImage.Format_RGB888)
-
-        # Create a QPixmap from the QImage
-        pixmap = QPixmap.fromImage(q_img)
-
-        # Scale the QPixmap to fit the label
-        scaled_pixmap = pixmap.scaled(self.video_feed_area.width(), self.video_feed_area.height(), Qt.KeepAspectRatio)
-
-        # Set the scaled pixmap to the label
-        self.video_feed_area.setPixmap(scaled_pixmap)  # Use scaled_pixmap here
-
-        self.layout().update()
+        # Rendered once at the label's pixel size into its persistent BGR buffer, painted without conversion
+        self.video_feed_area.show_frame(openCV_frame)
 
 
     pass
@@ -140,6 +122,7 @@ class TypingMenu(QWidget):
         # Create a horizontal layout for the video_feed
         center_layout = QHBoxLayout()
         center_layout.addWidget(self.video_feed_area)
+        center_layout.addWidget(self.raw_video_area)
 
         # Add components to the main layout
         self.main_layout.addWidget(self.text_box)  # Add text_box at the top
@@ -175,7 +158,7 @@ class TypingMenu(QWidget):
         return text_box
 
     def init_video_feed(self):
-        video_feed_area = QLabel(self)
+        video_feed_area = FrameView(self)
         video_feed_area.setAlignment(Qt.AlignCenter)
         video_feed_area.setText("Video Feed Area")  # Optional: Placeholder text
         video_feed_area.setStyleSheet("""
@@ -188,6 +171,21 @@ class TypingMenu(QWidget):
 
         return video_feed_area
 
+    def init_raw_video_feed(self):
+        raw_video_area = FrameView(self)
+        raw_video_area.setAlignment(Qt.AlignCenter)
+        raw_video_area.setText("No webcam feed")
+        raw_video_area.setStyleSheet("""
+            color: #ebdbb2;
+            font-size: 18px;
+            border-radius: 10px;
+            border: 2px solid #ebdbb2;
+        """)
+        raw_video_area.setFixedSize(427, 320)
+        raw_video_area.hide()  # Shown with the show_raw_video_button
+
+        return raw_video_area
+
     def init_buttons(self):
 
         push_button_style = """
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from src.back.frame_pool import FramePool, ScratchBuffer
+
+
+def test_released_buffer_is_reused():
+    pool = FramePool()
+    buffer = pool.acquire((4, 6, 3))
+    buffer_id = id(buffer)
+    del buffer
+    assert id(pool.acquire((4, 6, 3))) == buffer_id
+    assert pool.allocations == 1 and pool.reuses == 1
+
+
+def test_shapes_and_dtypes_have_their_own_buffers():
+    pool = FramePool()
+    frame = pool.acquire((4, 6, 3))
+    gray = pool.acquire((4, 6))
+    floats = pool.acquire((4, 6), np.float32)
+    assert gray.shape == (4, 6) and floats.dtype == np.float32
+    assert len({id(frame), id(gray), id(floats)}) == 3 and pool.allocations == 3
+
+
+def test_max_buffers_are_kept():
+    pool = FramePool(max_buffers=2)
+    held = [pool.acquire((2, 2)) for _ in range(4)]
+    assert pool.allocations == 4 and len(pool.buffers[((2, 2), np.dtype(np.uint8).str)]) == 2
+    del held
+    pool.acquire((2, 2))
+    assert pool.reuses == 1
+
+
+def test_scratch_buffer_only_grows():
+    scratch = ScratchBuffer()
+    large = scratch.get((10, 10, 3))
+    backing = scratch.backing
+    small = scratch.get((2, 5), np.float32)
+    assert scratch.backing is backing and small.shape == (2, 5) and small.flags.c_contiguous
+    assert large.shape == (10, 10, 3)
+
+
+class Holder:
+    def __init__(self, frame):
+        self.frame = frame
+
+
+@pytest.mark.parametrize("hold", [
+    lambda buffer: buffer[1:3],  # view
+    lambda buffer: buffer.reshape(-1),  # reshaped view
+    lambda buffer: buffer[..., 0][::2],  # view of a view
+    lambda buffer: [buffer],  # list
+    lambda buffer: {"frame": buffer},  # dict
+    lambda buffer: Holder(buffer),  # attribute
+    lambda buffer: memoryview(buffer),  # buffer protocol export
+])
+def test_referenced_buffer_is_never_handed_out(hold):
+    pool = FramePool(max_buffers=2)
+    buffer = pool.acquire((4, 6, 3))
+    buffer_id = id(buffer)
+    held = hold(buffer)
+    del buffer
+
+    others = [pool.acquire((4, 6, 3)) for _ in range(3)]
+    assert buffer_id not in {id(other) for other in others}
+    del others
+
+    # Once the last outside reference is gone it goes back to the pool
+    del held
+    assert buffer_id in {id(pool.acquire((4, 6, 3))) for _ in range(2)}
@@ -0,0 +1,136 @@
+import time
+
+import numpy as np
+
+from src.back.hand_inference_pool import HandInferencePool
+
+
+class FakeProcessBackend:
+    """
+    Stands in for ProcessHandInference with one slot. Each submitted frame is answered after the next of
+    delays seconds, None never answers.
+    """
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.free_slots = [0]
+        self.pending = None  # (seq, timestamp, due time or None)
+        self.closed = False
+
+    def submit(self, frame, seq, timestamp, model_complexity, inference_width=None):
+        if not self.free_slots:
+            return False
+        self.free_slots.pop()
+        delay = self.delays.pop(0)
+        self.pending = (seq, timestamp, None if delay is None else time.monotonic() + delay)
+        return True
+
+    def wait_result(self, timeout=None):
+        due = None if self.pending is None else self.pending[2]
+        if due is None or due - time.monotonic() > timeout:
+            time.sleep(timeout)
+            return None
+        time.sleep(max(0.0, due - time.monotonic()))
+        seq, timestamp, _ = self.pending
+        self.pending = None
+        self.free_slots.append(0)
+        return seq, timestamp, np.zeros((1, 21, 3), np.float32)
+
+    def close(self):
+        self.closed = True
+
+
+class FakePool(HandInferencePool):
+    def __init__(self, delays):
+        super().__init__(workers=1, backend="process")
+        self.delays = list(delays)  # One list of answer delays per backend created
+        self.backends = []
+        self.inference_timeout = 0.05
+        self.late_result_timeout = 0.2
+
+    def create_backend(self):
+        self.backends.append(FakeProcessBackend(self.delays.pop(0)))
+        return self.backends[-1]
+
+
+def submit_and_wait(pool, client, seq, frame=None, timeout=2.0):
+    client.submit(np.zeros((4, 4, 3), np.uint8) if frame is None else frame, seq, 0.0, 1)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with pool.condition:
+            if client.pending is None and not client.in_flight:
+                return client.poll()
+        time.sleep(0.01)
+    raise AssertionError("request was never finished")
+
+
+def test_late_result_frees_the_slot():
+    pool = FakePool([[0.1, 0.0]])
+    client = pool.create_client("a")
+    pool.start()
+    try:
+        assert submit_and_wait(pool, client, 1) == []
+        assert pool.get_stats()["timeouts"] == 1
+        # The late result was drained, the same worker answers the next frame
+        assert [seq for seq, _, _ in submit_and_wait(pool, client, 2)] == [2]
+        assert len(pool.backends) == 1
+    finally:
+        pool.stop()
+
+
+def test_silent_worker_is_replaced():
+    pool = FakePool([[None], [0.0]])
+    client = pool.create_client("a")
+    pool.start()
+    try:
+        assert submit_and_wait(pool, client, 1) == []
+        assert [seq for seq, _, _ in submit_and_wait(pool, client, 2)] == [2]
+        assert len(pool.backends) == 2 and pool.backends[0].closed
+    finally:
+        pool.stop()
+
+
+class FakeHandTracker:
+    """
+    Stands in for the in-process HandTracker. Like MediaPipe in video mode it keeps following the hand of
+    the previous frame when the current one has none, in static image mode every frame stands alone.
+    """
+
+    def __init__(self, model_complexity=1, max_num_hands=2, static_image_mode=False):
+        self.static_image_mode = static_image_mode
+        self.inference_width = None
+        self.previous = None
+
+    def set_model(self, model_complexity=None, max_num_hands=None):
+        pass
+
+    def get_hand_landmarks(self, frame, roi=None):
+        hand = frame[0, 0, 0] > 0
+        if not hand and not self.static_image_mode and self.previous is not None:
+            return self.previous
+        self.previous = np.full((1, 21, 3), 0.5, np.float32) if hand else None
+        return self.previous
+
+    def get_landmark_array(self, results):
+        return np.empty((0, 21, 3), np.float32) if results is None else results
+
+    def close(self):
+        pass
+
+
+def test_interleaved_sessions_do_not_share_hands(monkeypatch):
+    from src.back import hand_tracking
+    monkeypatch.setattr(hand_tracking, "HandTracker", FakeHandTracker)
+
+    pool = HandInferencePool(workers=1, backend="inprocess")
+    with_hand, without_hand = pool.create_client("a"), pool.create_client("b")
+    pool.start()
+    try:
+        hand = np.full((4, 4, 3), 255, np.uint8)
+        for seq in range(1, 6):
+            assert [len(landmarks) for _, _, landmarks in submit_and_wait(pool, with_hand, seq, hand)] == [1]
+            # Same worker, next frame from the other session: no hand may be carried over
+            assert [len(landmarks) for _, _, landmarks in submit_and_wait(pool, without_hand, seq)] == [0]
+    finally:
+        pool.stop()
+
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from src.back.hand_tracking import HandTracker
+
+MAT = [(200, 150), (440, 150), (440, 330), (200, 330)]
+
+
+class FakeRemote:
+    def __init__(self):
+        self.requests = []
+
+    def submit(self, frame, seq, timestamp, model_complexity, inference_width=None, reset_tracking=False):
+        self.requests.append((frame.shape, inference_width, reset_tracking))
+        return True
+
+    def poll(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeHands:
+    def __init__(self):
+        self.inputs = []
+
+    def process(self, image):
+        self.inputs.append(image.shape)
+        return None
+
+    def close(self):
+        pass
+
+
+def shifted(corners, dx, dy):
+    return [(x + dx, y + dy) for x, y in corners]
+
+
+@pytest.fixture
+def tracker():
+    hand_tracker = HandTracker(remote=FakeRemote())
+    hand_tracker.roi_enabled = True
+    return hand_tracker
+
+
+def test_roi_is_snapped_to_the_grid(tracker):
+    roi = tracker.get_roi((480, 640, 3), MAT)
+
+    assert roi == (160, 112, 480, 368)
+    assert all(edge % tracker.roi_grid == 0 for edge in roi)
+
+
+def test_roi_is_kept_while_the_box_fits_inside(tracker):
+    tracker.last_roi = tracker.get_roi((480, 640, 3), MAT)
+
+    assert tracker.get_roi((480, 640, 3), shifted(MAT, 3, 2)) == tracker.last_roi
+    assert tracker.get_roi((480, 640, 3), shifted(MAT, 40, 0)) != tracker.last_roi
+
+
+def test_governor_width_scales_the_roi_input(tracker):
+    frame = np.zeros((480, 640, 3), np.uint8)
+    tracker.track(frame, 0.0, MAT)
+    tracker.inference_width = 320
+    tracker.track(frame, 0.1, MAT)
+
+    (crop_shape, full_width, _), (_, half_width, _) = tracker.remote.requests
+    assert full_width == crop_shape[1]
+    assert half_width == crop_shape[1] // 2
+
+
+def test_remote_tracking_is_reset_when_the_roi_jumps(tracker):
+    frame = np.zeros((480, 640, 3), np.uint8)
+    for step, corners in enumerate([MAT, shifted(MAT, 2, 1), shifted(MAT, 120, 0), shifted(MAT, 121, 0)]):
+        tracker.track(frame, step * 0.1, corners)
+
+    assert [request[2] for request in tracker.remote.requests] == [True, False, True, False]
+
+
+def test_inprocess_graph_sees_a_blank_frame_when_the_roi_jumps(tracker):
+    tracker.remote, tracker.hands = None, FakeHands()
+    frame = np.zeros((480, 640, 3), np.uint8)
+    roi = tracker.get_roi(frame.shape, MAT)
+    tracker.get_hand_landmarks(frame, roi)
+    tracker.get_hand_landmarks(frame, roi)
+    tracker.get_hand_landmarks(frame)
+
+    blank = tracker.blank_input.shape
+    assert tracker.hands.inputs == [blank, (256, 320, 3), (256, 320, 3), blank, (480, 640, 3)]
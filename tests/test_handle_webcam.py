@@ -0,0 +1,83 @@
+import time
+
+import numpy as np
+
+from src.back.handle_webcam import FrameMailbox, WebCamHandler
+
+
+class FakeCapture:
+    """
+    Stands in for cv.VideoCapture: every read returns a new frame holding its read count.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.reads = 0
+        self.released = False
+
+    def isOpened(self):
+        return not self.released
+
+    def read(self, image=None):
+        time.sleep(self.interval)
+        if image is None:
+            image = np.empty((4, 4, 3), np.uint8)
+        image.fill(self.reads % 256)
+        self.reads += 1
+        return True, image
+
+    def release(self):
+        self.released = True
+
+
+class FakeWebCam(WebCamHandler):
+    def start_webcam(self, width=None, height=None, fps=None):
+        self.capture = FakeCapture()
+        self.start_capture_thread()
+
+
+def pull(handler, count, timeout=2.0):
+    frames = []
+    deadline = time.monotonic() + timeout
+    while len(frames) < count and time.monotonic() < deadline:
+        frame = handler.get_frame(timeout=0.05)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+def test_frames_arrive_in_order():
+    handler = FakeWebCam()
+    handler.start_webcam()
+    try:
+        frames = pull(handler, 20)
+        seqs = [frame.seq for frame in frames]
+        assert len(frames) == 20 and seqs == sorted(set(seqs))
+        assert all(a.timestamp <= b.timestamp for a, b in zip(frames, frames[1:]))
+    finally:
+        handler.stop_webcam()
+
+
+def test_restart_delivers_frames():
+    handler = FakeWebCam()
+    handler.start_webcam()
+    first = pull(handler, 20)
+    handler.stop_webcam()
+    assert handler.get_frame() is None
+
+    handler.start_webcam()
+    try:
+        second = pull(handler, 20)
+        assert len(second) == 20
+        # seq stays monotonic across capture threads
+        assert second[0].seq > first[-1].seq
+    finally:
+        handler.stop_webcam()
+
+
+def test_mailbox_keeps_the_newest():
+    mailbox = FrameMailbox(capacity=2)
+    for item in range(5):
+        mailbox.put(item)
+    assert mailbox.get_latest() == 4
+    assert mailbox.get_latest() is None and mailbox.dropped_frames == 4
@@ -0,0 +1,83 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from src.back.kbm_tracking import KeyboardTracker
+from src.back.synthetic_scenes import SceneGenerator
+
+
+@pytest.fixture
+def generator():
+    return SceneGenerator(seed=4, occlusion_probability=0.0, blur_range=(0.5, 0.5), noise_sigma=2.0)
+
+
+@pytest.fixture
+def kbm_tracker(generator):
+    # Calibrated on a still mat, pose tracking started on its first frame
+    kbm_tracker = KeyboardTracker()
+    pose = generator.generate_pose()
+    scene = generator.generate(pose)
+    kbm_tracker.apply_projection(scene.corners, kbm_tracker.build_warp_engine(scene.corners))
+    assert kbm_tracker.track_pose(scene.image)
+    kbm_tracker.pose = pose
+    return kbm_tracker
+
+
+def corner_error(corners, truth):
+    return float(np.linalg.norm(np.float32(corners) - truth, axis=1).max())
+
+
+def test_still_mat_keeps_its_projection(kbm_tracker, generator):
+    engine = kbm_tracker.get_projection()[1]
+    for _ in range(5):
+        assert kbm_tracker.track_pose(generator.generate(kbm_tracker.pose).image)
+    assert kbm_tracker.get_projection()[1] is engine and not kbm_tracker.pose_moving
+
+
+def test_moved_mat_is_followed(kbm_tracker, generator):
+    corners, engine = kbm_tracker.get_projection()
+    shift = np.float32([[1, 0, 6], [0, 1, 3]])
+    frame = cv.warpAffine(generator.generate(kbm_tracker.pose).image, shift, (640, 480))
+    assert kbm_tracker.track_pose(frame)
+
+    moved, moved_engine = kbm_tracker.get_projection()
+    assert moved_engine is not engine
+    assert corner_error(moved, np.float32(corners) + [6, 3]) < 1.0
+
+    # Settled again -> the next frames leave it alone
+    frame = cv.warpAffine(generator.generate(kbm_tracker.pose).image, shift, (640, 480))
+    assert kbm_tracker.track_pose(frame) and kbm_tracker.get_projection()[1] is moved_engine
+
+
+def test_pose_updates_reach_the_projection_hook(kbm_tracker, generator):
+    changes = []
+    kbm_tracker.on_projection_change = lambda timestamp, corners: changes.append(corners)
+    frame = cv.warpAffine(generator.generate(kbm_tracker.pose).image, np.float32([[1, 0, 6], [0, 1, 3]]), (640, 480))
+    assert kbm_tracker.track_pose(frame)
+
+    assert len(changes) == 1 and changes[0] is kbm_tracker.get_projection()[0]
+
+
+def test_redetection_needs_two_agreeing_frames(kbm_tracker, generator):
+    kbm_tracker.redetect_interval = 1
+    kbm_tracker.pose_tracker.lose_track()
+    burst = generator.generate_burst(2)
+    engine = kbm_tracker.get_projection()[1]
+
+    assert not kbm_tracker.track_pose(burst[0].image)
+    assert kbm_tracker.get_projection()[1] is engine and kbm_tracker.last_failure == "unconfirmed"
+
+    assert kbm_tracker.track_pose(burst[1].image)
+    assert corner_error(kbm_tracker.get_projection()[0], burst[0].corners) < 5.0
+
+
+def test_disagreeing_redetections_are_not_applied(kbm_tracker, generator):
+    kbm_tracker.redetect_interval = 1
+    kbm_tracker.pose_tracker.lose_track()
+    first, second = generator.generate(), generator.generate()
+    engine = kbm_tracker.get_projection()[1]
+
+    for scene in (first, second, second):
+        assert not kbm_tracker.track_pose(scene.image)
+    assert kbm_tracker.get_projection()[1] is engine
+    assert not kbm_tracker.is_redetect_pending()
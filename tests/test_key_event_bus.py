@@ -0,0 +1,68 @@
+import threading
+
+from src.back.key_event_bus import KeyEventBus, KeyEventRing
+
+
+def test_ring_wraps_around_in_order():
+    ring = KeyEventRing("detector", capacity=3)
+    assert len(ring.slots) == 4
+
+    out = []
+    for round_ in range(5):
+        for index in range(3):
+            assert ring.publish(f"{round_}-{index}", timestamp=float(index))
+        assert ring.drain(out) == 3
+    assert [event.name for event in out] == [f"{r}-{i}" for r in range(5) for i in range(3)]
+    assert all(slot is None for slot in ring.slots)  # Drained events are not kept alive
+
+
+def test_full_ring_drops_new_events():
+    ring = KeyEventRing("detector", capacity=4)
+    assert all(ring.publish(name) for name in "abcd")
+    assert not ring.publish("e") and ring.dropped == 1
+
+    out = []
+    assert ring.drain(out, max_events=2) == 2
+    assert ring.publish("f")
+    ring.drain(out)
+    assert [event.name for event in out] == ["a", "b", "c", "d", "f"]
+
+
+def test_bus_merges_producers_in_time_order():
+    bus = KeyEventBus()
+    detector, keyboard = bus.create_producer("detector"), bus.create_producer("keyboard")
+    batches = []
+    bus.subscribe(batches.append)
+
+    detector.publish("a", timestamp=1.0)
+    keyboard.publish("b", timestamp=0.5)
+    detector.publish("a", "up", timestamp=2.0)
+    batch = bus.dispatch()
+
+    assert [(event.source, event.name, event.event_type) for event in batch] == \
+        [("keyboard", "b", "down"), ("detector", "a", "down"), ("detector", "a", "up")]
+    assert batches == [batch]
+    assert bus.dispatch() == [] and len(batches) == 1  # Empty batches are not dispatched
+
+
+def test_producer_thread_and_consumer_never_lose_order():
+    bus = KeyEventBus(capacity=64)
+    ring = bus.create_producer("detector")
+    total = 20000
+    published = []
+
+    def produce():
+        for index in range(total):
+            if ring.publish(str(index), timestamp=float(index)):
+                published.append(index)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    received = []
+    while producer.is_alive() or ring.write_index != ring.read_index:
+        received += [int(event.name) for event in bus.drain()]
+    producer.join()
+
+    # Every event that was not dropped arrives exactly once, in publishing order
+    assert received == published
+    assert len(received) + bus.get_dropped() == total
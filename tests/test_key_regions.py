@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from src.back.key_regions import KeyLayoutIndex, KeyRegions
+from src.back.layout_cache import LayoutCache
+
+
+@pytest.fixture(scope="module")
+def key_regions():
+    return KeyRegions()
+
+
+@pytest.fixture(scope="module")
+def index(key_regions):
+    return KeyLayoutIndex.from_key_regions(key_regions)
+
+
+def test_one_region_per_keymap_key(key_regions, index):
+    assert len(index.region_names) - 1 == len(set(key_regions.keymap.values()))
+    assert sorted(index.region_names[1:]) == sorted(set(key_regions.keymap.values()))
+    # Every key is a filled area, not an outline fragment
+    areas = np.bincount(index.label_image.ravel(), minlength=len(index.region_names))[1:]
+    assert areas.min() > 3000
+
+
+@pytest.mark.parametrize("button, point", [
+    ("`", (34, 191)), ("1", (111, 191)), ("backspace", (1078, 191)),
+    ("tab", (53, 269)), ("q", (149, 269)), ("\\", (1098, 268)),
+    ("caps lock", (63, 346)), ("a", (169, 346)), ("enter", (1069, 346)),
+    ("shift", (82, 424)), ("z", (207, 424)), ("right shift", (1011, 424)),
+    ("ctrl", (43, 501)), ("space", (527, 501)), ("right ctrl", (964, 501)),
+])
+def test_query_known_key_centres(index, button, point):
+    key = index.query([point], max_gap_distance=0)[0]
+    assert button in index.get_buttons(key)
+
+
+def test_query_every_centroid_hits_its_key(index):
+    ids = index.query(index.centroids[1:], max_gap_distance=0)
+    np.testing.assert_array_equal(ids, np.arange(1, len(index.region_names)))
+
+
+def test_gap_fallback_is_bounded(index):
+    # On the outline between "1" (x <= 146) and "2" (x >= 154)
+    assert index.get_buttons(index.query([(150, 191)])[0])[0] in ("1", "2")
+    assert index.query([(150, 191)], max_gap_distance=0)[0] == 0
+    # Unmapped keys (function row, arrows) and points off the template are no key
+    assert index.query([(130, 94), (1137, 517), (-10, 5), (5000, 5000)]).tolist() == [0, 0, 0, 0]
+
+
+def test_cached_layout_matches(tmp_path, index):
+    cache = LayoutCache(str(tmp_path))
+    built = cache.get_layout()
+    loaded = cache.get_layout()
+    assert loaded.layout_index.region_names == index.region_names
+    np.testing.assert_array_equal(loaded.layout_index.label_image, index.label_image)
+    assert len(loaded.contours) == len(index.region_names) - 1 == len(built.contours)
+
+
+def test_missing_template_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        LayoutCache(str(tmp_path)).get_layout(str(tmp_path / "missing.jpg"))
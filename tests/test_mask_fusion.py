@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.back.mask_fusion import MaskFusion
+
+
+def add(fusion, mask, ok=True):
+    slot = fusion.reserve()
+    fusion.stack[slot] = mask
+    fusion.commit(slot, ok)
+
+
+@pytest.fixture
+def masks():
+    # The mat is in every mask, a hand only in the first one
+    mat = np.zeros((4, 6), dtype=np.uint8)
+    mat[1:3, 1:5] = 255
+    hand = mat.copy()
+    hand[0, :] = 255
+    return hand, mat, mat
+
+
+def test_methods(masks):
+    hand, mat, _ = masks
+    fusion = MaskFusion(mat.shape, capacity=4)
+    for mask in masks:
+        add(fusion, mask)
+
+    assert np.array_equal(fusion.fuse("max"), hand)
+    assert np.array_equal(fusion.fuse("median"), mat)
+    assert np.array_equal(fusion.fuse("vote"), mat)
+    assert np.array_equal(fusion.fuse("vote", votes=1), hand)
+
+
+def test_failed_and_overwritten_masks_are_left_out(masks):
+    hand, mat, _ = masks
+    fusion = MaskFusion(mat.shape, capacity=2, method="max")
+    add(fusion, mat)
+    add(fusion, hand, ok=False)
+    assert np.array_equal(fusion.fuse(), mat)
+
+    # The oldest slot makes way once the stack is full
+    add(fusion, hand)
+    assert np.array_equal(fusion.fuse(), hand)
+    add(fusion, mat)
+    add(fusion, mat)
+    assert np.array_equal(fusion.fuse(), mat)
+
+    fusion.clear()
+    assert not fusion.fuse().any()
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        MaskFusion((4, 4), method="mean")
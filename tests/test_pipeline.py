@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from src.back.pipeline import BLOCK, COALESCE, DROP_OLDEST, StageQueue
+
+
+def test_get_zero_timeout_returns_at_once():
+    queue = StageQueue()
+    start = time.monotonic()
+    assert queue.get(timeout=0) is None
+    assert time.monotonic() - start < 0.05
+
+
+def test_get_waits_for_the_timeout():
+    queue = StageQueue()
+    start = time.monotonic()
+    assert queue.get(timeout=0.1) is None
+    assert time.monotonic() - start >= 0.09
+
+
+def test_get_wakes_up_on_put():
+    queue = StageQueue()
+    threading.Timer(0.05, queue.put, ("item",)).start()
+    start = time.monotonic()
+    assert queue.get(timeout=5.0) == "item"
+    assert time.monotonic() - start < 2.0
+
+
+def test_close_wakes_up_a_blocked_get():
+    queue = StageQueue()
+    threading.Timer(0.05, queue.close).start()
+    start = time.monotonic()
+    assert queue.get() is None
+    assert time.monotonic() - start < 2.0
+    assert queue.put("item") is False
+
+
+def test_drop_oldest_keeps_the_newest():
+    queue = StageQueue(capacity=2, policy=DROP_OLDEST)
+    for item in range(5):
+        assert queue.put(item)
+    assert queue.dropped == 3
+    assert [queue.get(0), queue.get(0), queue.get(0)] == [3, 4, None]
+
+
+def test_coalesce_merges_into_the_pending_item():
+    queue = StageQueue(capacity=4, policy=COALESCE, merge=lambda old, new: old + new)
+    for item in ([1], [2], [3]):
+        queue.put(item)
+    assert queue.capacity == 1 and queue.dropped == 2
+    assert queue.get(0) == [1, 2, 3]
+
+
+def test_block_waits_for_the_consumer():
+    queue = StageQueue(capacity=1, policy=BLOCK)
+    queue.put(1)
+    put_done = threading.Event()
+
+    def producer():
+        queue.put(2)
+        put_done.set()
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    assert not put_done.wait(0.1)
+    assert queue.get(0) == 1
+    assert put_done.wait(2.0)
+    assert queue.get(0) == 2 and queue.dropped == 0
+    thread.join(timeout=2.0)
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        StageQueue(policy="lifo")
@@ -0,0 +1,88 @@
+import numpy as np
+
+from src.back.press_detector import CONTACT, HOVER, PressDetector
+
+FPS = 30.0
+KEYS = np.array([1, 2, 3, 4, 5])
+# Finger 1 hovers, pushes down (z goes up), rests on the key and lifts off again
+PRESS = [0.0] * 5 + [0.02, 0.04, 0.06, 0.07] + [0.07] * 6 + [0.05, 0.03, 0.01] + [0.0] * 5
+
+
+def run(detector, depths, keys=KEYS, slide_speed=0.0, finger=1, start=0):
+    """
+    Feeds one hand whose finger follows the given z track, returns (frame, event) for every event.
+    """
+    events = []
+    for offset, depth in enumerate(depths):
+        frame = start + offset
+        points = np.zeros((5, 2), dtype=np.float32)
+        points[:, 0] = np.arange(5) * 50 + slide_speed * frame / FPS
+        points[:, 1] = 100
+        z = np.zeros(5, dtype=np.float32)
+        z[finger] = depth
+        events += [(frame, event) for event in detector.update(frame / FPS, points, z, keys)]
+    return events
+
+
+def test_press_and_release():
+    detector = PressDetector()
+    events = run(detector, PRESS)
+    assert [(event.finger, event.key, event.event_type) for _, event in events] == [(1, 2, "down"), (1, 2, "up")]
+
+    (down_frame, down), (up_frame, up) = events
+    # Contact is reported once the descend stopped, interpolated back towards the stop
+    assert 8 <= down_frame <= 10 and 8 / FPS <= down.timestamp <= down_frame / FPS
+    assert up_frame > down_frame and up.timestamp - down.timestamp >= detector.min_contact_time
+    assert detector.state[1] == HOVER
+
+
+def test_no_press_without_a_key():
+    detector = PressDetector()
+    assert run(detector, PRESS, keys=np.zeros(5, dtype=np.int32)) == []
+    assert detector.state[1] == HOVER
+
+
+def test_no_press_while_sliding():
+    detector = PressDetector()
+    assert run(detector, PRESS, slide_speed=2 * detector.max_slide_speed) == []
+
+
+def test_short_travel_is_not_a_press():
+    detector = PressDetector()
+    assert run(detector, [0.0] * 5 + [0.004] * 6) == []
+    assert detector.state[1] == HOVER
+
+
+def test_lost_hand_releases_its_key():
+    detector = PressDetector()
+    events = run(detector, PRESS[:12])
+    assert [event.event_type for _, event in events] == ["down"]
+    assert detector.state[1] == CONTACT
+
+    lost = detector.update(12 / FPS, np.empty((0, 2), np.float32), np.empty(0, np.float32), [])
+    assert [(event.finger, event.key, event.event_type) for event in lost] == [(1, 2, "up")]
+    assert (detector.state == HOVER).all()
+
+
+def test_stale_frames_are_ignored():
+    detector = PressDetector()
+    run(detector, PRESS[:3])
+    head = detector.head
+    assert detector.update(1 / FPS, np.zeros((5, 2), np.float32), np.zeros(5, np.float32), KEYS) == []
+    assert detector.head == head
+
+
+def test_every_finger_presses_independently():
+    detector = PressDetector()
+    events = []
+    for finger in (0, 3):
+        events += run(detector, PRESS, finger=finger, start=finger * len(PRESS))
+    assert [(event.finger, event.key, event.event_type) for _, event in events] == \
+        [(0, 1, "down"), (0, 1, "up"), (3, 4, "down"), (3, 4, "up")]
+
+
+def test_debounce_blocks_a_second_press():
+    twice = PRESS + PRESS
+    assert [event.event_type for _, event in run(PressDetector(), twice)] == ["down", "up", "down", "up"]
+    # The second descend starts well within a long debounce after the first release
+    assert [event.event_type for _, event in run(PressDetector(debounce=1.0), twice)] == ["down", "up"]
@@ -0,0 +1,102 @@
+import threading
+import time
+
+from src.back.recalibration_worker import RecalibrationWorker
+
+
+class FakeCalibrator:
+    def __init__(self, gate, needed=3, max_frames=10):
+        self.gate = gate  # Every add_frame waits for it, so frames pile up in the worker's queue
+        self.needed = needed
+        self.max_frames = max_frames
+        self.seen = []
+        self.done = False
+        self.converged = False
+        self.corners = None
+        self.last_failure = None
+
+    def add_frame(self, frame):
+        self.gate.wait(2.0)
+        self.seen.append(frame)
+        if len(self.seen) >= self.needed:
+            self.done = self.converged = True
+            self.corners = "corners"
+        return self.done
+
+
+class FakeTracker:
+    def __init__(self):
+        self.gate = threading.Event()
+        self.calibrators = []
+        self.applied = []
+        self.redetected = None  # Corners redetect_corners returns
+        self.last_failure = None
+
+    def create_calibrator(self):
+        self.calibrators.append(FakeCalibrator(self.gate))
+        return self.calibrators[-1]
+
+    def redetect_corners(self, frame):
+        return self.redetected
+
+    def build_warp_engine(self, corners):
+        return "engine"
+
+    def apply_projection(self, corners, warp_engine):
+        self.applied.append(corners)
+
+
+def wait_poll(worker, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not worker.is_running():
+            return worker.poll()
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_busy_job_gets_the_newest_frames():
+    tracker = FakeTracker()
+    worker = RecalibrationWorker(tracker)
+    try:
+        assert worker.start()
+        assert worker.add_frame(0)
+        time.sleep(0.05)  # The job took frame 0 and waits on the gate
+        for frame in range(1, 6):
+            worker.add_frame(frame)
+        tracker.gate.set()
+
+        assert wait_poll(worker) == (True, "Recalibration done")
+        assert tracker.calibrators[0].seen == [0, 4, 5]
+        assert tracker.applied == ["corners"]
+    finally:
+        worker.shutdown()
+
+
+def test_repeated_redetect_failures_are_reported_once():
+    tracker = FakeTracker()
+    worker = RecalibrationWorker(tracker)
+    worker.failure_report_interval = 5
+    try:
+        results = []
+        for _ in range(11):
+            assert worker.redetect("frame")
+            results.append(wait_poll(worker))
+        reported = [result for result in results if result is not None]
+        assert [index for index, result in enumerate(results) if result is not None] == [0, 5, 10]
+        assert all(not success for success, _ in reported)
+
+        # A success starts over
+        tracker.redetected = "found"
+        worker.redetect("frame")
+        assert wait_poll(worker) == (True, "Redetection done")
+        tracker.redetected = None
+        worker.redetect("frame")
+        assert wait_poll(worker)[0] is False
+
+        # A pose waiting for the next frame to confirm it is not a failure
+        tracker.last_failure = "unconfirmed"
+        worker.redetect("frame")
+        assert wait_poll(worker) is None and worker.redetect_failures == 1
+    finally:
+        worker.shutdown()
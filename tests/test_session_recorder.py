@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+
+from src.back.handle_webcam import WebCamHandler
+from src.back.session_recorder import ReplayCaptureSource, SessionRecorder, SessionReplay
+
+CORNERS = [[10.0, 8.0], [40.0, 8.0], [40.0, 30.0], [10.0, 30.0]]
+
+
+class CountingCapture:
+    """
+    Stands in for cv.VideoCapture: every read returns a frame filled with its read count.
+    """
+
+    def __init__(self):
+        self.reads = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        time.sleep(0.002)
+        if image is None:
+            image = np.empty((32, 48, 3), np.uint8)
+        image.fill(self.reads % 256)
+        self.reads += 1
+        return True, image
+
+    def release(self):
+        pass
+
+
+class FakeTracker:
+    def __init__(self):
+        self.applied = []
+
+    def build_warp_engine(self, corners):
+        return None
+
+    def apply_projection(self, corners, warp_engine, reset_tracking=True):
+        self.applied.append(corners)
+
+
+def frame_of(value):
+    return np.full((32, 48, 3), value, np.uint8)
+
+
+def test_every_captured_frame_is_recorded(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    handler = WebCamHandler()
+    handler.recorder = recorder
+    handler.capture = CountingCapture()
+    handler.start_capture_thread()
+    deadline = time.monotonic() + 2.0
+    while handler.capture_thread.seq < 20 and time.monotonic() < deadline:
+        time.sleep(0.01)  # Nothing is pulled, the mailbox drops all but the newest frame
+    handler.stop_webcam()
+    recorder.close()
+
+    frames = list(SessionReplay(str(tmp_path)).frames())
+    assert len(frames) == handler.next_seq >= 20
+    assert [frame.seq for frame in frames] == list(range(len(frames)))
+    # Lossless by default, the replayed pixels are the captured ones
+    assert all(np.array_equal(frame.image, frame_of(frame.seq % 256)) for frame in frames)
+
+
+def test_replay_source_keeps_recorded_frames_and_calibrations(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    start = 100.0
+    for seq in range(6):
+        recorder.record_frame(frame_of(seq * 10), start + 0.01 * seq, 50 + seq)
+    recorder.record_calibration(start + 0.025, CORNERS)
+    recorder.close()
+
+    source = ReplayCaptureSource(str(tmp_path), mailbox_size=8)
+    source.kbm_tracker = FakeTracker()
+    source.start_webcam()
+    try:
+        frames, calibrated = [], []
+        deadline = time.monotonic() + 2.0
+        while len(frames) < 6 and time.monotonic() < deadline:
+            frame = source.get_frame(timeout=0.05)
+            if frame is not None:
+                frames.append(frame)
+                calibrated.append(len(source.kbm_tracker.applied))
+    finally:
+        source.stop_webcam()
+
+    assert [frame.seq for frame in frames] == [50, 51, 52, 53, 54, 55]
+    assert [frame.timestamp for frame in frames] == [start + 0.01 * seq for seq in range(6)]
+    # The calibration is applied once, with the first frame captured after it
+    assert calibrated == [0, 0, 0, 1, 1, 1]
+    assert np.array_equal(source.kbm_tracker.applied[0], np.float32(CORNERS))
+    assert source.replay.get_calibration_at(start + 0.02) is None
@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from src.back.kbm_tracking import KeyboardTracker
+from src.back.streaming_calibrator import StreamingCalibrator
+from src.back.synthetic_scenes import SceneGenerator
+
+
+@pytest.fixture(scope="module")
+def kbm_tracker():
+    return KeyboardTracker()
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return SceneGenerator(seed=3, occlusion_probability=0.0)
+
+
+def corner_error(corners, truth):
+    return float(np.linalg.norm(np.float32(corners) - truth, axis=1).max())
+
+
+def test_converges_on_a_still_mat(kbm_tracker, generator):
+    for _ in range(4):
+        burst = generator.generate_burst(10)
+        calibrator = StreamingCalibrator(kbm_tracker)
+        for scene in burst:
+            if calibrator.add_frame(scene.image):
+                break
+
+        assert calibrator.converged and calibrator.last_failure is None
+        assert calibrator.frames_used < len(burst)
+        assert calibrator.last_change <= calibrator.last_tolerance
+        # The chamfered corner is computed from the fitted sides, the others are refined
+        assert corner_error(calibrator.corners, burst[0].corners) < 5.0
+
+
+def test_single_frame_estimate(kbm_tracker, generator):
+    scene = generator.generate()
+    calibrator = StreamingCalibrator(kbm_tracker)
+    assert corner_error(calibrator.estimate_corners(scene.image), scene.corners) < 5.0
+    # Corners are in image orientation, clockwise from the top-left
+    corners = calibrator.estimate_corners(scene.image)
+    assert corners[0].sum() == corners.sum(axis=1).min()
+
+
+def test_no_mat_never_converges(kbm_tracker):
+    calibrator = StreamingCalibrator(kbm_tracker, max_frames=3)
+    blank = np.zeros((480, 640, 3), dtype=np.uint8)
+    assert calibrator.estimate_corners(blank) is None and calibrator.last_failure == "no_contours"
+
+    done = [calibrator.add_frame(blank) for _ in range(3)]
+    assert done == [False, False, True]
+    assert not calibrator.converged and calibrator.corners is None and calibrator.frames_used == 3
+
+
+def test_moving_mat_does_not_converge(kbm_tracker, generator):
+    first, second = generator.generate_burst(1)[0], generator.generate_burst(1)[0]
+    calibrator = StreamingCalibrator(kbm_tracker, max_frames=4)
+    for scene in (first, second, first, second):
+        calibrator.add_frame(scene.image)
+
+    assert calibrator.done and not calibrator.converged
+    assert calibrator.corners is None and calibrator.last_failure == "not_converged"
+
+    # Only frames after a reset count
+    calibrator.reset()
+    while not calibrator.add_frame(first.image):
+        pass
+    assert calibrator.converged and corner_error(calibrator.corners, first.corners) < 5.0
+
+
+def test_tolerance_scales_with_the_mat(kbm_tracker):
+    small = SceneGenerator(frame_size=(640, 480), seed=5, occlusion_probability=0.0)
+    large = SceneGenerator(frame_size=(1920, 1080), seed=5, occlusion_probability=0.0)
+    tolerances = []
+    for generator in (small, large):
+        burst = generator.generate_burst(10)
+        calibrator = StreamingCalibrator(kbm_tracker)
+        for scene in burst:
+            if calibrator.add_frame(scene.image):
+                break
+        assert calibrator.converged
+        diagonal = StreamingCalibrator.get_diagonal(burst[0].corners)
+        assert calibrator.last_tolerance == pytest.approx(calibrator.tolerance * diagonal, rel=0.02)
+        tolerances.append(calibrator.last_tolerance)
+    assert tolerances[1] > 2 * tolerances[0]
+
+
+
+@pytest.mark.parametrize("corners, failure", [
+    ([[100, 100], [500, 100], [300, 150], [500, 300]], "not_convex"),
+    ([[10, 10], [60, 10], [60, 32], [10, 32]], "too_small"),
+    ([[100, 100], [500, 100], [500, 400], [100, 400]], "aspect_ratio"),
+    ([[200, 150], [440, 150], [640, 330], [0, 330]], "opposite_sides"),
+])
+def test_implausible_shapes_are_rejected(kbm_tracker, corners, failure):
+    calibrator = StreamingCalibrator(kbm_tracker)
+    assert calibrator.check_shape(np.float32(corners), 640 * 480) == failure
+
+
+def test_true_poses_are_plausible(kbm_tracker, generator):
+    calibrator = StreamingCalibrator(kbm_tracker)
+    for _ in range(200):
+        assert calibrator.check_shape(generator.random_corners(), 640 * 480) is None
+
+
+def test_vote_fusion_drops_a_passing_occlusion(kbm_tracker):
+    generator = SceneGenerator(seed=7, occlusion_probability=0.0)
+    pose = generator.generate_pose()
+    generator.occlusion_probability = 1.0
+    occluded = generator.generate(pose)
+    generator.occlusion_probability = 0.0
+    burst = [occluded] + [generator.generate(pose) for _ in range(4)]
+
+    calibrator = StreamingCalibrator(kbm_tracker, fusion_method="vote")
+    for scene in burst:
+        if calibrator.add_frame(scene.image):
+            break
+    assert calibrator.converged and calibrator.fusion.capacity == calibrator.fusion_capacity
+    assert corner_error(calibrator.corners, burst[0].corners) < 5.0
+
+    # reset forgets the masks of the previous burst
+    calibrator.reset()
+    assert not calibrator.fusion.valid.any()
+
+
+def test_fast_mode_matches_the_full_resolution_estimate(kbm_tracker):
+    generator = SceneGenerator(frame_size=(1920, 1080), seed=8, occlusion_probability=0.0)
+    scene = generator.generate()
+    full = StreamingCalibrator(kbm_tracker).estimate_corners(scene.image)
+    fast = StreamingCalibrator(kbm_tracker, detection_mode="fast")
+    assert fast.get_detection_roi(scene.image.shape) is None  # No pose yet, the whole (downscaled) frame
+    assert corner_error(fast.estimate_corners(scene.image), full) < 1.0
+
+
+def test_fast_mode_leaves_a_stale_roi():
+    kbm_tracker = KeyboardTracker()
+    generator = SceneGenerator(seed=9, occlusion_probability=0.0)
+    scene = generator.generate()
+    # The previous pose only covers the left part of the mat now
+    stale = scene.corners.copy()
+    stale[[1, 2], 0] = stale[[0, 3], 0] + 0.4 * (stale[[1, 2], 0] - stale[[0, 3], 0])
+    kbm_tracker.apply_projection(stale, kbm_tracker.build_warp_engine(stale))
+
+    calibrator = StreamingCalibrator(kbm_tracker, detection_mode="fast")
+    x0, y0, x1, y1 = calibrator.get_detection_roi(scene.image.shape)
+    assert x1 < scene.corners[:, 0].max()
+    assert corner_error(calibrator.estimate_corners(scene.image), scene.corners) < 5.0
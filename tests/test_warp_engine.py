@@ -0,0 +1,91 @@
+import threading
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from src.back.synthetic_scenes import SceneGenerator
+from src.back.warp_engine import WarpEngine
+
+
+@pytest.fixture(scope="module")
+def generator():
+    return SceneGenerator(seed=2, occlusion_probability=0.0, blur_range=(1.0, 1.0), noise_sigma=0.0)
+
+
+@pytest.fixture(scope="module")
+def scene(generator):
+    return generator.generate()
+
+
+@pytest.fixture
+def engine(generator, scene):
+    height, width = generator.template.shape[:2]
+    engine = WarpEngine((width, height))
+    engine.set_corners(scene.corners)
+    return engine
+
+
+def reference_warp(engine, frame, scale):
+    # The original path: warpPerspective to the template, rotate 180, resize to the display scale
+    width, height = engine.template_size
+    warped = cv.warpPerspective(frame, engine.transformation_matrix, (width, height))
+    warped = cv.rotate(warped, cv.ROTATE_180)
+    return cv.resize(warped, engine.get_output_size(scale), interpolation=cv.INTER_LINEAR)
+
+
+def mean_difference(a, b, border=4):
+    # Edge pixels differ only through border handling
+    a, b = a[border:-border, border:-border], b[border:-border, border:-border]
+    return float(np.abs(a.astype(np.float32) - b.astype(np.float32)).mean())
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.6])
+def test_both_paths_match_the_reference(engine, scene, scale):
+    reference = reference_warp(engine, scene.image, scale)
+    uses = [engine.warp(scene.image, scale) for _ in range(engine.lut_min_uses + 1)]
+    assert engine.get_output_size(scale) in engine.maps
+    for warped in (uses[0], uses[-1]):  # warpPerspective, then the remap table
+        assert warped.shape == reference.shape
+        assert mean_difference(warped, reference) < 1.0
+
+
+def test_warp_into_dst(engine, scene):
+    width, height = engine.get_output_size(0.3)
+    dst = np.zeros((height, width, 3), np.uint8)
+    assert engine.warp(scene.image, 0.3, dst) is dst
+    assert dst.any()
+
+
+def test_project_points_follow_the_image(engine, scene):
+    # The frame corners land on the (rotated) template corners
+    width, height = engine.template_size
+    projected = engine.project_points(scene.corners)
+    expected = [[width - 1, height - 1], [-1, height - 1], [-1, -1], [width - 1, -1]]
+    np.testing.assert_allclose(projected, expected, atol=1e-2)
+
+
+def test_only_recent_tables_are_kept(engine, scene):
+    engine.lut_min_uses = 0
+    for scale in (0.2, 0.3, 0.4, 0.3):
+        engine.warp(scene.image, scale)
+    assert list(engine.maps) == [engine.get_output_size(0.4), engine.get_output_size(0.3)]
+
+
+def test_shared_engine_from_two_threads(engine, scene):
+    engine.lut_min_uses = 1
+    errors = []
+
+    def render(scales):
+        try:
+            for scale in scales * 10:
+                assert engine.warp(scene.image, scale) is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=render, args=(scales,)) for scales in ([0.2, 0.25], [0.3, 0.35])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == [] and len(engine.maps) <= engine.max_maps